@@ -0,0 +1,329 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+import config
+import bot
+import forecast_cache
+import locations
+import metrics
+import timezones
+import weather
+
+
+# 注意を呼びかける天気の種類: (名前, 絵文字, 表示名)
+ALERT_KINDS = (
+    ('thunderstorm', '⛈️', '雷雨'),
+    ('heavy_rain', '🌧️', '大雨'),
+    ('heavy_snow', '❄️', '大雪'),
+    ('heat', '🥵', '猛暑'),
+    ('cold', '🥶', '厳しい冷え込み'),
+)
+ALERT_LABELS = {name: (emoji, label) for name, emoji, label in ALERT_KINDS}
+
+# 強い雨・雪の天気ID(OpenWeatherMapの天気コード)
+HEAVY_RAIN_IDS = frozenset((502, 503, 504, 522, 531))
+HEAVY_SNOW_IDS = frozenset((602, 622))
+
+# お知らせのEmbedの色(オレンジレッド)
+ALERT_COLOR = 0xFF4500
+
+
+class Alert:
+    """
+    ある地点(セル)で見つかった、注意を呼びかける天気1種類分
+    """
+    __slots__ = ('kind', 'start', 'peak', 'description', 'alert_id')
+    
+    def __init__(self, kind, start, peak, description, day):
+        """
+        Args:
+            kind: ALERT_KINDSの名前
+            start: 最初にその天気になる時刻(UNIX時間)
+            peak: 降水確率の最大値(%)、または気温の最高・最低値
+            description: 最初にその天気になる時刻の天気の説明
+            day: startの現地の日付('YYYY-MM-DD')
+        """
+        self.kind = kind
+        self.start = start
+        self.peak = peak
+        self.description = description
+        # 同じ日の同じ種類のお知らせは、予報の時刻が少しずれても1回だけにする
+        self.alert_id = f"{kind}:{day}"
+
+
+def fingerprint(items, start, end):
+    """
+    start〜endの予報の時刻・天気ID・降水確率・気温から、変化を見つけるための値を作る
+    
+    Args:
+        items: weather.forecast_items()の予報のリスト(時刻順)
+        start: 対象期間の開始(UNIX時間)
+        end: 対象期間の終了(UNIX時間、この時刻は含まない)
+    
+    Returns:
+        str: 予報が同じなら同じになる16進数の文字列
+    """
+    values = []
+    for item in items:
+        dt = item['dt']
+        if dt < start:
+            continue
+        if dt >= end:
+            break
+        weather_list = item.get('weather')
+        condition_id = weather_list[0].get('id', 0) if weather_list else 0
+        values.append((dt, condition_id, item.get('pop', 0), item['main']['temp']))
+    return format(hash(tuple(values)) & 0xFFFFFFFFFFFFFFFF, '016x')
+    
+    # 解説:
+    # 天気IDが同じなら天気の説明も同じなので、説明の文字列の代わりにIDを比べます
+    # 数値だけのタプルのhash()は実行するたびに変わらない(文字列と違って乱数が入らない)ので、
+    # 状態ファイルに保存して次の実行と比べられます
+
+
+def detect_alerts(items, start, end, timezone=None):
+    """
+    start〜endの予報から、しきい値を超える天気を探す
+    
+    Args:
+        items: weather.forecast_items()の予報のリスト(時刻順)
+        start: 対象期間の開始(UNIX時間)
+        end: 対象期間の終了(UNIX時間、この時刻は含まない)
+        timezone: 地点のタイムゾーン名(お知らせの日付を数える)
+    
+    Returns:
+        list: Alertのリスト(ALERT_KINDSの順)
+    """
+    enabled = {kind.strip() for kind in config.ALERT_KINDS.split(',') if kind.strip()}
+    found = {}
+    
+    def note(kind, item, peak, better):
+        # 種類ごとに、最初の時刻と一番ひどい値を覚えておく
+        current = found.get(kind)
+        if current is None:
+            found[kind] = [item, peak]
+        elif better(peak, current[1]):
+            current[1] = peak
+    
+    for item in items:
+        dt = item['dt']
+        if dt < start or dt >= end:
+            continue
+        
+        condition_id = (item.get('weather') or [{}])[0].get('id', 0)
+        pop = round(item.get('pop', 0) * 100)
+        temp = item['main']['temp']
+        
+        if 200 <= condition_id < 300:
+            note('thunderstorm', item, pop, lambda new, old: new > old)
+        if condition_id in HEAVY_RAIN_IDS or (500 <= condition_id < 600 and pop >= config.ALERT_POP_THRESHOLD):
+            note('heavy_rain', item, pop, lambda new, old: new > old)
+        if condition_id in HEAVY_SNOW_IDS:
+            note('heavy_snow', item, pop, lambda new, old: new > old)
+        if temp >= config.ALERT_HEAT_THRESHOLD:
+            note('heat', item, temp, lambda new, old: new > old)
+        if temp <= config.ALERT_COLD_THRESHOLD:
+            note('cold', item, temp, lambda new, old: new < old)
+    
+    zone = timezones.get_zone(timezone)
+    alerts = []
+    for kind, _, _ in ALERT_KINDS:
+        if kind not in found or kind not in enabled:
+            continue
+        item, peak = found[kind]
+        description = weather.simplify_weather_description((item.get('weather') or [{}])[0].get('description', ''))
+        day = datetime.fromtimestamp(item['dt'], tz=zone).strftime('%Y-%m-%d')
+        alerts.append(Alert(kind, item['dt'], peak, description, day))
+    return alerts
+
+
+def create_alert_message(alerts, location_name=None, timezone=None, updated=None):
+    """
+    お知らせのEmbedメッセージを作る
+    
+    Args:
+        alerts: Alertのリスト
+        location_name: 地点名(省略時はconfig.LOCATION_NAME)
+        timezone: 地点のタイムゾーン名(時刻の表示に使う)
+        updated: フッターの更新時刻の文字列(省略時は現在時刻)
+    
+    Returns:
+        dict: Discord Embed形式のメッセージ
+    """
+    location_name = location_name or config.LOCATION_NAME
+    zone = timezones.get_zone(timezone)
+    if updated is None:
+        updated = bot.updated_text(timezone)
+    
+    fields = []
+    for alert in alerts:
+        emoji, label = ALERT_LABELS[alert.kind]
+        start = datetime.fromtimestamp(alert.start, tz=zone).strftime('%m/%d %H時')
+        if alert.kind in ('heat', 'cold'):
+            detail = f"{'最高' if alert.kind == 'heat' else '最低'} {round(alert.peak, 1)}℃"
+        else:
+            detail = f"降水確率 最大{alert.peak}%"
+        fields.append({
+            "name": f"{emoji} {label}",
+            "value": f"{start}ごろから {alert.description} ({detail})",
+            "inline": False
+        })
+    
+    return {
+        "embeds": [{
+            "title": f"⚠️ 荒天のお知らせ ({location_name})",
+            "description": "新しい予報で、次の天気が見込まれるようになりました。",
+            "color": ALERT_COLOR,
+            "fields": fields,
+            "footer": {
+                "text": f"更新: {updated}"
+            }
+        }]
+    }
+
+
+def cell_name(cell):
+    """
+    セル(緯度, 経度, タイムゾーン名)を状態ファイルのキーにする
+    """
+    return f"{cell[0]},{cell[1]},{cell[2]}"
+
+
+def load_state(path=None):
+    """
+    前回までの確認結果({セル: {"fingerprint", "alerts", "valid_until"}})を読み込む
+    """
+    path = path or config.ALERT_STATE_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=None):
+    """
+    確認結果を保存する(一時ファイルに書いてから置き換える)
+    """
+    path = path or config.ALERT_STATE_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def poll_once(location_list, state, now=None):
+    """
+    全地点の予報を1回確認して、新しく見込まれるようになった荒天をお知らせする
+    
+    1. 予報キャッシュの有効期限内のセルは、予報が変わりようがないので取得しない
+    2. 取得したセルは予報の指紋(fingerprint)だけを計算し、前回と同じなら何もしない
+    3. 指紋が変わったセルだけ、しきい値を超える天気を探して前回のお知らせと比べる
+    
+    Args:
+        location_list: 地点情報の辞書のリスト
+        state: load_state()の結果(この関数の中で更新する)
+        now: 現在時刻(UNIX時間、省略時は現在)
+    
+    Returns:
+        dict: 件数のまとめ(cells, fetched, changed, alerts, failed=送れなかったセル)
+    """
+    now = time.time() if now is None else now
+    end = now + config.ALERT_HORIZON_HOURS * 3600
+    cells = locations.group_by_cell(location_list)
+    
+    due = [cell for cell in cells if now >= state.get(cell_name(cell), {}).get('valid_until', 0)]
+    if due:
+        from concurrent.futures import ThreadPoolExecutor
+        
+        workers = max(1, min(config.MAX_WORKERS, len(due)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = list(zip(due, executor.map(lambda cell: weather.get_weather_data(cell[0], cell[1]), due)))
+    else:
+        fetched = []
+    
+    # キャッシュを使うときは、次に予報が更新されるまで取得しない
+    valid_until = forecast_cache.next_expiry(now) if config.CACHE_DIR else 0
+    
+    dispatcher = bot.get_sender('alerts')
+    changed = 0
+    # お知らせを送るセル: (セルのキー, 送れたら保存する状態, 送ったEmbedのキーのリスト)
+    waiting = []
+    for cell, data in fetched:
+        if not data:
+            continue
+        
+        name = cell_name(cell)
+        previous = state.get(name, {})
+        items = weather.forecast_items(data)
+        current = fingerprint(items, now, end)
+        checked = dict(previous, fingerprint=current, valid_until=valid_until)
+        if current == previous.get('fingerprint'):
+            state[name] = checked
+            continue
+        
+        # 予報が変わったセルだけ詳しく調べる
+        changed += 1
+        alerts = detect_alerts(items, now, end, cell[2])
+        checked['alerts'] = [alert.alert_id for alert in alerts]
+        
+        known = set(previous.get('alerts', []))
+        new_alerts = [alert for alert in alerts if alert.alert_id not in known]
+        if not new_alerts:
+            state[name] = checked
+            continue
+        
+        updated = bot.updated_text(cell[2])
+        keys = []
+        for location in cells[cell]:
+            message = create_alert_message(new_alerts, location['name'], cell[2], updated)
+            key = f"{locations.location_key(location)}|{','.join(alert.alert_id for alert in new_alerts)}"
+            dispatcher.add(location['webhook_url'], message, key=key)
+            keys.append(key)
+        waiting.append((name, checked, keys))
+    
+    sent = failed = 0
+    if waiting:
+        results = dispatcher.flush()
+        delivered = {key for messages in results.values() for message in messages for key in message.keys}
+        for name, checked, keys in waiting:
+            # キューを使うときは、送れなかった分もキューに残って次の実行で送られる
+            if config.DELIVERY_QUEUE_FILE or delivered.issuperset(keys):
+                state[name] = checked
+                sent += len(keys)
+            else:
+                # 前の指紋のままにして、次の確認でもう一度調べて送り直す
+                failed += 1
+    
+    metrics.increment('alert_cells_total', len(cells))
+    metrics.increment('alert_cells_changed_total', changed)
+    metrics.increment('alerts_total', sent)
+    return {'cells': len(cells), 'fetched': len(fetched), 'changed': changed, 'alerts': sent, 'failed': failed}
+    
+    # 解説:
+    # 予報が変わらないセルは、指紋を比べるだけ(キャッシュの有効期限内なら取得もしない)なので、
+    # 数千地点あっても1回の確認にかかる時間は「予報が変わったセルの数」でほぼ決まります
+    # 状態(指紋とお知らせ済みの内容)は、お知らせを送れたか、キューに入れられたセルだけ更新します
+
+
+def run_alerts(location_list=None):
+    """
+    ALERT_INTERVAL秒ごとに予報を確認し続ける(常駐)
+    """
+    state = load_state()
+    print(f"🚨 荒天のお知らせを始めました ({config.ALERT_INTERVAL}秒ごとに{config.ALERT_HORIZON_HOURS}時間先まで確認)")
+    
+    while True:
+        current = location_list if location_list is not None else locations.load_locations()
+        start = time.perf_counter()
+        result = poll_once(current, state)
+        save_state(state)
+        print(f"🔎 {result['cells']}セルを確認 (取得{result['fetched']}・変化{result['changed']}・お知らせ{result['alerts']}件, "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms)")
+        if result['failed']:
+            print(f"⚠️  {result['failed']}セルのお知らせを送れませんでした(次の確認で送り直します)")
+        metrics.export()
+        time.sleep(config.ALERT_INTERVAL)
@@ -0,0 +1,78 @@
+import config
+import metrics
+
+
+def config_snapshot():
+    """
+    config.pyの設定値(大文字の名前)をまとめる
+    
+    子プロセスは新しく起動するので、実行中に変えた設定も引き継げるように渡します。
+    """
+    return {name: getattr(config, name) for name in dir(config) if name.isupper()}
+
+
+def _init_worker(settings):
+    """
+    子プロセスの初期化: 親プロセスと同じ設定にする
+    """
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+
+def _analyze_chunk(cells):
+    """
+    子プロセスで、セルのまとまりを取得・解析・おすすめ判定する
+    
+    Args:
+        cells: (緯度, 経度, タイムゾーン名)のリスト
+    
+    Returns:
+        tuple: (セルごとの結果のリスト, この間に記録したメトリクス)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import bot
+    
+    # 通信待ちはプロセスの中でスレッドを使って重ねる
+    workers = max(1, min(config.MAX_WORKERS, len(cells)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda cell: bot.analyze_cell(*cell), cells))
+    
+    return results, metrics.drain()
+
+
+def analyze_cells(cells, processes=None, chunk_size=None):
+    """
+    セルをプロセスに分けて取得・解析・おすすめ判定し、セルの順に返す
+    
+    Args:
+        cells: (緯度, 経度, タイムゾーン名)のリスト
+        processes: プロセス数(省略時はconfig.BATCH_PROCESSES)
+        chunk_size: 1回に子プロセスへ渡すセル数(省略時はconfig.BATCH_CHUNK_SIZE)
+    
+    Yields:
+        tuple: ((緯度, 経度, タイムゾーン名), bot.analyze_cell()の結果)
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    
+    cells = list(cells)
+    processes = processes or config.BATCH_PROCESSES
+    chunk_size = max(1, chunk_size or config.BATCH_CHUNK_SIZE)
+    chunks = [cells[i:i + chunk_size] for i in range(0, len(cells), chunk_size)]
+    
+    # forkだと親のスレッドや通信中の接続まで複製されるので、新しいプロセスで起動する
+    context = multiprocessing.get_context('spawn')
+    
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(processes, len(chunks))),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(config_snapshot(),)
+    ) as executor:
+        for chunk, (results, recorded) in zip(chunks, executor.map(_analyze_chunk, chunks)):
+            metrics.merge(recorded)
+            yield from zip(chunk, results)
+    
+    # 解説:
+    # executor.map()は渡した順(セルの順)に結果を返します
+    # 全部終わるのを待たずに、先頭から順に終わったまとまりの分だけ、Discordへの送信準備を進められます
@@ -0,0 +1,1843 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import sys
+import time
+import tracemalloc
+import requests
+import http_client
+import stub_server
+import weather
+import fetch_policy
+import forecast_cache
+import forecast_stream
+import recommend
+import discord_dispatcher
+from models import ForecastPoint
+import bot
+import config
+import fixtures
+
+
+def bench_http(args):
+    """
+    素のrequests.getと共有セッションの速度・接続数を比較する
+    """
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    url = f"{base_url}/data/2.5/forecast"
+    
+    results = {}
+    
+    # 毎回新しい接続(変更前のweather.get_weather_data()と同じ)
+    state.connections = 0
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        requests.get(url, params={'lat': 35.6762, 'lon': 139.6503}).json()
+    results['bare'] = (time.perf_counter() - start, state.connections)
+    
+    # 共有セッション(接続を使い回す)
+    state.connections = 0
+    session = http_client.create_session()
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        session.get(url, params={'lat': 35.6762, 'lon': 139.6503}, timeout=http_client.get_timeout()).json()
+    results['session'] = (time.perf_counter() - start, state.connections)
+    session.close()
+    
+    server.shutdown()
+    
+    print(f"📊 HTTPベンチマーク ({args.requests}リクエスト)")
+    for name, (elapsed, connections) in results.items():
+        print(f"   {name:8s}: {elapsed * 1000:8.1f} ms  "
+              f"({elapsed / args.requests * 1000:.2f} ms/件, 接続数 {connections})")
+
+
+# ---- 最適化する前の実装(出力が変わっていないかを比べるために残しておく) ----
+
+_BASELINE_WEATHER_MAP = {
+    '快晴': '晴れ',
+    '晴天': '晴れ',
+    '晴': '晴れ',
+    '薄い雲': '晴れ',
+    '曇りがち': '曇り',
+    '厚い雲': '曇り',
+    '雲': '曇り',
+    '小雨': '小雨',
+    '適度な雨': '雨',
+    '強い雨': '雨',
+    '大雨': '大雨',
+    '霧雨': '小雨',
+    '弱い雨': '小雨',
+    '小雪': '雪',
+    '雪': '雪',
+    '大雪': '大雪',
+    '霧': '霧',
+    'もや': '霧',
+    '雷雨': '雷雨',
+}
+
+
+def _baseline_simplify_weather_description(description):
+    """
+    変更前のweather.simplify_weather_description()(毎回、表を上から部分一致で探す)
+    """
+    for key, simple in _BASELINE_WEATHER_MAP.items():
+        if key in description:
+            return simple
+    return description
+
+
+def _baseline_analyze_weather_changes(forecasts):
+    """
+    変更前のweather.analyze_weather_changes()(APIの予報の辞書のリストを受け取る)
+    """
+    weather_list = [_baseline_simplify_weather_description(item['weather'][0]['description']) for item in forecasts]
+    
+    unique_weathers = []
+    previous_weather = None
+    for weather_name in weather_list:
+        if weather_name != previous_weather:
+            unique_weathers.append(weather_name)
+            previous_weather = weather_name
+    
+    if len(unique_weathers) == 1:
+        return unique_weathers[0]
+    elif len(unique_weathers) == 2:
+        return f"{unique_weathers[0]}のち{unique_weathers[1]}"
+    elif len(unique_weathers) == 3:
+        return f"{unique_weathers[0]}のち{unique_weathers[1]}一時{unique_weathers[2]}"
+    else:
+        return f"{unique_weathers[0]}のち{unique_weathers[1]}"
+
+
+def _baseline_parse_weather_data(data, now, timezone):
+    """
+    変更前(1件ずつループする)のweather.parse_weather_data()
+    
+    日本時間の決め打ちだけを、実行時刻(UNIX時間)とタイムゾーンを受け取る形に変えてあります
+    (pytzの代わりにtimezones.get_zone()を使う)。
+    
+    Returns:
+        tuple: (結果の辞書(解析できなければNone), 補完に使った時間帯の名前のリスト)
+    """
+    from datetime import datetime, timedelta
+    import timezones
+    
+    tz = timezones.get_zone(timezone)
+    now = datetime.fromtimestamp(now, tz=tz)
+    fallbacks = []
+    
+    try:
+        next_3hour = ((now.hour // 3) + 1) * 3
+        if next_3hour >= 24:
+            target_start = datetime(now.year, now.month, now.day, 0, 0, 0, tzinfo=tz) + timedelta(days=1)
+        else:
+            target_start = datetime(now.year, now.month, now.day, next_3hour, 0, 0, tzinfo=tz)
+        target_end = target_start + timedelta(hours=24)
+        
+        forecasts = [
+            item for item in data['list']
+            if target_start <= datetime.fromtimestamp(item['dt'], tz=tz) < target_end
+        ]
+        if not forecasts:
+            return None, fallbacks
+        
+        temps = [item['main']['temp'] for item in forecasts]
+        temp_min = min(temps)
+        temp_max = max(temps)
+        
+        morning_temp = None
+        noon_temp = None
+        night_temp = None
+        for item in forecasts:
+            hour = datetime.fromtimestamp(item['dt'], tz=tz).hour
+            temp = item['main']['temp']
+            if 6 <= hour <= 8 and morning_temp is None:
+                morning_temp = temp
+            if 12 <= hour <= 14 and noon_temp is None:
+                noon_temp = temp
+            if 18 <= hour <= 20 and night_temp is None:
+                night_temp = temp
+        
+        hours = [(datetime.fromtimestamp(item['dt'], tz=tz).hour, item['main']['temp']) for item in forecasts]
+        
+        if morning_temp is None:
+            fallbacks.append('morning')
+            candidates = [temp for hour, temp in hours if 0 <= hour < 12]
+            morning_temp = min(candidates) if candidates else temp_min
+        
+        if noon_temp is None:
+            fallbacks.append('noon')
+            candidates = [temp for hour, temp in hours if 11 <= hour < 16]
+            noon_temp = max(candidates) if candidates else temp_max
+        
+        if night_temp is None:
+            fallbacks.append('night')
+            candidates = [temp for hour, temp in hours if 17 <= hour <= 23]
+            night_temp = sum(candidates) / len(candidates) if candidates else (morning_temp + noon_temp) / 2
+        
+        weather_description = _baseline_analyze_weather_changes(forecasts)
+        weather_main = forecasts[0]['weather'][0]['main']
+        weather_icon = forecasts[0]['weather'][0]['icon'].replace('n', 'd')
+        pop = max(item.get('pop', 0) for item in forecasts) * 100
+        
+        date_str = now.strftime('%Y年%m月%d日(%a)')
+        weekday_dict = {
+            'Mon': '月', 'Tue': '火', 'Wed': '水',
+            'Thu': '木', 'Fri': '金', 'Sat': '土', 'Sun': '日'
+        }
+        for eng, jpn in weekday_dict.items():
+            date_str = date_str.replace(eng, jpn)
+        
+        return {
+            'temp_min': round(temp_min, 1),
+            'temp_max': round(temp_max, 1),
+            'morning_temp': round(morning_temp, 1),
+            'noon_temp': round(noon_temp, 1),
+            'night_temp': round(night_temp, 1),
+            'weather_main': weather_main,
+            'weather_description': weather_description,
+            'weather_icon': weather_icon,
+            'pop': round(pop, 0),
+            'date': date_str
+        }, fallbacks
+    
+    except (KeyError, IndexError):
+        return None, fallbacks
+
+
+def _baseline_recommend_clothing(temp_max, temp_min):
+    """
+    変更前のrecommend.recommend_clothing()(if/elifでしきい値を順に比べる)
+    """
+    temp_diff = temp_max - temp_min
+    
+    if temp_max >= 28:
+        clothing = "半袖で大丈夫です。暑がりの人は1日半袖で過ごせます。"
+    elif temp_max >= 25:
+        clothing = "半袖／薄手の長袖で大丈夫です。"
+    elif temp_max >= 20:
+        clothing = "半袖＋長袖シャツで大丈夫です。昼間は半袖で過ごせます。"
+    elif temp_max >= 15:
+        clothing = "長袖シャツ＋薄手のカーディガン／ナイロンパーカーで大丈夫です。"
+    elif temp_max >= 10:
+        clothing = "長袖シャツ＋薄手のカーディガン／Tシャツ＋スウェット／トレンチコートで大丈夫です。"
+    elif temp_max >= 5:
+        clothing = "長袖＋厚手のコート／ダウンジャケットで大丈夫です。"
+    else:
+        clothing = "冬服＋ダウン・厚手コートで大丈夫です。"
+    
+    additional_advice = []
+    if temp_min < 10:
+        additional_advice.append("朝晩は冷えます。")
+    if temp_diff >= 10:
+        additional_advice.append("脱ぎ着しやすい服を。")
+    if additional_advice:
+        clothing += "\n" + "".join(additional_advice)
+    return clothing
+
+
+def _baseline_recommend_items(pop, temp_max):
+    """
+    変更前のrecommend.recommend_items()
+    """
+    items = []
+    if pop >= 50:
+        items.append("傘必須です。")
+    elif pop >= 30:
+        items.append("折りたたみ傘があると安心です。")
+    else:
+        items.append("傘は不要です。")
+    if temp_max >= 30:
+        items.append("帽子・飲み物も忘れずに。")
+    return "\n".join(items)
+
+
+def _baseline_get_weather_emoji(weather_main):
+    """
+    変更前のrecommend.get_weather_emoji()(呼ぶたびに表を作る)
+    """
+    emoji_map = {
+        'Clear': '☀️',
+        'Clouds': '☁️',
+        'Rain': '🌧️',
+        'Drizzle': '🌦️',
+        'Thunderstorm': '⛈️',
+        'Snow': '⛄',
+        'Mist': '🌫️',
+        'Fog': '🌫️',
+    }
+    return emoji_map.get(weather_main, '🌤️')
+
+
+def _baseline_get_embed_color(weather_main):
+    """
+    変更前のrecommend.get_embed_color()(呼ぶたびに表を作る)
+    """
+    color_map = {
+        'Clear': 0xFFD700,
+        'Clouds': 0x808080,
+        'Rain': 0x4682B4,
+        'Drizzle': 0x87CEEB,
+        'Thunderstorm': 0x483D8B,
+        'Snow': 0xFFFFFF,
+        'Mist': 0xD3D3D3,
+        'Fog': 0xD3D3D3,
+    }
+    return color_map.get(weather_main, 0x3498db)
+
+
+# 比べるタイムゾーンと日付(夏時間の切り替わる日を含む)
+GOLDEN_ZONES = {
+    'Asia/Tokyo': ('2024-06-01', '2024-12-31'),
+    'Asia/Kolkata': ('2024-06-01',),
+    'UTC': ('2024-02-29',),
+    'Europe/London': ('2024-03-31', '2024-10-27', '2024-07-15'),
+    'America/New_York': ('2024-03-10', '2024-11-03', '2024-01-15'),
+    'Australia/Sydney': ('2024-04-07', '2024-10-06'),
+}
+
+# 実行時刻(現地時刻の時:分)
+GOLDEN_TIMES = ((0, 10), (5, 0), (8, 59), (11, 30), (17, 0), (21, 45))
+
+
+def _golden_payloads(start):
+    """
+    bench_golden用: start(UNIX時間)から始まる3時間ごとの予報と、それを間引いた予報
+    """
+    for name in fixtures.CLIMATES:
+        payload = fixtures.climate_payload(name, start)
+        items = payload['list']
+        yield f"{name}", payload
+        yield f"{name}/先頭なし", dict(payload, list=items[3:])
+        yield f"{name}/末尾なし", dict(payload, list=items[:6])
+        yield f"{name}/間引き", dict(payload, list=[item for i, item in enumerate(items) if i % 4 != 1])
+        yield f"{name}/2件", dict(payload, list=items[4:6])
+    for name in ('missing_pop', 'short_list'):
+        yield name, fixtures.edge_case_payload(name, start)
+
+
+def _interpolated_slots(data, now, timezone):
+    """
+    bench_golden用: 朝・昼・夜の気温のうち、ちょうどその時刻の予報がなく
+    前後の予報から補間して求める(今までの実装とは意図して値が変わる)時間帯があるか
+    """
+    from datetime import datetime, timedelta
+    import timezones
+    from forecast_series import ForecastSeries
+    
+    tz = timezones.get_zone(timezone)
+    local = datetime.fromtimestamp(now, tz=tz)
+    next_3hour = ((local.hour // 3) + 1) * 3
+    if next_3hour >= 24:
+        target_start = datetime(local.year, local.month, local.day, tzinfo=tz) + timedelta(days=1)
+    else:
+        target_start = datetime(local.year, local.month, local.day, next_3hour, tzinfo=tz)
+    start = target_start.timestamp()
+    
+    series, _ = ForecastSeries.from_items(
+        data['list'], start - weather.SERIES_MARGIN, start + 86400 + weather.SERIES_MARGIN
+    )
+    times = [t for (name, _, _), t in zip(weather.TIME_SLOTS, weather.slot_times(target_start)) if name != 'evening']
+    return any(value is not None and t not in series.dts for t, value in zip(times, series.at(times)))
+
+
+def bench_golden(args):
+    """
+    parse_weather_data()の結果が、最適化する前の実装と同じになるかを確かめる
+    
+    いくつものタイムゾーン(夏時間の切り替わる日を含む)・実行時刻・間引いた予報で、
+    最低・最高気温、時間帯ごとの気温(補完した値も)、天気、降水確率、日付を比べます。
+    ちょうどその時刻の予報がない時間帯の気温は、1時間ごとの予報に対応したときから
+    前後の予報で補間するようにしたので、その場合は時間帯の気温以外の項目を比べます。
+    """
+    from datetime import datetime
+    import timezones
+    
+    slot_fields = ('morning_temp', 'noon_temp', 'night_temp')
+    compared = exact = fallback_cases = interpolated = 0
+    fallback_slots = set()
+    mismatches = []
+    
+    for timezone, days in GOLDEN_ZONES.items():
+        tz = timezones.get_zone(timezone)
+        for day in days:
+            year, month, date = map(int, day.split('-'))
+            # 実際のAPIと同じUTCの3時間区切りと、現地時刻の3時間区切りの両方で予報を作る
+            local_midnight = int(datetime(year, month, date, tzinfo=tz).timestamp())
+            starts = {'UTC区切り': local_midnight // 10800 * 10800 - 10800, '現地区切り': local_midnight - 10800}
+            for grid, start in starts.items():
+                for name, payload in _golden_payloads(start):
+                    for hour, minute in GOLDEN_TIMES:
+                        now = datetime(year, month, date, hour, minute, tzinfo=tz).timestamp()
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            summary = weather.parse_weather_data(payload, now=now, timezone=timezone)
+                        expected, fallbacks = _baseline_parse_weather_data(payload, now, timezone)
+                        actual = summary.to_dict() if summary else None
+                        compared += 1
+                        
+                        if expected is not None and actual is not None and _interpolated_slots(payload, now, timezone):
+                            interpolated += 1
+                            expected = {key: value for key, value in expected.items() if key not in slot_fields}
+                            actual = {key: value for key, value in actual.items() if key not in slot_fields}
+                        else:
+                            exact += 1
+                            if expected is not None and fallbacks:
+                                fallback_cases += 1
+                                fallback_slots.update(fallbacks)
+                        
+                        if actual != expected:
+                            mismatches.append((timezone, day, grid, name, f"{hour:02d}:{minute:02d}", expected, actual))
+    
+    print(f"📊 解析結果の比較 ({len(GOLDEN_ZONES)}タイムゾーン, {compared}件)")
+    print(f"   全項目を比較: {exact}件 (うち時間帯の補完あり {fallback_cases}件: {', '.join(sorted(fallback_slots))})")
+    print(f"   補間で時間帯の気温が変わるため、それ以外の項目を比較: {interpolated}件")
+    for timezone, day, grid, name, at, expected, actual in mismatches[:args.show]:
+        print(f"   ❌ {timezone} {day} {at} {grid} {name}")
+        print(f"      今まで: {expected}")
+        print(f"      今    : {actual}")
+    
+    if mismatches:
+        print(f"❌ 今までの実装と結果が違います ({len(mismatches)}件)")
+        sys.exit(1)
+    if len(fallback_slots) < 3:
+        print("❌ 朝・昼・夜すべての補完を比べられていません")
+        sys.exit(1)
+    print("✅ 今までの実装と同じ結果になりました")
+
+
+def bench_parse(args):
+    """
+    parse_weather_data()を多数の地点分実行して1件あたりの時間を測る
+    """
+    payloads = [
+        stub_server.make_forecast_payload(temp=5.0 + i % 25)
+        for i in range(args.locations)
+    ]
+    
+    # 解析中のprint()は計測の邪魔なので捨てる
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for payload in payloads:
+            weather.parse_weather_data(payload)
+    elapsed = time.perf_counter() - start
+    
+    print(f"📊 解析ベンチマーク ({args.locations}地点)")
+    print(f"   合計: {elapsed * 1000:.1f} ms  ({elapsed / args.locations * 1e6:.1f} µs/地点)")
+
+
+def bench_interpolate(args):
+    """
+    3時間ごと・間引いた3時間ごと・1時間ごとの予報で、解析時間と時間帯別の気温の誤差を比べる
+    """
+    from datetime import datetime
+    from zoneinfo import ZoneInfo
+    
+    jst = ZoneInfo('Asia/Tokyo')
+    start_dt = int(time.time()) // 86400 * 86400
+    
+    cases = {'3時間ごと': [], '6時間ごと(欠けあり)': [], '1時間ごと': []}
+    for name in fixtures.CLIMATES:
+        three_hourly = fixtures.climate_payload(name, start_dt)
+        sparse = dict(three_hourly, list=three_hourly['list'][::2])
+        hourly = fixtures.hourly_payload(name, start_dt)
+        
+        # 本番と同じく、decode_forecast()で項目を絞った形にしてから解析する
+        payloads = [
+            forecast_stream.decode_forecast([json.dumps(payload).encode('utf-8')])
+            for payload in (three_hourly, sparse, hourly)
+        ]
+        
+        # 実行時刻を日本時間の0時〜21時まで3時間ずつずらす
+        for offset in range(0, 86400, 10800):
+            now = start_dt + offset + 3600
+            for case, payload in zip(cases, payloads):
+                cases[case].append((name, now, payload))
+    
+    print(f"📊 時間帯別の気温の補間 ({len(fixtures.CLIMATES)}パターン × 8時刻 × {args.repeat}回)")
+    for case, runs in cases.items():
+        errors = []
+        elapsed = 0.0
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, now, payload in runs:
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    summary = weather.parse_weather_data(payload, now=now)
+                elapsed += time.perf_counter() - start
+                
+                # 予報のもとになった気温の波と比べる
+                target_start = datetime.fromtimestamp((now // 10800 + 1) * 10800, tz=jst)
+                morning, noon, _, night = weather.slot_times(target_start)
+                for value, slot in ((summary.morning_temp, morning), (summary.noon_temp, noon),
+                                    (summary.night_temp, night)):
+                    errors.append(abs(value - fixtures.true_temp(name, slot)))
+        
+        count = len(runs) * args.repeat
+        print(f"   {case:14s}: {elapsed / count * 1e6:7.1f} µs/回  "
+              f"誤差 平均 {statistics.mean(errors):.2f}℃ / 最大 {max(errors):.2f}℃")
+
+
+def bench_timezones(args):
+    """
+    多数のタイムゾーンの地点で、予報の現地時刻の「時」を求める方法を比べる
+    (予報1件ごとのdatetime.fromtimestamp / 時差表を使った整数の計算)
+    """
+    import zoneinfo
+    from datetime import datetime
+    import timezones
+    
+    names = sorted(zoneinfo.available_timezones())
+    names = random.Random(0).sample(names, min(args.zones, len(names)))
+    start_dt = int(time.time()) // 3600 * 3600
+    dts = [start_dt + i * 3600 for i in range(args.points)]
+    
+    def per_point():
+        return [
+            [datetime.fromtimestamp(dt, tz=timezones.get_zone(name)).hour for dt in dts]
+            for name in names
+        ]
+    
+    def offset_tables():
+        return [timezones.offset_table(name, dts[0], dts[-1]).local_hours(dts) for name in names]
+    
+    # 最初の1回は時差表を作る時間も含む
+    start = time.perf_counter()
+    expected = offset_tables()
+    build = time.perf_counter() - start
+    
+    print(f"📊 タイムゾーン変換 ({len(names)}タイムゾーン × 予報{args.points}件 × {args.repeat}回)")
+    print(f"   時差表の作成: {build * 1000:8.2f} ms (最初の1回だけ)")
+    for name, func in [('fromtimestamp', per_point), ('時差表', offset_tables)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            hours = func()
+        elapsed = time.perf_counter() - start
+        print(f"   {name:14s}: {elapsed / args.repeat * 1000:8.2f} ms/回  "
+              f"({elapsed / args.repeat / len(names) * 1e6:.1f} µs/地点)  一致: {hours == expected}")
+
+
+def bench_decode(args):
+    """
+    response.json()相当の一括デコードとストリーミング解析のピークメモリ・時間を比較する
+    """
+    payload = stub_server.make_forecast_payload(count=args.entries)
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    chunks = [body[i:i + 16384] for i in range(0, len(body), 16384)]
+    min_dt, max_dt = weather.forecast_window()
+    
+    def full_json():
+        # response.json()と同じく、本文を全部つなげてから一括でデコードする
+        return json.loads(b''.join(chunks))
+    
+    def streaming():
+        return forecast_stream.decode_forecast(iter(chunks), min_dt=min_dt, max_dt=max_dt)
+    
+    print(f"📊 デコードベンチマーク (予報{args.entries}件, {len(body) / 1024:.0f} KiB × {args.repeat}回)")
+    for name, func in [('json', full_json), ('stream', streaming)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            data = func()
+            del data
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        print(f"   {name:8s}: {elapsed / args.repeat * 1000:8.2f} ms/回  "
+              f"ピークメモリ {peak / 1024:8.1f} KiB")
+
+
+def bench_conditions(args):
+    """
+    天気説明の変換と服装・持ち物の判定を、変更前の実装と今の表を使う実装で多地点分実行して比べる
+    
+    両方の結果がすべて同じであることも確かめます。
+    """
+    # 気候パターンの予報から、地点ごとに24時間分(8件)を切り出す
+    start_dt = 1717200000
+    payloads = [fixtures.climate_payload(name, start_dt) for name in fixtures.CLIMATES]
+    smoke = {'id': 711, 'main': 'Smoke', 'description': '煙', 'icon': '50d'}
+    
+    workload = []
+    for i in range(args.locations):
+        offset = i % 32
+        items = payloads[i % len(payloads)]['list'][offset:offset + 8]
+        if i % 13 == 0:
+            # 表にない天気(既定の絵文字・色、説明そのまま)も混ぜる
+            items = [dict(items[0], weather=[smoke])] + items[1:]
+        points = [ForecastPoint.from_item(item, (offset + j) * 3 % 24) for j, item in enumerate(items)]
+        temps = [item['main']['temp'] for item in items]
+        temp_max = round(max(temps) + i % 7 - 3, 1)
+        temp_min = round(min(temps) + i % 5 - 2, 1)
+        pop = round(max(item.get('pop', 0) for item in items) * 100 + i % 11, 0)
+        workload.append((items, points, temp_max, temp_min, pop))
+    
+    def baseline():
+        return [
+            (
+                _baseline_analyze_weather_changes(items),
+                _baseline_recommend_clothing(temp_max, temp_min),
+                _baseline_recommend_items(pop, temp_max),
+                _baseline_get_weather_emoji(items[0]['weather'][0]['main']),
+                _baseline_get_embed_color(items[0]['weather'][0]['main']),
+            )
+            for items, _, temp_max, temp_min, pop in workload
+        ]
+    
+    def tables():
+        return [
+            (
+                weather.analyze_weather_changes(points),
+                recommend.recommend_clothing(temp_max, temp_min),
+                recommend.recommend_items(pop, temp_max),
+                recommend.get_weather_emoji(points[0].weather_main),
+                recommend.get_embed_color(points[0].weather_main),
+            )
+            for _, points, temp_max, temp_min, pop in workload
+        ]
+    
+    print(f"📊 天気変換・おすすめ判定ベンチマーク ({args.locations}地点, {len(payloads)}パターン)")
+    results = {}
+    base_time = None
+    for label, func in (('今まで', baseline), ('変換表', tables)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[label] = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        base_time = base_time or best
+        print(f"   {label:6s}: {best * 1000:8.1f} ms  ({best / args.locations * 1e6:.2f} µs/地点, {base_time / best:.1f}倍)")
+    
+    differences = sum(a != b for a, b in zip(results['今まで'], results['変換表']))
+    if differences:
+        print(f"❌ 今までの実装と結果が違う地点があります ({differences}地点)")
+        sys.exit(1)
+    print("✅ すべての地点で今までの実装と同じ結果になりました")
+
+
+def bench_profiles(args):
+    """
+    購読者ごとのおすすめとEmbedを、1人ずつ作る方法としきい値ごとにまとめる方法で比べる
+    """
+    import profiles
+    
+    rng = random.Random(args.seed)
+    start_dt = int(time.time()) // 10800 * 10800
+    with contextlib.redirect_stdout(io.StringIO()):
+        summaries = [weather.parse_weather_data(payload) for payload in fixtures.all_payloads(start_dt).values()]
+    results = [
+        (summary,) + recommend.recommend_for_summary(summary)
+        for summary in summaries if summary
+    ]
+    updated = bot.updated_text()
+    
+    # 好みの候補(寒がり・暑がり × 外にいる時間帯 × 傘の許容度)
+    choices = [
+        profiles.Profile(sensitivity, commute, umbrella)
+        for sensitivity in range(-5, 6)
+        for commute in ((), ('morning',), ('night',), ('morning', 'night'), ('noon',))
+        for umbrella in range(-30, 31, 5)
+    ]
+    
+    print(f"📊 購読者ごとのおすすめ ({args.subscribers}人, {args.locations}地点, 好みの候補{len(choices)}通り)")
+    for count in [int(count) for count in args.profiles.split(',')]:
+        chosen = rng.sample(choices, min(count, len(choices)))
+        subscribers = [
+            (rng.randrange(args.locations), chosen[rng.randrange(len(chosen))])
+            for _ in range(args.subscribers)
+        ]
+        
+        # 1人ずつ: しきい値の計算・判定・文章・Embedを購読者ごとに作る
+        start = time.perf_counter()
+        for index, profile in subscribers:
+            result = results[index % len(results)]
+            texts = recommend.render_outcome(profile.thresholds().outcome(result[0]))
+            bot._embed_templates.bind(result[0], *texts, updated).render({'location_name': f"地点{index}"})
+        naive = time.perf_counter() - start
+        
+        # まとめて: しきい値の計算は読み込み時に1回、判定と文章は地点ごと・しきい値ごとに1回
+        start = time.perf_counter()
+        by_profile = {}
+        shared = {}
+        cells = {}
+        for index, profile in subscribers:
+            thresholds = by_profile.get(profile)
+            if thresholds is None:
+                thresholds = profile.thresholds()
+                thresholds = by_profile[profile] = shared.setdefault(thresholds.key, thresholds)
+            cells.setdefault(index, []).append({'name': f"地点{index}", 'thresholds': thresholds})
+        for index, cell_locations in cells.items():
+            bot.render_cell(results[index % len(results)], cell_locations, updated)
+        batched = time.perf_counter() - start
+        
+        print(f"   好み{len(chosen):4d}通り(しきい値{len(shared):4d}通り): 1人ずつ {naive * 1000:8.1f} ms  "
+              f"まとめて {batched * 1000:7.1f} ms  ({naive / batched:5.1f}倍)")
+    
+    # 解説:
+    # まとめる方法の時間は購読者数ではなく、地点数 × しきい値の種類の数で増えます
+
+
+def bench_embeds(args):
+    """
+    Embedの作成とJSONへの変換を、今までの方法とテンプレートで比べる(メッセージ/秒)
+    """
+    import embed_template
+    
+    start_dt = int(time.time()) // 10800 * 10800
+    summaries = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for payload in fixtures.all_payloads(start_dt).values():
+            summary = weather.parse_weather_data(payload)
+            if summary:
+                summaries.append((summary, *recommend.recommend_for_summary(summary)))
+    
+    jobs = [(*summaries[i % len(summaries)], f"地点{i}") for i in range(args.messages)]
+    updated = bot.updated_text()
+    
+    def current():
+        # 変更前: 毎回dictを組み立て、requestsと同じように標準のjsonで変換する
+        for summary, clothing, items, name in jobs:
+            json.dumps(bot.create_embed_message(summary, clothing, items, name)).encode('utf-8')
+    
+    def templates():
+        templates = embed_template.TemplateCache(bot.create_embed_message)
+        for summary, clothing, items, name in jobs:
+            embed = templates.render(summary, clothing, items, name, updated)
+            embed_template.encode_message({"embeds": [embed]})
+    
+    # 同じセル(予報)の地点が続く場合: 地点名以外を1回だけ埋めて使い回す
+    cells = [jobs[i:i + args.per_cell] for i in range(0, len(jobs), args.per_cell)]
+    
+    def bound_templates():
+        templates = embed_template.TemplateCache(bot.create_embed_message)
+        for cell in cells:
+            summary, clothing, items, _ = cell[0]
+            template = templates.bind(summary, clothing, items, updated)
+            for _, _, _, name in cell:
+                embed_template.encode_message({"embeds": [template.render({'location_name': name})]})
+    
+    encoder = 'orjson' if embed_template.get_orjson() is not None else '標準json'
+    print(f"📊 Embed作成+JSON変換ベンチマーク ({args.messages}件, エンコーダー: {encoder})")
+    
+    baseline = None
+    for label, func in (
+        ('今まで', current),
+        ('テンプレート', templates),
+        (f"テンプレート(1セル{args.per_cell}地点)", bound_templates),
+    ):
+        best = min(_timed_run(func) for _ in range(args.repeat))
+        baseline = baseline or best
+        print(f"   {label:<22}: {best * 1000:8.1f} ms  {args.messages / best:10.0f} 件/秒  ({baseline / best:.1f}倍)")
+
+
+def _timed_run(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_dispatch(args):
+    """
+    1件ずつ送る方法とディスパッチャー(まとめ送信+レート制限対応)を比較する
+    """
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    webhooks = [f"{base_url}/api/webhooks/{i}/token" for i in range(args.webhooks)]
+    embed = {"title": "☁️ 今日の天気予報", "description": "📅 ベンチマーク", "fields": []}
+    
+    print(f"📊 Discord送信ベンチマーク (Webhook {args.webhooks}個 × Embed {args.embeds}個, "
+          f"制限 {state.webhook_limit}回/{state.webhook_window}秒)")
+    
+    # 変更前と同じ: 1Embedにつき1リクエスト、429は失敗扱い
+    session = http_client.create_session()
+    start = time.perf_counter()
+    delivered = 0
+    for url in webhooks:
+        for _ in range(args.embeds):
+            response = session.post(url, json={"embeds": [embed]})
+            delivered += response.status_code == 204
+    elapsed = time.perf_counter() - start
+    print(f"   1件ずつ  : {elapsed * 1000:8.1f} ms  届いた {delivered}件  "
+          f"リクエスト {len(state.webhook_requests) + state.rate_limited}回  429 {state.rate_limited}回")
+    
+    # ディスパッチャー: 10個ずつまとめ、ヘッダーを見て待つ
+    state.webhook_requests = []
+    state.webhook_buckets = {}
+    state.rate_limited = 0
+    dispatcher = discord_dispatcher.DiscordDispatcher(session=session)
+    for url in webhooks:
+        for _ in range(args.embeds):
+            dispatcher.add(url, {"embeds": [embed]})
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        delivered = sum(message.embeds for messages in dispatcher.flush().values() for message in messages)
+    elapsed = time.perf_counter() - start
+    print(f"   まとめ送信: {elapsed * 1000:8.1f} ms  届いた {delivered}件  "
+          f"リクエスト {len(state.webhook_requests) + state.rate_limited}回  429 {state.rate_limited}回")
+    
+    session.close()
+    server.shutdown()
+
+
+def bench_updates(args):
+    """
+    1日に何回も投稿するときの、差分更新あり/なしのDiscordへのリクエスト数を比べる
+    """
+    rng = random.Random(args.seed)
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    state.webhook_limit = 1000
+    
+    location_list = [
+        {
+            'name': f"地点{i}",
+            'latitude': 30 + i * 0.1,
+            'longitude': 135.0,
+            'webhook_url': f"{base_url}/api/webhooks/{i % args.webhooks}/token",
+        }
+        for i in range(args.locations)
+    ]
+    
+    # 実行ごとに、予報の気温を少しずつランダムに変える
+    start_dt = int(time.time()) // 10800 * 10800
+    runs = [
+        [stub_server.make_forecast_payload(start_dt, temp=15 + rng.gauss(0, args.jitter)) for _ in range(10)]
+        for _ in range(args.runs)
+    ]
+    
+    saved = (config.WEATHER_API_URL, config.CACHE_DIR, config.POST_HISTORY_FILE, config.DELIVERY_QUEUE_FILE)
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.CACHE_DIR = ''
+    # 同じ日に何回も投稿するので、送信キュー(1日1回の冪等キー)は使わない
+    config.DELIVERY_QUEUE_FILE = ''
+    
+    print(f"📊 差分更新 ({args.locations}地点 × {args.runs}回, Webhook {args.webhooks}個, 気温のばらつき ±{args.jitter}℃)")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for label, history_file in (('毎回投稿', ''), ('差分更新', os.path.join(directory, 'history.json'))):
+                config.POST_HISTORY_FILE = history_file
+                state.webhook_requests, state.webhook_edits = [], []
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for payloads in runs:
+                        state.use_fixtures(payloads)
+                        bot.post_all_locations(location_list)
+                elapsed = time.perf_counter() - start
+                print(f"   {label}: 新規投稿 {len(state.webhook_requests):5d}回  書き換え {len(state.webhook_edits):5d}回  "
+                      f"{elapsed * 1000:8.1f} ms")
+    finally:
+        config.WEATHER_API_URL, config.CACHE_DIR, config.POST_HISTORY_FILE, config.DELIVERY_QUEUE_FILE = saved
+        server.shutdown()
+
+
+def _per_call(func, arguments):
+    """
+    arguments(引数タプルのリスト)を順に渡してfuncを実行し、1回あたりの秒数を返す
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for argument in arguments:
+            func(*argument)
+        elapsed = time.perf_counter() - start
+    return elapsed / len(arguments)
+
+
+def bench_functions(sizes, payloads):
+    """
+    parse_weather_data / analyze_weather_changes / create_embed_message の1回あたりの時間
+    """
+    results = {}
+    
+    for size in sizes:
+        data = [payloads[i % len(payloads)] for i in range(size)]
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            summaries = [weather.parse_weather_data(payload) for payload in data]
+        points = [
+            [ForecastPoint.from_item(item, 0) for item in payload['list'][:8]]
+            for payload in data
+        ]
+        embed_arguments = [
+            (summary, *recommend.recommend_for_summary(summary), f"地点{i}")
+            for i, summary in enumerate(summaries) if summary
+        ]
+        
+        results[str(size)] = {
+            'parse_weather_data_us': _per_call(weather.parse_weather_data, [(p,) for p in data]) * 1e6,
+            'analyze_weather_changes_us': _per_call(weather.analyze_weather_changes, [(p,) for p in points]) * 1e6,
+            'create_embed_message_us': _per_call(bot.create_embed_message, embed_arguments) * 1e6,
+        }
+    
+    return results
+
+
+def bench_end_to_end(sizes, payloads, webhooks):
+    """
+    スタブサーバーを相手にpost_weather_forecast()全体を実行して、処理時間とスループットを測る
+    """
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    state.use_fixtures(payloads)
+    # Discordのレート制限ではなく、Bot側の処理を測る
+    state.webhook_limit = 1_000_000
+    
+    saved = (config.WEATHER_API_URL, config.CACHE_DIR, config.POST_HISTORY_FILE, config.DELIVERY_QUEUE_FILE)
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.CACHE_DIR = ''
+    config.POST_HISTORY_FILE = ''
+    config.DELIVERY_QUEUE_FILE = ''
+    
+    results = {}
+    try:
+        for size in sizes:
+            location_list = [
+                {
+                    'name': f"地点{i}",
+                    # 全地点が別々のグリッドのセルになるように0.1度ずつずらす
+                    'latitude': 30.0 + (i % 100) * 0.1,
+                    'longitude': 130.0 + (i // 100) * 0.1,
+                    'webhook_url': f"{base_url}/api/webhooks/{i % webhooks}/bench",
+                }
+                for i in range(size)
+            ]
+            
+            state.forecast_requests = 0
+            state.webhook_requests = []
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                bot.post_weather_forecast(location_list)
+                elapsed = time.perf_counter() - start
+            
+            results[str(size)] = {
+                'wall_seconds': elapsed,
+                'locations_per_second': size / elapsed,
+                'forecast_requests': state.forecast_requests,
+                'webhook_requests': len(state.webhook_requests),
+            }
+    finally:
+        config.WEATHER_API_URL, config.CACHE_DIR, config.POST_HISTORY_FILE, config.DELIVERY_QUEUE_FILE = saved
+        server.shutdown()
+    
+    return results
+
+
+def bench_suite(args):
+    """
+    記録済みの予報データとスタブサーバーだけで、関数単体と全体の性能を測って保存する
+    """
+    sizes = [int(size) for size in args.sizes.split(',')]
+    payloads = list(fixtures.all_payloads().values())
+    
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sizes': sizes,
+        'functions': bench_functions(sizes, payloads),
+        'end_to_end': bench_end_to_end(sizes, payloads, args.webhooks),
+    }
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    
+    print(f"📊 ベンチマーク結果 ({args.output})")
+    for section in ('functions', 'end_to_end'):
+        for size, values in results[section].items():
+            for name, value in values.items():
+                line = f"   {section:10s} {size:>6s} {name:28s} {value:14.2f}"
+                old = (baseline or {}).get(section, {}).get(size, {}).get(name)
+                if old:
+                    line += f"  (前回比 {value / old:.2f}倍)"
+                print(line)
+
+
+def measure_import_ms(module='bot'):
+    """
+    新しいPythonプロセスで-X importtimeを使い、moduleの読み込み時間(ミリ秒)を測る
+    
+    Returns:
+        tuple: (読み込み時間, [(時間, モジュール名), ...] 時間のかかった順)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True
+    )
+    
+    total = None
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        modules.append((int(self_us) / 1000, name))
+        if name == module:
+            total = int(cumulative_us) / 1000
+    
+    modules.sort(reverse=True)
+    return total, modules
+
+
+def bench_startup(args):
+    """
+    bot.pyの起動(import)時間を測り、予算を超えたら終了コード1で終わる
+    """
+    samples = []
+    for _ in range(args.repeat):
+        total, modules = measure_import_ms()
+        samples.append(total)
+    
+    median = statistics.median(samples)
+    
+    print(f"📊 起動時間ベンチマーク (import bot, {args.repeat}回の中央値)")
+    print(f"   {median:.1f} ms  (予算 {args.budget_ms:.0f} ms)")
+    print("   時間のかかったモジュール:")
+    for self_ms, name in modules[:args.top]:
+        print(f"     {self_ms:7.2f} ms  {name}")
+    
+    if median > args.budget_ms:
+        print("❌ 起動時間が予算を超えました")
+        sys.exit(1)
+    print("✅ 起動時間は予算内です")
+
+
+def bench_singleflight(args):
+    """
+    同じ地点をN個のスレッドで同時に取得して、APIへのリクエストが1回になることを確かめる
+    """
+    import threading
+    
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    state.delay = args.delay
+    
+    saved = (config.WEATHER_API_URL, config.CACHE_DIR)
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.CACHE_DIR = ''
+    
+    results = []
+    barrier = threading.Barrier(args.callers)
+    
+    def caller():
+        barrier.wait()
+        results.append(weather.get_weather_data(35.6762, 139.6503))
+    
+    threads = [threading.Thread(target=caller) for _ in range(args.callers)]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+    finally:
+        config.WEATHER_API_URL, config.CACHE_DIR = saved
+        server.shutdown()
+    
+    shared = all(result is results[0] for result in results) and results[0] is not None
+    
+    print(f"📊 同時リクエストのまとめ ({args.callers}スレッド, 応答 {args.delay}秒)")
+    print(f"   APIへのリクエスト: {state.forecast_requests}回  結果の共有: {'OK' if shared else 'NG'}  "
+          f"経過 {elapsed * 1000:.0f} ms")
+    
+    if state.forecast_requests != 1 or not shared:
+        print("❌ リクエストがまとめられていません")
+        sys.exit(1)
+    print("✅ 1回のリクエストを全員で共有しました")
+
+
+def _latency_percentiles(samples):
+    ordered = sorted(samples)
+    return (
+        ordered[len(ordered) // 2] * 1000,
+        ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    )
+
+
+def _serve_stub(queue, payloads):
+    """
+    別プロセスでスタブサーバーを動かす(bench_batchの計測対象と同じプロセスにしないため)
+    """
+    state = stub_server.StubState()
+    state.use_fixtures(payloads)
+    server, base_url = stub_server.start_stub_server(state=state)
+    queue.put(base_url)
+    while True:
+        time.sleep(1)
+
+
+@contextlib.contextmanager
+def _silence_output():
+    """
+    子プロセスのログも含めて、画面への出力を止める
+    """
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(devnull)
+        os.close(saved)
+
+
+def bench_archive(args):
+    """
+    予報アーカイブの追記・索引作成・列の読み出し(mmap)の速さを測る
+    """
+    import forecast_archive
+    
+    start_dt = int(time.time()) // 10800 * 10800
+    payload = stub_server.make_forecast_payload(start_dt)
+    data = forecast_stream.decode_forecast([json.dumps(payload).encode('utf-8')])
+    
+    print(f"📊 予報アーカイブ ({args.fetches}回分 × {len(data['list'])}件)")
+    with tempfile.TemporaryDirectory() as directory:
+        archive = forecast_archive.ForecastArchive(directory)
+        
+        start = time.perf_counter()
+        for i in range(args.fetches):
+            archive.append(35 + (i % 1000) * 0.01, 139.0, data, fetched_at=start_dt + (i // 1000) * 86400)
+        elapsed = time.perf_counter() - start
+        print(f"   追記    : {elapsed * 1000:8.1f} ms  ({args.fetches / elapsed:8.0f} 回/秒)")
+        
+        start = time.perf_counter()
+        index = archive.index()
+        elapsed = time.perf_counter() - start
+        print(f"   索引作成: {elapsed * 1000:8.1f} ms  ({len(index)}地点)")
+        
+        # 全行の気温の平均: mmapの列をそのまま読む場合と、JSONを読み直す場合
+        with archive.reader() as reader:
+            start = time.perf_counter()
+            temps = reader.views['temp']
+            rows = len(temps)
+            average = sum(temps) / rows / 100
+            elapsed = time.perf_counter() - start
+        print(f"   列の読み出し(mmap): {elapsed * 1000:8.1f} ms  平均 {average:.2f}℃ ({rows}行)")
+        
+        encoded = [json.dumps(data) for _ in range(args.fetches)]
+        start = time.perf_counter()
+        total = count = 0
+        for text in encoded:
+            for item in json.loads(text)['list']:
+                total += item['main']['temp']
+                count += 1
+        elapsed = time.perf_counter() - start
+        print(f"   JSONを読み直す場合 : {elapsed * 1000:8.1f} ms  平均 {total / count:.2f}℃ ({count}行)")
+
+
+def bench_batch(args):
+    """
+    プロセス数を変えて、取得・解析・おすすめ判定のスループット(地点/秒)を測る
+    """
+    import multiprocessing
+    
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    start_dt = int(time.time()) // 10800 * 10800
+    stub = context.Process(target=_serve_stub, args=(queue, list(fixtures.all_payloads(start_dt).values())), daemon=True)
+    stub.start()
+    base_url = queue.get(timeout=30)
+    
+    cells = [(round(20 + (i // 500) * 0.1, 4), round(120 + (i % 500) * 0.1, 4)) for i in range(args.locations)]
+    names = ('WEATHER_API_URL', 'CACHE_DIR', 'BATCH_PROCESSES', 'BATCH_CHUNK_SIZE')
+    saved = {name: getattr(config, name) for name in names}
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.CACHE_DIR = ''
+    config.BATCH_CHUNK_SIZE = args.chunk_size
+    
+    if args.processes:
+        process_counts = [int(count) for count in args.processes.split(',')]
+    else:
+        # 1, 2, 4, ... とCPUの数まで
+        cpus = os.cpu_count() or 1
+        process_counts = sorted({1, 2, cpus} | {2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus})
+    print(f"📊 複数プロセスでの一括処理 ({args.locations}セル, CPU {os.cpu_count()}個, "
+          f"{args.chunk_size}セルずつ)")
+    
+    baseline = None
+    try:
+        for processes in process_counts:
+            config.BATCH_PROCESSES = processes
+            start = time.perf_counter()
+            with _silence_output():
+                analyzed = sum(1 for _, result in bot.analyze_cells(cells) if result)
+            elapsed = time.perf_counter() - start
+            
+            throughput = analyzed / elapsed
+            baseline = baseline or throughput
+            label = 'スレッドのみ' if processes <= 1 else f"{processes}プロセス"
+            print(f"   {label:<8}: {elapsed * 1000:8.1f} ms  {throughput:8.0f} 地点/秒  "
+                  f"({throughput / baseline:.2f}倍)  成功 {analyzed}/{len(cells)}")
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        stub.terminate()
+    
+    # 解説:
+    # 子プロセスの起動(数百ms)も含めて測っています
+    # CPUの数より多いプロセスにしても速くはなりません
+
+
+def bench_faults(args):
+    """
+    スタブサーバーで障害を起こし、再試行・サーキットブレーカー・ヘッジの動きを確かめる
+    """
+    random.seed(args.seed)
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    
+    names = (
+        'WEATHER_API_URL', 'CACHE_DIR', 'FETCH_RETRIES', 'FETCH_BACKOFF_BASE',
+        'HEDGE_ENABLED', 'HEDGE_MIN_SAMPLES'
+    )
+    saved = {name: getattr(config, name) for name in names}
+    saved_policy = (weather._breaker, weather._latency, forecast_cache._cache)
+    
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.FETCH_RETRIES = 3
+    config.FETCH_BACKOFF_BASE = 0.01
+    config.HEDGE_ENABLED = False
+    
+    checks = []
+    
+    def check(name, ok, detail):
+        checks.append(ok)
+        print(f"   {'✅' if ok else '❌'} {name}: {detail}")
+    
+    def fetch_count(func):
+        before = state.forecast_requests
+        result = func()
+        return result, state.forecast_requests - before
+    
+    def fetch():
+        return weather.get_weather_data(35.6762, 139.6503)
+    
+    print("📊 障害時の取得の動き")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            config.CACHE_DIR = ''
+            weather._breaker = fetch_policy.CircuitBreaker(failure_threshold=3, reset_timeout=60)
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                # 一時的な503は再試行で取り戻す
+                state.fail_next = 2
+                data, requests_sent = fetch_count(fetch)
+            check('一時的な503', data is not None and requests_sent == 3, f"{requests_sent}回で成功")
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                # 本文の途中で切れた応答も再試行で取り戻す
+                state.drop_next = 2
+                data, requests_sent = fetch_count(fetch)
+            check('途中で切れた応答', data is not None and requests_sent == 3, f"{requests_sent}回で成功")
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                # 401のような再試行しても無駄なエラーは1回であきらめ、ブレーカーの失敗にも数えない
+                state.fail_status, state.fail_next = 401, 4
+                data, requests_sent = fetch_count(fetch)
+                for _ in range(3):
+                    fetch()
+                state.fail_status = 503
+            check(
+                '再試行しないエラー(401)',
+                data is None and requests_sent == 1 and weather._breaker.state == 'closed',
+                f"{requests_sent}回であきらめる  4回続けても ブレーカー: {weather._breaker.state}"
+            )
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                # 障害が続いたらブレーカーを開き、古いキャッシュで投稿を続ける
+                config.CACHE_DIR = directory
+                forecast_cache._cache = forecast_cache.ForecastCache(directory)
+                weather._breaker = fetch_policy.CircuitBreaker(failure_threshold=3, reset_timeout=60)
+                fetch()
+                key = forecast_cache.cache_key(35.6762, 139.6503, weather.UNITS, weather.LANG)
+                entry = forecast_cache._cache.load(key)
+                forecast_cache._cache.store(key, entry['data'], expires_at=1)
+                
+                state.fail_rate = 1.0
+                before = state.forecast_requests
+                results = [fetch() for _ in range(10)]
+                outage_requests = state.forecast_requests - before
+                breaker_state = weather._breaker.state
+            
+            expected = 3 * (config.FETCH_RETRIES + 1)
+            check(
+                '障害中のフォールバック',
+                all(result is not None for result in results) and outage_requests == expected and breaker_state == 'open',
+                f"10回の取得でAPIへ{outage_requests}回、ブレーカー: {breaker_state}"
+            )
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                # 復旧したら半開状態の1回で閉じる
+                state.fail_rate = 0.0
+                weather._breaker.reset_timeout = 0.1
+                time.sleep(0.15)
+                data, requests_sent = fetch_count(fetch)
+            check('復旧', data is not None and weather._breaker.state == 'closed', f"ブレーカー: {weather._breaker.state}")
+            
+            # 遅い応答が混ざるときのヘッジの効果(チェックではなく参考値)
+            config.CACHE_DIR = ''
+            config.HEDGE_MIN_SAMPLES = 20
+            state.slow_rate, state.slow_delay = args.slow_rate, args.slow_delay
+            
+            for hedge in (False, True):
+                config.HEDGE_ENABLED = hedge
+                weather._latency = fetch_policy.LatencyTracker()
+                before = state.forecast_requests
+                samples = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for _ in range(args.requests):
+                        start = time.perf_counter()
+                        fetch()
+                        samples.append(time.perf_counter() - start)
+                p50, p99 = _latency_percentiles(samples[config.HEDGE_MIN_SAMPLES:])
+                print(f"   ヘッジ{'あり' if hedge else 'なし'}: p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+                      f"(APIへ{state.forecast_requests - before}回)")
+            state.slow_rate = 0.0
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        weather._breaker, weather._latency, forecast_cache._cache = saved_policy
+        server.shutdown()
+    
+    if not all(checks):
+        print("❌ 障害時の動きが想定と違います")
+        sys.exit(1)
+    print("✅ 再試行・フォールバック・復旧が想定どおりに動きました")
+
+
+def bench_gateway(args):
+    """
+    /weatherコマンドを偽のゲートウェイから大勢で同時に使い、応答時間・まとめ・先読み更新を確かめる
+    """
+    import asyncio
+    import gateway
+    import fake_gateway
+    import timezones
+    
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    # 予報APIの応答に時間がかかる状態にする(キャッシュに当たれば関係ない)
+    state.delay = args.delay
+    
+    names = ('WEATHER_API_URL', 'ONECALL_API_URL', 'GEOCODING_API_URL', 'CACHE_DIR', 'FORECAST_SOURCE')
+    saved = {name: getattr(config, name) for name in names}
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.ONECALL_API_URL = f"{base_url}/data/3.0/onecall"
+    config.GEOCODING_API_URL = f"{base_url}/geo/1.0/direct"
+    config.CACHE_DIR = ''
+    
+    location_list = [
+        {'name': f"地点{i}", 'latitude': 30.0 + i * 0.1, 'longitude': 135.0, 'timezone': config.TIMEZONE}
+        for i in range(args.locations)
+    ]
+    checks = []
+    expected_fields = ['🌡️ 気温', '☁️ 天気', '💧 降水確率', '👕 服装', '🎒 持ち物']
+    
+    def check(name, ok, detail):
+        checks.append(ok)
+        print(f"   {'✅' if ok else '❌'} {name}: {detail}")
+    
+    async def scenario():
+        service = gateway.WeatherService(location_list)
+        fake = fake_gateway.FakeGateway(service)
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            await service.start()
+            warm = time.perf_counter() - start
+        print(f"   起動時の読み込み: {len(service.forecasts)}セル {warm * 1000:.0f} ms (予報API {state.forecast_requests}回)")
+        
+        # 返信のEmbedが、定時の投稿と同じ内容(タイトルと項目)になっている
+        response, _ = await fake.send('地点0')
+        embeds = response['data'].get('embeds') or [{}]
+        field_names = [field.get('name') for field in embeds[0].get('fields', [])]
+        check(
+            '返信の内容',
+            len(embeds) == 1 and '今日の天気予報 (地点0)' in str(embeds[0].get('title')) and field_names == expected_fields,
+            f"{embeds[0].get('title')}  {' / '.join(map(str, field_names))}"
+        )
+        
+        # キャッシュ済みの地点への同時アクセス
+        before = state.forecast_requests
+        latencies = await fake.run(lambda user, i: f"地点{(user * 7 + i) % args.locations}", args.users, args.requests)
+        p50, p99 = _latency_percentiles(latencies)
+        check(
+            'キャッシュ済みの地点',
+            p99 < args.budget_ms and state.forecast_requests == before,
+            f"{args.users}人 × {args.requests}回  p50 {p50:.2f} ms  p99 {p99:.2f} ms (予算 {args.budget_ms} ms)  "
+            f"予報API {state.forecast_requests - before}回"
+        )
+        
+        # キャッシュにない地名への同時アクセスは、検索・取得とも1回にまとまる
+        before, geocode_before = state.forecast_requests, state.geocode_requests
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(fake.send('新しい町', user) for user in range(args.users)))
+            elapsed = time.perf_counter() - start
+        ok = all('新しい町' in (response['data'].get('embeds') or [{}])[0].get('title', '') for response, _ in responses)
+        # 地名検索で見つけた地点は、予報データの時差で日付・時間帯を数える
+        ok = ok and service.places.get('新しい町')['timezone'] == timezones.offset_name(state.payload['city']['timezone'])
+        check(
+            'キャッシュにない地名',
+            ok and state.forecast_requests - before == 1 and state.geocode_requests - geocode_before == 1,
+            f"{args.users}人同時に {elapsed * 1000:.0f} ms  予報API {state.forecast_requests - before}回  "
+            f"地名検索 {state.geocode_requests - geocode_before}回"
+        )
+        
+        # One Call APIの予報では、予報データのタイムゾーン名(IANA)で数える
+        state.onecall_payload.update(timezone='Europe/London', timezone_offset=3600)
+        config.FORECAST_SOURCE = 'onecall'
+        with contextlib.redirect_stdout(io.StringIO()):
+            response, _ = await fake.send('1時間ごとの町')
+        config.FORECAST_SOURCE = saved['FORECAST_SOURCE']
+        embed = (response['data'].get('embeds') or [{}])[0]
+        place = service.places.get('1時間ごとの町') or {}
+        footer = embed.get('footer', {}).get('text', '')
+        check(
+            'One Call APIの地名',
+            '1時間ごとの町' in embed.get('title', '') and place.get('timezone') == state.onecall_payload['timezone']
+            and '時刻は' not in footer,
+            f"タイムゾーン {place.get('timezone')} (予報データ {state.onecall_payload['timezone']})  {footer}"
+        )
+        
+        response, _ = await fake.send('?存在しない町')
+        check('見つからない地名', 'content' in response['data'], response['data'].get('content', ''))
+        
+        # 期限切れが近い予報は、応答を待たせずに裏で取り直す
+        for _, entry in service.forecasts.items():
+            entry.refresh_at = 0
+        before = state.forecast_requests
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = await fake.run(lambda user, i: f"地点{(user * 7 + i) % args.locations}", args.users, args.requests)
+            while service.inflight:
+                await asyncio.sleep(0.01)
+        p50, p99 = _latency_percentiles(latencies)
+        # 問い合わせた地点(地点ファイルの全地点)が取り直されている
+        refreshed = sum(entry.refresh_at > 0 for _, entry in service.forecasts.items()) == args.locations
+        check(
+            '先読み更新',
+            refreshed and p99 < args.budget_ms,
+            f"取り直し {state.forecast_requests - before}回(裏で実行)  その間の p50 {p50:.2f} ms  p99 {p99:.2f} ms"
+        )
+        
+        service.refresher.cancel()
+        service.executor.shutdown()
+    
+    print(f"📊 ゲートウェイモード ({args.locations}地点, 予報APIの応答 {args.delay * 1000:.0f} ms)")
+    try:
+        asyncio.run(scenario())
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        server.shutdown()
+    
+    if not all(checks):
+        print("❌ ゲートウェイモードの動きが想定と違います")
+        sys.exit(1)
+    print("✅ キャッシュからの応答・取得のまとめ・先読み更新が想定どおりに動きました")
+
+
+def _queue_messages(webhooks, embeds):
+    """
+    bench_queue用: Webhookごとにembeds個ずつ、地点名の入ったEmbedを作る
+    """
+    return [
+        (url, f"地点{w}-{i}", {"embeds": [{"title": f"地点{w}-{i}", "description": "📅 ベンチマーク", "fields": []}]})
+        for w, url in enumerate(webhooks)
+        for i in range(embeds)
+    ]
+
+
+def _drain_queue(path, webhooks, embeds, consumers, lease):
+    """
+    別プロセスでキューに追加して送る(bench_queueで途中で強制終了させる)
+    """
+    import delivery_queue
+    
+    config.DELIVERY_CONSUMERS = consumers
+    queue = delivery_queue.DeliveryQueue(path, lease=lease)
+    sender = delivery_queue.QueuedDispatcher(queue, discord_dispatcher.DiscordDispatcher(), 'bench')
+    for url, key, message in _queue_messages(webhooks, embeds):
+        sender.add(url, message, key=key)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sender.flush()
+
+
+def bench_queue(args):
+    """
+    送信キューの送信係の数ごとのスループットと、途中で止まったときの再開を確かめる
+    """
+    import multiprocessing
+    import delivery_queue
+    
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    # Discordのレート制限ではなく、送信係の並列度を測る
+    state.webhook_limit = 1_000_000
+    state.delay = args.delay
+    webhooks = [f"{base_url}/api/webhooks/{i}/token" for i in range(args.webhooks)]
+    messages = _queue_messages(webhooks, args.embeds)
+    
+    def delivered_titles():
+        titles = []
+        for _, body in state.webhook_requests:
+            titles.extend(embed['title'] for embed in json.loads(body)['embeds'])
+        return titles
+    
+    def resent_messages():
+        # Webhookごとに、前に届いたEmbedを含むメッセージ(送り直し)の数
+        seen = set()
+        resent = {}
+        for path, body in state.webhook_requests:
+            titles = [embed['title'] for embed in json.loads(body)['embeds']]
+            if seen.intersection(titles):
+                resent[path] = resent.get(path, 0) + 1
+            seen.update(titles)
+        return resent
+    
+    saved = config.DELIVERY_CONSUMERS
+    print(f"📊 送信キュー (Webhook {args.webhooks}個 × Embed {args.embeds}個, 送信1回 {args.delay * 1000:.0f} ms)")
+    
+    checks = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = None
+            for consumers in [int(count) for count in args.consumers.split(',')]:
+                config.DELIVERY_CONSUMERS = consumers
+                state.webhook_requests = []
+                queue = delivery_queue.DeliveryQueue(os.path.join(directory, f"throughput{consumers}.db"))
+                sender = delivery_queue.QueuedDispatcher(queue, discord_dispatcher.DiscordDispatcher(), 'bench')
+                for url, key, message in messages:
+                    sender.add(url, message, key=key)
+                
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    sent = sum(message.embeds for result in sender.flush().values() for message in result)
+                elapsed = time.perf_counter() - start
+                
+                throughput = sent / elapsed
+                baseline = baseline or throughput
+                titles = delivered_titles()
+                print(f"   送信係 {consumers:2d}: {elapsed * 1000:8.1f} ms  {throughput:8.0f} 件/秒  "
+                      f"({throughput / baseline:.2f}倍)  リクエスト {len(state.webhook_requests)}回")
+                checks.append(sent == len(messages) and len(titles) == len(set(titles)) == len(messages))
+            
+            # 送信1回よりずっと短いリースで、2つのプロセスが同じキューを同時に送っても二重送信しない
+            path = os.path.join(directory, 'shared.db')
+            state.webhook_requests = []
+            context = multiprocessing.get_context('spawn')
+            lease = state.delay / 4
+            child = context.Process(target=_drain_queue, args=(path, webhooks, args.embeds, 4, lease))
+            child.start()
+            _drain_queue(path, webhooks, args.embeds, 4, lease)
+            child.join()
+            titles = delivered_titles()
+            duplicates = len(titles) - len(set(titles))
+            print(f"   2プロセス同時 (リース {lease * 1000:.0f} ms): {len(set(titles))}/{len(messages)}件、"
+                  f"二重送信 {duplicates}件")
+            checks.append(len(set(titles)) == len(messages) and duplicates == 0)
+            
+            # 送信の途中で子プロセスを強制終了し、同じキューで続きから送る
+            path = os.path.join(directory, 'crash.db')
+            state.webhook_requests = []
+            child = context.Process(target=_drain_queue, args=(path, webhooks, args.embeds, 4, args.lease))
+            child.start()
+            while child.is_alive() and len(state.webhook_requests) < len(webhooks) // 2:
+                time.sleep(0.005)
+            child.kill()
+            child.join()
+            before = len(set(delivered_titles()))
+            
+            config.DELIVERY_CONSUMERS = 4
+            queue = delivery_queue.DeliveryQueue(path, lease=args.lease)
+            # 止まった瞬間に送っていたメッセージは、届いたか分からないので送り直す(Webhookごとに1メッセージまで)
+            in_flight = queue.connect().execute(
+                "SELECT COUNT(DISTINCT webhook_url) FROM deliveries WHERE status = 'sending'"
+            ).fetchone()[0]
+            sender = delivery_queue.QueuedDispatcher(queue, discord_dispatcher.DiscordDispatcher(), 'bench')
+            for url, key, message in messages:
+                sender.add(url, message, key=key)
+            with contextlib.redirect_stdout(io.StringIO()):
+                sent = sum(message.embeds for result in sender.flush().values() for message in result)
+            
+            titles = delivered_titles()
+            resent = resent_messages()
+            print(f"   再開: 停止前に{before}件 → 再開後に合計{len(set(titles))}/{len(messages)}件、"
+                  f"送り直し {sum(resent.values())}メッセージ (停止時に送信中のWebhook {in_flight}個)")
+            checks.append(sent == len(messages) and len(set(titles)) == len(messages)
+                          and len(resent) <= in_flight and all(count == 1 for count in resent.values()))
+    finally:
+        config.DELIVERY_CONSUMERS = saved
+        server.shutdown()
+    
+    if not all(checks):
+        print("❌ 送信キューの動きが想定と違います")
+        sys.exit(1)
+    print("✅ すべて送信し、止まった後も続きから送れました")
+
+
+def _alert_payload(start, variant, temp=10.0):
+    """
+    bench_alerts用: 穏やかな予報、雷雨の予報、猛暑の予報を作り分ける
+    """
+    if variant == 'heat':
+        return stub_server.make_forecast_payload(start, temp=33.0)
+    
+    payload = stub_server.make_forecast_payload(start, temp=temp)
+    if variant == 'thunderstorm':
+        item = payload['list'][3]
+        item['weather'] = [{'id': 211, 'main': 'Thunderstorm', 'description': '雷雨', 'icon': '11d'}]
+        item['pop'] = 0.8
+    return payload
+
+
+def bench_alerts(args):
+    """
+    荒天のお知らせで、予報が変わったセルだけを詳しく調べていることを確かめる
+    """
+    import alerts
+    import locations
+    
+    server, base_url = stub_server.start_stub_server()
+    state = server.state
+    state.webhook_limit = 1_000_000
+    
+    now = time.time()
+    start = int(now) // 10800 * 10800
+    variants = ['thunderstorm' if i % 10 == 0 else 'heat' if i % 10 == 5 else f"calm{i}" for i in range(args.variants)]
+    payloads = [_alert_payload(start, variant, 10.0 + i * 0.1) for i, variant in enumerate(variants)]
+    
+    webhooks = [f"{base_url}/api/webhooks/{i}/token" for i in range(args.webhooks)]
+    location_list = [
+        {
+            'name': f"地点{i}",
+            'latitude': 20.0 + (i // 100) * 0.05,
+            'longitude': 120.0 + (i % 100) * 0.05,
+            'timezone': config.TIMEZONE,
+            'webhook_url': webhooks[i % len(webhooks)],
+        }
+        for i in range(args.locations)
+    ]
+    cells = locations.group_by_cell(location_list)
+    
+    def variant_of(cell):
+        # スタブサーバーがそのセルに返す予報の種類(種類ごとに気温を変えて、中身が重ならないようにしてある)
+        body = state._pick_body({'lat': [str(cell[0])], 'lon': [str(cell[1])]}, state.fixture_bodies, None)
+        return variants[state.fixture_bodies.index(body)]
+    
+    names = ('WEATHER_API_URL', 'CACHE_DIR', 'DELIVERY_QUEUE_FILE')
+    saved = {name: getattr(config, name) for name in names}
+    saved_cache = forecast_cache._cache
+    config.WEATHER_API_URL = f"{base_url}/data/2.5/forecast"
+    config.CACHE_DIR = ''
+    config.DELIVERY_QUEUE_FILE = ''
+    
+    checks = []
+    alert_state = {}
+    
+    def cycle(name, expected_changed, expected_alerts):
+        state.webhook_requests = []
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = alerts.poll_once(location_list, alert_state, now)
+        elapsed = time.perf_counter() - started
+        ok = result['changed'] == expected_changed and result['alerts'] == expected_alerts
+        checks.append(ok)
+        print(f"   {'✅' if ok else '❌'} {name}: {elapsed * 1000:8.1f} ms  取得 {result['fetched']}セル  "
+              f"変化 {result['changed']}セル  お知らせ {result['alerts']}件 (想定 {expected_changed}セル / {expected_alerts}件)  "
+              f"Webhook {len(state.webhook_requests)}回")
+        return result
+    
+    print(f"📊 荒天のお知らせ ({args.locations}地点 = {len(cells)}セル, 予報 {args.variants}種類)")
+    try:
+        state.use_fixtures(payloads)
+        stormy = sum(len(cells[cell]) for cell in cells if not variant_of(cell).startswith('calm'))
+        cycle('初回', len(cells), stormy)
+        cycle('変化なし', 0, 0)
+        
+        # 穏やかな予報の一部を雷雨に変える
+        changed_variants = [i for i, variant in enumerate(variants) if variant.startswith('calm')][:args.changed]
+        before = {cell: variant_of(cell) for cell in cells}
+        for i in changed_variants:
+            payloads[i] = _alert_payload(start, 'thunderstorm', 10.0 + i * 0.1)
+            variants[i] = f"thunderstorm{i}"
+        state.use_fixtures(payloads)
+        changed = [cell for cell in cells if variant_of(cell) != before[cell]]
+        cycle(f"{len(changed)}セルが雷雨に", len(changed), sum(len(cells[cell]) for cell in changed))
+        cycle('お知らせ済み', 0, 0)
+        
+        # 予報キャッシュの有効期限内は取得もしない
+        with tempfile.TemporaryDirectory() as directory:
+            config.CACHE_DIR = directory
+            forecast_cache._cache = forecast_cache.ForecastCache(directory)
+            alert_state.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                alerts.poll_once(location_list, alert_state, now)
+            state.forecast_requests = 0
+            result = cycle('キャッシュの有効期限内', 0, 0)
+            checks.append(result['fetched'] == 0 and state.forecast_requests == 0)
+        
+        # 1セルあたりの指紋と詳しい判定の時間
+        items = [weather.forecast_items(payload) for payload in payloads]
+        end = now + config.ALERT_HORIZON_HOURS * 3600
+        arguments = [(cell_items, now, end) for cell_items in items]
+        fingerprint_us = _per_call(alerts.fingerprint, arguments) * 1e6
+        detect_us = _per_call(alerts.detect_alerts, arguments) * 1e6
+        print(f"   1セルあたり: 指紋 {fingerprint_us:.1f} µs  詳しい判定 {detect_us:.1f} µs")
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        forecast_cache._cache = saved_cache
+        server.shutdown()
+    
+    if not all(checks):
+        print("❌ 荒天のお知らせの動きが想定と違います")
+        sys.exit(1)
+    print("✅ 予報が変わったセルだけを調べ、新しい荒天だけをお知らせしました")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='天気予報Botのベンチマーク')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    http_parser = subparsers.add_parser('http', help='HTTP接続の再利用効果を測る')
+    http_parser.add_argument('--requests', type=int, default=200)
+    http_parser.set_defaults(func=bench_http)
+    
+    parse_parser = subparsers.add_parser('parse', help='parse_weather_data()の速度を測る')
+    parse_parser.add_argument('--locations', type=int, default=1000)
+    parse_parser.set_defaults(func=bench_parse)
+    
+    golden_parser = subparsers.add_parser('golden', help='parse_weather_data()の結果が最適化する前と同じか確かめる')
+    golden_parser.add_argument('--show', type=int, default=5, help='表示する不一致の件数')
+    golden_parser.set_defaults(func=bench_golden)
+    
+    interpolate_parser = subparsers.add_parser('interpolate', help='予報の間隔ごとの解析時間と補間の誤差を比べる')
+    interpolate_parser.add_argument('--repeat', type=int, default=200)
+    interpolate_parser.set_defaults(func=bench_interpolate)
+    
+    timezones_parser = subparsers.add_parser('timezones', help='多数のタイムゾーンでの現地時刻の変換方法を比べる')
+    timezones_parser.add_argument('--zones', type=int, default=300)
+    timezones_parser.add_argument('--points', type=int, default=48)
+    timezones_parser.add_argument('--repeat', type=int, default=20)
+    timezones_parser.set_defaults(func=bench_timezones)
+    
+    decode_parser = subparsers.add_parser('decode', help='予報JSONのデコード方法を比較する')
+    decode_parser.add_argument('--entries', type=int, default=2000)
+    decode_parser.add_argument('--repeat', type=int, default=20)
+    decode_parser.set_defaults(func=bench_decode)
+    
+    conditions_parser = subparsers.add_parser('conditions', help='天気説明の変換とおすすめ判定を今までの実装と比べる')
+    conditions_parser.add_argument('--locations', type=int, default=10000)
+    conditions_parser.add_argument('--repeat', type=int, default=5)
+    conditions_parser.set_defaults(func=bench_conditions)
+    
+    profiles_parser = subparsers.add_parser('profiles', help='購読者ごとのおすすめ(1人ずつ/しきい値ごとにまとめる)を比べる')
+    profiles_parser.add_argument('--subscribers', type=int, default=10000)
+    profiles_parser.add_argument('--locations', type=int, default=50)
+    profiles_parser.add_argument('--profiles', default='1,10,100,1000')
+    profiles_parser.add_argument('--seed', type=int, default=0)
+    profiles_parser.set_defaults(func=bench_profiles)
+    
+    embeds_parser = subparsers.add_parser('embeds', help='Embedの作成とJSON変換(テンプレート/今まで)を比べる')
+    embeds_parser.add_argument('--messages', type=int, default=20000)
+    embeds_parser.add_argument('--repeat', type=int, default=3)
+    embeds_parser.add_argument('--per-cell', type=int, default=10)
+    embeds_parser.set_defaults(func=bench_embeds)
+    
+    dispatch_parser = subparsers.add_parser('dispatch', help='Discordへの送信方法を比較する')
+    dispatch_parser.add_argument('--webhooks', type=int, default=20)
+    dispatch_parser.add_argument('--embeds', type=int, default=60)
+    dispatch_parser.set_defaults(func=bench_dispatch)
+    
+    suite_parser = subparsers.add_parser('suite', help='関数単体と全体の性能をまとめて測り、JSONに保存する')
+    suite_parser.add_argument('--sizes', default='1,100,10000', help='地点数(カンマ区切り)')
+    suite_parser.add_argument('--webhooks', type=int, default=50, help='送信先Webhookの数')
+    suite_parser.add_argument('--output', default='benchmark_results.json')
+    suite_parser.add_argument('--compare', help='比較する前回の結果ファイル')
+    suite_parser.set_defaults(func=bench_suite)
+    
+    startup_parser = subparsers.add_parser('startup', help='起動時間を測り、予算を超えたら失敗する')
+    startup_parser.add_argument('--budget-ms', type=float, default=60.0)
+    startup_parser.add_argument('--repeat', type=int, default=5)
+    startup_parser.add_argument('--top', type=int, default=10)
+    startup_parser.set_defaults(func=bench_startup)
+    
+    singleflight_parser = subparsers.add_parser('singleflight', help='同時リクエストが1回にまとまるか確かめる')
+    singleflight_parser.add_argument('--callers', type=int, default=100)
+    singleflight_parser.add_argument('--delay', type=float, default=0.2)
+    singleflight_parser.set_defaults(func=bench_singleflight)
+    
+    updates_parser = subparsers.add_parser('updates', help='差分更新あり/なしの投稿回数を比べる')
+    updates_parser.add_argument('--locations', type=int, default=200)
+    updates_parser.add_argument('--webhooks', type=int, default=200)
+    updates_parser.add_argument('--runs', type=int, default=8)
+    updates_parser.add_argument('--jitter', type=float, default=1.0)
+    updates_parser.add_argument('--seed', type=int, default=0)
+    updates_parser.set_defaults(func=bench_updates)
+    
+    archive_parser = subparsers.add_parser('archive', help='予報アーカイブの追記と読み出しの速さを測る')
+    archive_parser.add_argument('--fetches', type=int, default=5000)
+    archive_parser.set_defaults(func=bench_archive)
+    
+    batch_parser = subparsers.add_parser('batch', help='プロセス数ごとの取得・解析のスループットを測る')
+    batch_parser.add_argument('--locations', type=int, default=5000)
+    batch_parser.add_argument('--processes', default='', help='例: 1,2,4(省略時はCPUの数まで倍々)')
+    batch_parser.add_argument('--chunk-size', type=int, default=64)
+    batch_parser.set_defaults(func=bench_batch)
+    
+    faults_parser = subparsers.add_parser('faults', help='障害を起こして再試行・ブレーカー・ヘッジの動きを確かめる')
+    faults_parser.add_argument('--requests', type=int, default=200)
+    faults_parser.add_argument('--slow-rate', type=float, default=0.02)
+    faults_parser.add_argument('--slow-delay', type=float, default=0.3)
+    faults_parser.add_argument('--seed', type=int, default=0)
+    faults_parser.set_defaults(func=bench_faults)
+    
+    gateway_parser = subparsers.add_parser('gateway', help='偽のゲートウェイから/weatherを大勢で使い、応答時間を確かめる')
+    gateway_parser.add_argument('--locations', type=int, default=100)
+    gateway_parser.add_argument('--users', type=int, default=300)
+    gateway_parser.add_argument('--requests', type=int, default=20)
+    gateway_parser.add_argument('--delay', type=float, default=0.2, help='予報APIの応答を遅らせる秒数')
+    gateway_parser.add_argument('--budget-ms', type=float, default=50)
+    gateway_parser.set_defaults(func=bench_gateway)
+    
+    queue_parser = subparsers.add_parser('queue', help='送信キューの並列送信と、止まった後の再開を確かめる')
+    queue_parser.add_argument('--webhooks', type=int, default=40)
+    queue_parser.add_argument('--embeds', type=int, default=20)
+    queue_parser.add_argument('--delay', type=float, default=0.02, help='スタブサーバーの応答を遅らせる秒数')
+    queue_parser.add_argument('--consumers', default='1,2,4,8')
+    queue_parser.add_argument('--lease', type=float, default=1.0)
+    queue_parser.set_defaults(func=bench_queue)
+    
+    alerts_parser = subparsers.add_parser('alerts', help='荒天のお知らせで、予報が変わったセルだけを調べるか確かめる')
+    alerts_parser.add_argument('--locations', type=int, default=2000)
+    alerts_parser.add_argument('--webhooks', type=int, default=20)
+    alerts_parser.add_argument('--variants', type=int, default=53, help='スタブサーバーが返す予報の種類の数')
+    alerts_parser.add_argument('--changed', type=int, default=2, help='雷雨に変える予報の種類の数')
+    alerts_parser.set_defaults(func=bench_alerts)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,58 +1,66 @@
-import requests
+import sys
 from datetime import datetime
 import config
 import weather
 import recommend
-import pytz
+import locations
+import discord_dispatcher
+import embed_template
+import metrics
+import singleflight
+import timezones
 
 
-def create_embed_message(weather_info, clothing, items):
+@metrics.timed('embed')
+def create_embed_message(weather_info, clothing, items, location_name=None, updated=None):
     """
     天気情報からDiscord Embed形式のメッセージを作成
     
     Args:
-        weather_info: 天気情報の辞書
+        weather_info: 天気情報(DailySummary)
         clothing: 服装の推奨
         items: 持ち物の推奨
+        location_name: 地点名(省略時はconfig.LOCATION_NAME)
+        updated: フッターの更新時刻の文字列(省略時は現在時刻)
         
     Returns:
         dict: Discord Embed形式のメッセージ
     """
-    weather_emoji = recommend.get_weather_emoji(weather_info['weather_main'])
-    embed_color = recommend.get_embed_color(weather_info['weather_main'])
+    location_name = location_name or config.LOCATION_NAME
+    weather_emoji = recommend.get_weather_emoji(weather_info.weather_main)
+    embed_color = recommend.get_embed_color(weather_info.weather_main)
     
     # 天気アイコンのURL
-    icon_url = f"https://openweathermap.org/img/wn/{weather_info['weather_icon']}@2x.png"
+    icon_url = f"https://openweathermap.org/img/wn/{weather_info.weather_icon}@2x.png"
 
-    # 現在時刻（JST）
-    jst = pytz.timezone('Asia/Tokyo')
-    now = datetime.now(jst)
+    if updated is None:
+        updated = updated_text()
     
     embed = {
         "embeds": [{
-            "title": f"{weather_emoji} 今日の天気予報 (東京)",
-            "description": f"📅 {weather_info['date']}",
+            "title": f"{weather_emoji} 今日の天気予報 ({location_name})",
+            "description": f"📅 {weather_info.date}",
             "color": embed_color,
             "fields": [
                 {
                     "name": "🌡️ 気温",
                     "value": (
-                        f"朝{weather_info['morning_temp']}℃ "
-                        f"昼{weather_info['noon_temp']}℃ "
-                        f"夜{weather_info['night_temp']}℃\n"
-                        f"**最低**: {weather_info['temp_min']}°C / "
-                        f"**最高**: {weather_info['temp_max']}°C"
+                        f"朝{weather_info.morning_temp}℃ "
+                        f"昼{weather_info.noon_temp}℃ "
+                        f"夜{weather_info.night_temp}℃\n"
+                        f"**最低**: {weather_info.temp_min}°C / "
+                        f"**最高**: {weather_info.temp_max}°C"
                     ),
                     "inline": False
                 },
                 {
                     "name": "☁️ 天気",
-                    "value": weather_info['weather_description'],
+                    "value": weather_info.weather_description,
                     "inline": False
                 },
                 {
                     "name": "💧 降水確率",
-                    "value": f"{weather_info['pop']}%",
+                    "value": f"{weather_info.pop}%",
                     "inline": False
                 },
                 {
@@ -70,7 +78,7 @@ def create_embed_message(weather_info, clothing, items):
                 "url": icon_url
             },
             "footer": {
-                "text": f"更新: {now.strftime('%Y-%m-%d %H:%M')}"
+                "text": f"更新: {updated}"
             }
         }]
     }
@@ -78,80 +86,413 @@ def create_embed_message(weather_info, clothing, items):
     return embed
 
 
-def send_to_discord(embed_data):
+def updated_text(timezone=None):
+    """
+    フッターに表示する更新時刻(地点のタイムゾーン、省略時はconfig.TIMEZONE)の文字列
+    """
+    return datetime.now(timezones.get_zone(timezone)).strftime('%Y-%m-%d %H:%M')
+
+
+# 天気ごとにEmbedの決まった部分を前もってJSONにしておく
+_embed_templates = embed_template.TemplateCache(create_embed_message)
+
+
+def send_to_discord(embed_data, webhook_url=None):
     """
     Discord WebhookにEmbedメッセージを送信
     
     Args:
         embed_data: Discord Embed形式のデータ
+        webhook_url: 送信先のWebhook URL(省略時はconfig.DISCORD_WEBHOOK_URL)
         
     Returns:
         bool: 送信成功時True、失敗時False
     """
-    try:
-        response = requests.post(
-            config.DISCORD_WEBHOOK_URL,
-            json=embed_data,
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        
+    dispatcher = discord_dispatcher.get_dispatcher()
+    
+    if dispatcher.send(webhook_url or config.DISCORD_WEBHOOK_URL, embed_data):
         print("✅ Discordへの送信に成功しました")
         return True
+    
+    return False
+
+
+def get_sender(run_key=None):
+    """
+    まとめて送るための送信係(add / add_edit / flushを持つ)を返す
+    
+    Args:
+        run_key: 実行の識別名(同じ識別名の実行では、同じ地点を二重に投稿しない。省略時は今日の日付)
         
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Discordへの送信に失敗しました: {e}")
-        return False
+    Returns:
+        config.DELIVERY_QUEUE_FILEが設定されていればキュー経由で送るQueuedDispatcher、
+        空ならDiscordDispatcher
+    """
+    dispatcher = discord_dispatcher.get_dispatcher()
+    if not config.DELIVERY_QUEUE_FILE:
+        return dispatcher
+    
+    import delivery_queue
+    
+    run_key = run_key or datetime.now(timezones.get_zone()).strftime('%Y-%m-%d')
+    return delivery_queue.QueuedDispatcher(delivery_queue.get_queue(), dispatcher, run_key)
+    
+    # 解説:
+    # キューを使うときは、送る内容をいったんファイルに保存してから送るので、
+    # 送信の途中でプロセスが止まっても、次の実行で送れなかった分だけを送ります
+
 
+# 同じ地点の解析を同時に頼まれたら1回にまとめる
+_summary_inflight = singleflight.SingleFlight()
 
-def post_weather_forecast():
+
+def fetch_summary(latitude, longitude, raw_data=None, timezone=None):
     """
-    天気予報を取得してDiscordに投稿する
+    天気予報を取得・解析して1日分のまとめを作る
+    
+    同じ地点を同時に頼まれた場合は、取得・解析を1回だけ行って結果を共有します。
+    
+    Args:
+        latitude: 緯度
+        longitude: 経度
+        raw_data: 取得済みの天気データ(省略時はここで取得)
+        timezone: 地点のタイムゾーン名(省略時はconfig.TIMEZONE)
+        
+    Returns:
+        DailySummary: 1日分の天気のまとめ、失敗時はNone
     """
-    jst = pytz.timezone('Asia/Tokyo')
-    now = datetime.now(jst)
-    print("=" * 60)
-    print(f"Discord天気予報Bot (GitHub Actions)")
-    print(f"実行時刻(JST): {now.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"対象地域: 東京 (緯度: {config.LATITUDE}, 経度: {config.LONGITUDE})")
-    print("=" * 60)
+    if raw_data is not None:
+        return _build_summary(latitude, longitude, raw_data, timezone)
     
+    try:
+        return _summary_inflight.do(
+            (latitude, longitude, timezone),
+            lambda: _build_summary(latitude, longitude, None, timezone),
+            timeout=config.SINGLEFLIGHT_TIMEOUT
+        )
+    except TimeoutError as e:
+        print(f"❌ ({latitude}, {longitude}) 天気予報の解析待ちがタイムアウトしました: {e}")
+        return None
+
+
+def _build_summary(latitude, longitude, raw_data, timezone):
     # 天気データ取得
-    raw_data = weather.get_weather_data()
+    if raw_data is None:
+        raw_data = weather.get_weather_data(latitude, longitude)
     
     if not raw_data:
-        print("❌ 天気データの取得に失敗しました")
-        return
+        print(f"❌ ({latitude}, {longitude}) 天気データの取得に失敗しました")
+        return None
     
     # データ解析
-    weather_info = weather.parse_weather_data(raw_data)
+    weather_info = weather.parse_weather_data(raw_data, timezone=timezone)
     
     if not weather_info:
-        print("❌ 天気データの解析に失敗しました")
-        return
+        print(f"❌ ({latitude}, {longitude}) 天気データの解析に失敗しました")
+        return None
     
-    # 服装と持ち物の判定
-    clothing = recommend.recommend_clothing(
-        weather_info['temp_max'],
-        weather_info['temp_min']
-    )
+    return weather_info
+
+
+def build_forecast_message(location, raw_data=None):
+    """
+    1地点分の天気予報を取得・解析してEmbedメッセージを作る
+    
+    Args:
+        location: 地点情報の辞書(locations.load_locations()の要素)
+        raw_data: 取得済みの天気データ(省略時はここで取得)
+        
+    Returns:
+        dict: Discord Embed形式のメッセージ、失敗時はNone
+    """
+    timezone = location.get('timezone')
+    weather_info = fetch_summary(location['latitude'], location['longitude'], raw_data, timezone)
     
-    items = recommend.recommend_items(
-        weather_info['pop'],
-        weather_info['temp_max']
-    )
+    if not weather_info:
+        print(f"❌ [{location['name']}] 天気予報を作れませんでした")
+        return None
+    
+    # 服装と持ち物の判定
+    clothing, items = recommend.recommend_for_summary(weather_info)
     
     # Embedメッセージ作成
-    embed_message = create_embed_message(weather_info, clothing, items)
+    return create_embed_message(weather_info, clothing, items, location['name'], updated_text(timezone))
+
+
+def process_location(location, raw_data=None):
+    """
+    1地点分の天気予報を取得・解析してDiscordに投稿する
+    
+    Args:
+        location: 地点情報の辞書(locations.load_locations()の要素)
+        raw_data: 取得済みの天気データ(省略時はここで取得)
+        
+    Returns:
+        bool: 投稿成功時True、失敗時False
+    """
+    embed_message = build_forecast_message(location, raw_data)
+    
+    if not embed_message:
+        return False
     
     # Discordに送信
-    send_to_discord(embed_message)
+    return send_to_discord(embed_message, location['webhook_url'])
+
+
+def analyze_cell(latitude, longitude, timezone=None, raw_data=None):
+    """
+    1セル分の天気予報を取得・解析して、おすすめを判定する
     
+    Args:
+        latitude: 緯度
+        longitude: 経度
+        timezone: セルの地点のタイムゾーン名(省略時はconfig.TIMEZONE)
+        raw_data: 取得済みの天気データ(省略時はここで取得)
+        
+    Returns:
+        tuple: (DailySummary, 服装の推奨, 持ち物の推奨)、失敗時はNone
+    """
+    weather_info = fetch_summary(latitude, longitude, raw_data=raw_data, timezone=timezone)
+    if not weather_info:
+        return None
+    
+    clothing, items = recommend.recommend_for_summary(weather_info)
+    return weather_info, clothing, items
+
+
+def analyze_cells(cells):
+    """
+    全セルの天気予報を並列に取得・解析する
+    
+    config.BATCH_PROCESSESが2以上なら複数プロセスに分けて処理します(batch.py)。
+    
+    Args:
+        cells: (緯度, 経度, タイムゾーン名)のリストまたは辞書
+        
+    Returns:
+        iterable: ((緯度, 経度, タイムゾーン名), analyze_cell()の結果)のタプル
+    """
+    if config.BATCH_PROCESSES > 1:
+        import batch
+        return batch.analyze_cells(cells)
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    cells = list(cells)
+    workers = max(1, min(config.MAX_WORKERS, len(cells)))
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(zip(cells, executor.map(lambda cell: analyze_cell(*cell), cells)))
+    
+    # 解説:
+    # ThreadPoolExecutorで最大MAX_WORKERSセルを同時に処理します
+    # 通信待ちの間に他のセルの処理が進むので、
+    # 全体の時間は「全地点の合計」ではなく「遅い数件分」程度になります
+
+
+def render_cell(result, cell_locations, updated):
+    """
+    セル1つ分の予報から、セル内の地点・購読者ごとのEmbedを作る
+    
+    Args:
+        result: analyze_cell()の結果
+        cell_locations: セルの地点(購読者)のリスト
+        updated: フッターの更新時刻の文字列
+        
+    Returns:
+        list: cell_locationsと同じ順のEmbed(RenderedEmbed)のリスト
+    """
+    import profiles
+    
+    weather_info = result[0]
+    bound = {}
+    rendered = {}
+    embeds = []
+    
+    for location, texts in zip(cell_locations, profiles.recommend_cell(result, cell_locations)):
+        embed = rendered.get((texts, location['name']))
+        if embed is None:
+            template = bound.get(texts)
+            if template is None:
+                template = bound[texts] = _embed_templates.bind(weather_info, *texts, updated)
+            embed = rendered[(texts, location['name'])] = template.render({'location_name': location['name']})
+        embeds.append(embed)
+    
+    return embeds
+    
+    # 解説:
+    # おすすめの文章が同じ地点・購読者は、同じテンプレート・同じEmbedを使い回します
+    # 同じ地点の購読者が何千人いても、Embedを作るのは好みの結果の種類の数だけです
+
+
+def post_all_locations(location_list, run_key=None):
+    """
+    複数地点の天気予報を並列に取得してDiscordに投稿する
+    
+    Args:
+        location_list: 地点情報の辞書のリスト
+        run_key: 実行の識別名(get_sender()を参照)
+        
+    Returns:
+        int: 投稿に成功した地点数
+    """
+    # 近くの地点(同じグリッドのセル)は1回の取得・解析で済ませる
+    cells = locations.group_by_cell(location_list)
+    print(f"🗺️  {len(location_list)}地点 → {len(cells)}セル分の天気予報を取得します")
+    
+    results = analyze_cells(cells)
+    
+    if config.POST_HISTORY_FILE:
+        return post_updates(cells, results, run_key)
+    
+    # 同じWebhook宛てのEmbedはまとめて送る(1回最大10個)
+    # Embedはテンプレートにセルごと・地点ごとの値だけを埋めて、JSONにした状態で作る
+    dispatcher = get_sender(run_key)
+    updated = {}
+    for cell, result in results:
+        if not result:
+            continue
+        
+        # 更新時刻はセルのタイムゾーンで表示する(タイムゾーンごとに1回だけ作る)
+        timezone = cell[2]
+        if timezone not in updated:
+            updated[timezone] = updated_text(timezone)
+        
+        for location, embed in zip(cells[cell], render_cell(result, cells[cell], updated[timezone])):
+            dispatcher.add(location['webhook_url'], {"embeds": [embed]}, key=locations.location_key(location))
+    
+    sent = sum(message.embeds for messages in dispatcher.flush().values() for message in messages)
+    print(f"✅ Discordへの送信に成功しました ({sent}件)")
+    
+    return sent
+
+
+def post_updates(cells, results, run_key=None):
+    """
+    前回の投稿と比べて、大きく変わった地点のメッセージだけを書き換え・投稿する
+    
+    Args:
+        cells: locations.group_by_cell()の結果
+        results: analyze_cells()の結果
+        run_key: 実行の識別名(get_sender()を参照)
+        
+    Returns:
+        int: 最新の予報が表示されている地点数(変化なしで送らなかった地点を含む)
+    """
+    import post_history
+    import profiles
+    
+    # Webhookごとに {地点のキー: (地点, 解析結果, おすすめの文章)} にまとめる
+    targets = {}
+    for cell, result in results:
+        if not result:
+            continue
+        for location, texts in zip(cells[cell], profiles.recommend_cell(result, cells[cell])):
+            webhook = targets.setdefault(location['webhook_url'], {})
+            webhook[locations.location_key(location)] = (location, result, texts)
+    
+    history = post_history.load_history()
+    dispatcher = get_sender(run_key)
+    bound_templates = {}
+    plans = {}
+    updated = {}
+    
+    def embed_for(location, result, texts):
+        # テンプレートへの値の埋め込みは、同じ予報(セル)・同じおすすめの文章につき1回だけ行う
+        template = bound_templates.get((id(result), texts))
+        if template is None:
+            timezone = location.get('timezone') or config.TIMEZONE
+            if timezone not in updated:
+                updated[timezone] = updated_text(timezone)
+            template = bound_templates[(id(result), texts)] = _embed_templates.bind(result[0], *texts, updated[timezone])
+        return template.render({'location_name': location['name']})
+    
+    for webhook_url, entries in targets.items():
+        previous = history.get(post_history.webhook_key(webhook_url), {})
+        summaries_by_key = {key: result[0].to_dict() for key, (_, result, _) in entries.items()}
+        edits, unchanged, new_keys = post_history.plan_updates(previous, summaries_by_key)
+        plans[webhook_url] = (previous, summaries_by_key, unchanged)
+        
+        for message_id, keys in edits:
+            embeds = [embed_for(*entries[key]) for key in keys]
+            dispatcher.add_edit(webhook_url, message_id, {"embeds": embeds}, keys)
+        for key in new_keys:
+            dispatcher.add(webhook_url, {"embeds": [embed_for(*entries[key])]}, key=key)
+    
+    sent = dispatcher.flush()
+    
+    posted = edited = skipped = 0
+    for webhook_url, (previous, summaries_by_key, unchanged) in plans.items():
+        messages = sent.get(webhook_url, [])
+        history[post_history.webhook_key(webhook_url)] = post_history.record_updates(
+            previous, summaries_by_key, unchanged, messages
+        )
+        skipped += sum(len(message['locations']) for message in unchanged)
+        for message in messages:
+            if message.edited:
+                edited += message.embeds
+            else:
+                posted += message.embeds
+    
+    post_history.save_history(history)
+    
+    metrics.increment('posts_total', posted, kind='new')
+    metrics.increment('posts_total', edited, kind='edit')
+    metrics.increment('posts_total', skipped, kind='unchanged')
+    print(f"✅ Discordへの送信に成功しました (新規{posted}件・書き換え{edited}件・変化なし{skipped}件)")
+    
+    return posted + edited + skipped
+
+
+def post_weather_forecast(location_list=None, run_key=None):
+    """
+    天気予報を取得してDiscordに投稿する
+    
+    Args:
+        location_list: 投稿する地点のリスト(省略時は地点ファイル/config.pyの全地点)
+        run_key: 実行の識別名(常駐モードでは投稿時刻。省略時は今日の日付)
+    """
+    now = datetime.now(timezones.get_zone())
+    if location_list is None:
+        location_list = locations.load_locations()
+    
+    print("=" * 60)
+    print(f"Discord天気予報Bot (GitHub Actions)")
+    print(f"実行時刻({now.tzname()}): {now.strftime('%Y-%m-%d %H:%M:%S')}")
+    if len(location_list) == 1:
+        location = location_list[0]
+        print(f"対象地域: {location['name']} (緯度: {location['latitude']}, 経度: {location['longitude']})")
+    else:
+        print(f"対象地域: {len(location_list)}地点")
+    subscribers = sum(1 for location in location_list if location.get('subscriber'))
+    if subscribers:
+        print(f"購読者: {subscribers}人 (地点数に含む)")
     print("=" * 60)
-    print("✅ 処理完了")
+    
+    success = post_all_locations(location_list, run_key)
+    
     print("=" * 60)
+    print(f"✅ 処理完了 ({success}/{len(location_list)}地点)")
+    print("=" * 60)
+    
+    metrics.increment('locations_total', len(location_list))
+    metrics.increment('locations_posted_total', success)
+    metrics.export()
 
 
 if __name__ == '__main__':
-    # 🆕 GitHub Actions用: 1回だけ実行
-    post_weather_forecast()
+    if '--daemon' in sys.argv[1:]:
+        # 常駐モード: 設定した時刻ごとに投稿し続ける
+        import scheduler
+        scheduler.run_daemon(post_weather_forecast)
+    elif '--gateway' in sys.argv[1:]:
+        # ゲートウェイモード: /weatherコマンドに答え続ける
+        import gateway
+        gateway.run_gateway()
+    elif '--alerts' in sys.argv[1:]:
+        # お知らせモード: 荒天が見込まれるようになったらお知らせし続ける
+        import alerts
+        alerts.run_alerts()
+    else:
+        # 🆕 GitHub Actions用: 1回だけ実行
+        post_weather_forecast()
@@ -1,17 +1,21 @@
 import os
-from dotenv import load_dotenv
 
-# .envファイルを読み込む
-load_dotenv()
+# .envファイルがあれば読み込む
+if os.path.exists('.env') or os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # 解説:
 # load_dotenv()は.envファイルの内容を読み込んで、
 # プログラムから使えるようにします
+# GitHub Actionsのように環境変数で設定する場合は.envがないので、
+# python-dotenvを読み込まずに済ませて起動を速くします
 
 # OpenWeatherMap API設定
 OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
 LATITUDE = float(os.getenv('LATITUDE', '35.6762'))
 LONGITUDE = float(os.getenv('LONGITUDE', '139.6503'))
+LOCATION_NAME = os.getenv('LOCATION_NAME', '東京')
 
 # 解説:
 # os.getenv('キー名')で.envファイルの値を取得します
@@ -25,13 +29,195 @@ DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
 TIMEZONE = os.getenv('TIMEZONE', 'Asia/Tokyo')
 SCHEDULE_HOUR = int(os.getenv('SCHEDULE_HOUR', '0'))
 SCHEDULE_MINUTE = int(os.getenv('SCHEDULE_MINUTE', '0'))
+SCHEDULE_TIMES = os.getenv('SCHEDULE_TIMES', '')
+SCHEDULE_CATCHUP_MINUTES = int(os.getenv('SCHEDULE_CATCHUP_MINUTES', '60'))
+SCHEDULE_STATE_FILE = os.getenv('SCHEDULE_STATE_FILE', '.schedule_state.json')
 
 # 解説:
 # int()は文字列を整数に変換します
 # 毎朝6時0分に実行される設定になっています
+# SCHEDULE_TIMESに"7:00,18:00"のように書くと1日に複数回投稿します
+# (常駐モード: python bot.py --daemon のときに使われます)
+# 停止中に逃した投稿は、予定時刻からSCHEDULE_CATCHUP_MINUTES分以内なら取り戻します
+
+# 予報データの取得元設定
+FORECAST_SOURCE = os.getenv('FORECAST_SOURCE', 'forecast')
+
+# 解説:
+# 'forecast'は5日間/3時間予報(今までどおり)、
+# 'onecall'はOne Call API 3.0の1時間ごとの予報を使います(別途One Call APIの利用登録が必要)
+# どちらの場合も、朝・昼・夜の気温はその時刻の予報(なければ前後の予報から補間した値)になります
+
+# 複数地点設定
+LOCATIONS_FILE = os.getenv('LOCATIONS_FILE')
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', '32'))
+
+GRID_SIZE = float(os.getenv('GRID_SIZE', '0'))
+
+# 解説:
+# LOCATIONS_FILEに地点ファイル(JSON)を指定すると、
+# 全地点の天気予報をまとめて1回の実行で投稿します
+# MAX_WORKERSは同時に処理する地点の最大数です
+# 緯度経度が同じ地点は、天気予報を1回だけ取得して共有します
+# GRID_SIZE(度、例: 0.05)を指定すると、その格子で同じセルに入る近くの地点も共有します
+# (0なら緯度経度をそのまま使うので、今までと同じ地点の予報を取得します)
+
+# 購読者ごとのおすすめ設定
+SUBSCRIBERS_FILE = os.getenv('SUBSCRIBERS_FILE', '')
+
+# 解説:
+# SUBSCRIBERS_FILEに購読者ファイル(JSON)を指定すると、購読者ごとに
+# 寒がり・暑がり、外にいる時間帯、傘の許容度に合わせた服装・持ち物をすすめます
+# 予報は地点ごとに1回だけ取得し、好みが同じ(しきい値が同じ)購読者の文章は1回だけ作ります
+
+# 複数プロセスでの一括処理設定
+BATCH_PROCESSES = int(os.getenv('BATCH_PROCESSES', '0'))
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '64'))
+
+# 解説:
+# BATCH_PROCESSESを2以上にすると、予報の取得・解析・おすすめ判定を
+# その数のプロセスに分けて行います(数万地点あるときにCPUを全部使うため)
+# 各プロセスの中ではMAX_WORKERSのスレッドで通信し、
+# BATCH_CHUNK_SIZEセルずつ結果を親プロセスに返して、親がまとめてDiscordに送ります
+# 0または1なら今までどおり1プロセスで処理します
+
+# HTTP通信設定
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', str(MAX_WORKERS)))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+
+# 解説:
+# HTTP_POOL_SIZEはホストごとに使い回す接続の数です
+# (同時に処理する地点数と同じにしておくと待ちが発生しません)
+# タイムアウトは秒単位で、接続と読み込みを別々に指定します
+
+# 取得の再試行・ヘッジ・サーキットブレーカー設定
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', '3'))
+FETCH_BACKOFF_BASE = float(os.getenv('FETCH_BACKOFF_BASE', '0.5'))
+FETCH_BACKOFF_MAX = float(os.getenv('FETCH_BACKOFF_MAX', '8'))
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '60'))
+
+# 解説:
+# 取得に失敗したら、FETCH_BACKOFF_BASE秒から倍々に待ち時間を増やして
+# 最大FETCH_RETRIES回まで送り直します(待ち時間は最大FETCH_BACKOFF_MAX秒)
+# HEDGE_ENABLED=trueにすると、応答が最近の応答時間のHEDGE_PERCENTILEパーセンタイルより
+# 遅いときに同じリクエストをもう1つ送り、早く返ってきた方を使います
+# BREAKER_FAILURE_THRESHOLD回続けて失敗したら、BREAKER_RESET_TIMEOUT秒間は
+# APIを呼ばずに前回取得した予報(キャッシュ)を使います
+
+# 同時リクエストのまとめ設定
+SINGLEFLIGHT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_TIMEOUT', '30'))
+
+# 解説:
+# 同じ地点の取得中に別の呼び出しが来たら、最大SINGLEFLIGHT_TIMEOUT秒だけ
+# 先に始まった取得の結果を待ちます
+
+# Discord送信設定
+DISCORD_MAX_RETRIES = int(os.getenv('DISCORD_MAX_RETRIES', '5'))
+
+# 解説:
+# レート制限(429)が返ったときに送り直す最大回数です
+
+# 投稿の差分更新設定
+POST_HISTORY_FILE = os.getenv('POST_HISTORY_FILE', '')
+UPDATE_TEMP_THRESHOLD = float(os.getenv('UPDATE_TEMP_THRESHOLD', '2.0'))
+UPDATE_POP_THRESHOLD = float(os.getenv('UPDATE_POP_THRESHOLD', '20'))
+UPDATE_ON_DESCRIPTION = os.getenv('UPDATE_ON_DESCRIPTION', 'true').lower() in ('1', 'true', 'yes')
+
+# 解説:
+# POST_HISTORY_FILEにファイル名(例: .post_history.json)を指定すると、
+# 投稿したメッセージのIDと予報をそのファイルに覚えておき、
+# 同じ日にもう一度実行したときは、気温がUPDATE_TEMP_THRESHOLD℃以上、
+# 降水確率がUPDATE_POP_THRESHOLDポイント以上変わったか、天気の説明が変わった地点だけ
+# 前のメッセージを書き換えます(変わっていなければ何も送りません)
+# 空(既定)なら今までどおり毎回新しく投稿します
+
+# 送信キュー設定
+DELIVERY_QUEUE_FILE = os.getenv('DELIVERY_QUEUE_FILE', '')
+DELIVERY_CONSUMERS = int(os.getenv('DELIVERY_CONSUMERS', '4'))
+DELIVERY_RETRIES = int(os.getenv('DELIVERY_RETRIES', '3'))
+DELIVERY_LEASE = float(os.getenv('DELIVERY_LEASE', '60'))
+DELIVERY_MAX_AGE = int(os.getenv('DELIVERY_MAX_AGE', '10800'))
+
+# 解説:
+# DELIVERY_QUEUE_FILEにファイル名(例: .delivery_queue.db)を指定すると、
+# 送信する前に、送る内容をそのファイル(SQLite)に保存してから送ります
+# 途中でプロセスが止まったりDiscordへの送信に失敗したりしても、次の実行で続きから送ります
+# 地点ごと・日付ごと(常駐モードでは投稿時刻ごと)に1回しか送らないので、二重投稿しません
+# DELIVERY_CONSUMERSは同時に送る数(違うWebhook宛てを並列に送ります)
+# 失敗したらDELIVERY_RETRIES回まで送り直し、それでも送れなければ次の実行に回します
+# 「送信中」の送信は、送ったプロセスが止まっていたら送り直します(動いているプロセスの分は取り上げません)
+# 別のマシンのプロセスの分は、DELIVERY_LEASE秒たってもリースが延ばされなければ止まったものとみなします
+# DELIVERY_MAX_AGE秒より前の送れなかった送信は、古い予報なので送らずに捨てます
+# 空(既定)なら今までどおりキューを使わず、直接送ります
+
+# ゲートウェイ(スラッシュコマンド)設定
+DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN', '')
+GATEWAY_CACHE_SIZE = int(os.getenv('GATEWAY_CACHE_SIZE', '1000'))
+GATEWAY_CACHE_TTL = int(os.getenv('GATEWAY_CACHE_TTL', '900'))
+GATEWAY_REFRESH_AHEAD = float(os.getenv('GATEWAY_REFRESH_AHEAD', '0.8'))
+
+# 解説:
+# python bot.py --gateway で、/weather <地名> コマンドに答えるBotとして常駐します
+# (DISCORD_BOT_TOKENにBotのトークンが必要で、pip install discord.py も必要です)
+# 解析済みの予報を最近使った順にGATEWAY_CACHE_SIZE地点までメモリに持ち、
+# GATEWAY_CACHE_TTL秒のうちGATEWAY_REFRESH_AHEADの割合が過ぎたら、期限切れになる前に裏で取り直します
+
+# 荒天のお知らせ設定
+ALERT_STATE_FILE = os.getenv('ALERT_STATE_FILE', '.alert_state.json')
+ALERT_INTERVAL = int(os.getenv('ALERT_INTERVAL', '600'))
+ALERT_HORIZON_HOURS = int(os.getenv('ALERT_HORIZON_HOURS', '24'))
+ALERT_KINDS = os.getenv('ALERT_KINDS', 'thunderstorm,heavy_rain,heavy_snow,heat,cold')
+ALERT_POP_THRESHOLD = int(os.getenv('ALERT_POP_THRESHOLD', '70'))
+ALERT_HEAT_THRESHOLD = float(os.getenv('ALERT_HEAT_THRESHOLD', '35'))
+ALERT_COLD_THRESHOLD = float(os.getenv('ALERT_COLD_THRESHOLD', '-5'))
+
+# 解説:
+# python bot.py --alerts で常駐し、ALERT_INTERVAL秒ごとに全地点の予報を確認します
+# ALERT_HORIZON_HOURS時間先までに、ALERT_KINDSの天気(雷雨・大雨・大雪・猛暑・冷え込み)が
+# 新しく見込まれるようになった地点にだけお知らせを送ります
+# 大雨は強い雨の予報か、雨で降水確率がALERT_POP_THRESHOLD%以上のとき、
+# 猛暑・冷え込みは気温がALERT_HEAT_THRESHOLD℃以上・ALERT_COLD_THRESHOLD℃以下のときです
+# 予報の指紋とお知らせ済みの内容はALERT_STATE_FILEに保存し、予報が変わった地点だけ詳しく調べます
+
+# 予報キャッシュ設定
+CACHE_DIR = os.getenv('CACHE_DIR', '.forecast_cache')
+CACHE_TTL = int(os.getenv('CACHE_TTL', '10800'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1000'))
+
+# 解説:
+# 取得した予報をCACHE_DIRに保存して、有効期限内はAPIを呼びません
+# CACHE_TTLは予報の更新間隔(秒)で、3時間ごとの区切りで期限切れになります
+# CACHE_DIRを空にするとキャッシュを使いません
+
+# 予報アーカイブ設定
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+
+# 解説:
+# ARCHIVE_DIRにディレクトリを指定すると、APIから取得した予報を毎回追記して残します
+# (python forecast_archive.py list / replay で過去の日の予報を再生できます)
+
+# 計測(メトリクス)設定
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+METRICS_FORMAT = os.getenv('METRICS_FORMAT', 'prometheus')
+METRICS_FILE = os.getenv('METRICS_FILE', '')
+
+# 解説:
+# METRICS_ENABLED=trueにすると、各処理の時間やキャッシュヒット数などを記録します
+# METRICS_FORMATは'prometheus'(テキスト形式)か'json'(JSON Lines)
+# METRICS_FILEが空なら実行の最後に画面に出力します
+# 無効のときは記録処理は何もしません
 
 # OpenWeatherMap API URL
 WEATHER_API_URL = 'https://api.openweathermap.org/data/2.5/forecast'
+ONECALL_API_URL = 'https://api.openweathermap.org/data/3.0/onecall'
+GEOCODING_API_URL = 'https://api.openweathermap.org/geo/1.0/direct'
 
 # 解説:
 # これは天気予報を取得するためのAPIのアドレスです
+# ONECALL_API_URLはFORECAST_SOURCE=onecallのときに使います
+# GEOCODING_API_URLは/weatherコマンドで地点ファイルにない地名を調べるときに使います
@@ -0,0 +1,554 @@
+import hashlib
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import config
+import discord_dispatcher
+import embed_template
+import fetch_policy
+import metrics
+import post_history
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    key TEXT PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    message_id TEXT,
+    body BLOB NOT NULL,
+    length INTEGER NOT NULL,
+    location_keys TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    owner TEXT,
+    result_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_status ON deliveries (status, webhook_url, created_at);
+"""
+
+# 解説:
+# 1行が「1地点分の新規投稿」か「1メッセージ分の書き換え」です
+# keyは冪等キーで、同じキーは2回入らない(=同じ投稿を2回送らない)ようになっています
+# status: pending(送信待ち) → sending(送信中) → sent(送信済み)
+#         今回の実行で送れなかったものはdeferred(次の実行で送り直す)、
+#         古くなって送る意味がなくなったものはexpiredになります
+# ownerは送信中の行を取り出したプロセス(「マシン名:PID:識別子」)です
+
+# このプロセスの識別子(同じPIDで動いていた前のプロセスと見分けるため)
+_PROCESS_TOKEN = secrets.token_hex(4)
+
+# 送信待ちがなくなるのを待つ間隔(秒)
+POLL_INTERVAL = 0.05
+
+# 結果を問い合わせるときに、1回のSQLにまとめるキーの数
+QUERY_CHUNK = 500
+
+
+class Delivery:
+    """
+    キューから取り出した送信1件分
+    """
+    __slots__ = ('rowid', 'key', 'webhook_url', 'message_id', 'body', 'length', 'location_keys')
+    
+    def __init__(self, rowid, key, webhook_url, message_id, body, length, location_keys):
+        self.rowid = rowid
+        self.key = key
+        self.webhook_url = webhook_url
+        self.message_id = message_id
+        self.body = body
+        self.length = length
+        self.location_keys = location_keys
+
+
+class DeliveryQueue:
+    """
+    Discordへの送信待ちをSQLiteのファイルに保存しておくキュー
+    
+    送信する前にキューに書き込み、送れたら「送信済み」に変えるので、
+    途中でプロセスが止まっても、次に起動したときに続きから送れます。
+    """
+    
+    def __init__(self, path, lease=None, max_age=None):
+        """
+        Args:
+            path: キューのファイル
+            lease: 送信中の行を他の送信係が取らない時間(秒、省略時はconfig.DELIVERY_LEASE)
+            max_age: これより古い送信待ちは送らずに捨てる(秒、省略時はconfig.DELIVERY_MAX_AGE)
+        """
+        self.path = path
+        self.lease = config.DELIVERY_LEASE if lease is None else lease
+        self.max_age = config.DELIVERY_MAX_AGE if max_age is None else max_age
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}:{os.getpid()}:{_PROCESS_TOKEN}"
+        self.local = threading.local()
+        db = self.connect()
+        db.executescript(SCHEMA)
+        # owner列がない前のバージョンのキューには列を足す
+        if 'owner' not in [column[1] for column in db.execute("PRAGMA table_info(deliveries)")]:
+            db.execute("ALTER TABLE deliveries ADD COLUMN owner TEXT")
+    
+    def connect(self):
+        """
+        スレッドごとの接続を返す(sqlite3の接続はスレッドをまたいで使わない)
+        """
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return db
+    
+    @contextmanager
+    def transaction(self):
+        """
+        書き込み用のトランザクション(BEGIN IMMEDIATEで、他の送信係と同時に書き換えない)
+        """
+        db = self.connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+    
+    def enqueue(self, entries):
+        """
+        送信待ちをまとめて追加する(同じキーがすでにあれば追加しない)
+        
+        Args:
+            entries: (キー, Webhook URL, 書き換えるメッセージID, 本文, 文字数, 地点のキーのリスト)のリスト
+        
+        Returns:
+            int: 新しく追加した件数
+        """
+        now = time.time()
+        with self.transaction() as db:
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO deliveries "
+                "(key, webhook_url, message_id, body, length, location_keys, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key, webhook_url, message_id, body, length, json.dumps(location_keys), now, now)
+                    for key, webhook_url, message_id, body, length, location_keys in entries
+                ]
+            )
+            return db.total_changes - before
+    
+    def prepare(self):
+        """
+        送信を始める前の片付け: 前回送れなかったものを送信待ちに戻し、古いものを捨てる
+        """
+        now = time.time()
+        with self.transaction() as db:
+            expired = self._expire(db, now)
+            db.execute(
+                "UPDATE deliveries SET status = 'pending', available_at = 0 WHERE status = 'deferred'"
+            )
+        
+        if expired:
+            metrics.increment('deliveries_total', expired, result='expired')
+            print(f"⚠️  古くなった送信待ち{expired}件を破棄しました")
+    
+    def _expire(self, db, now):
+        """
+        max_age秒より前に追加された送れていない行(リース切れの「送信中」も含む)を「期限切れ」にする
+        
+        Returns:
+            int: 期限切れにした件数
+        """
+        return db.execute(
+            "UPDATE deliveries SET status = 'expired', updated_at = ? "
+            "WHERE created_at < ? AND (status IN ('pending', 'deferred') "
+            "OR (status = 'sending' AND lease_until <= ?))",
+            (now, now - self.max_age, now)
+        ).rowcount
+    
+    def _owner_alive(self, owner, lease_until, now):
+        """
+        送信中の行を取り出したプロセスがまだ動いているか
+        
+        同じマシンのプロセスはPIDで調べ、調べられないとき(別のマシン、Windows、
+        持ち主を記録していない前のバージョンの行)はリースが更新されているかで判断します。
+        """
+        if owner == self.owner:
+            return True
+        
+        try:
+            host, pid, _ = owner.rsplit(':', 2)
+            pid = int(pid)
+        except (AttributeError, ValueError):
+            return lease_until > now
+        
+        if host != self.host or os.name == 'nt':
+            return lease_until > now
+        if pid == os.getpid():
+            # 同じPIDで識別子が違うのは、前に同じPIDで動いていた(もう止まった)プロセス
+            return False
+        
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # 別のユーザーのプロセスとして動いている
+            return True
+        except OSError:
+            return lease_until > now
+        return True
+        
+        # 解説:
+        # os.kill(pid, 0)はシグナルを送らずに、そのPIDのプロセスがあるかだけを調べます
+        # (Windowsでは0がCtrl+Cの意味になるので使いません)
+        # 動いているプロセスの行は、送信に時間がかかっていても取り上げないので二重送信しません
+    
+    def _reclaim(self, db, now):
+        """
+        持ち主のプロセスが止まった「送信中」の行を送信待ちに戻す
+        
+        Returns:
+            int: 送信待ちに戻した件数
+        """
+        owners = db.execute(
+            "SELECT owner, MAX(lease_until) FROM deliveries WHERE status = 'sending' GROUP BY owner"
+        ).fetchall()
+        reclaimed = 0
+        for owner, lease_until in owners:
+            if not self._owner_alive(owner, lease_until, now):
+                reclaimed += db.execute(
+                    "UPDATE deliveries SET status = 'pending', owner = NULL WHERE status = 'sending' AND owner IS ?",
+                    (owner,)
+                ).rowcount
+        return reclaimed
+    
+    def renew(self, deliveries):
+        """
+        送信中の行のリースを延ばす(Discordに送る直前に呼ぶ)
+        
+        Returns:
+            bool: すべての行がまだこのプロセスの送信中ならTrue
+        """
+        rowids = [delivery.rowid for delivery in deliveries]
+        renewed = self.connect().execute(
+            "UPDATE deliveries SET lease_until = ? WHERE status = 'sending' AND owner = ? "
+            f"AND rowid IN ({','.join('?' * len(rowids))})",
+            [time.time() + self.lease, self.owner] + rowids
+        ).rowcount
+        return renewed == len(rowids)
+    
+    def claim(self, limit=discord_dispatcher.MAX_EMBEDS_PER_MESSAGE):
+        """
+        送信待ちを取り出して「送信中」にする
+        
+        他の送信係が送っている最中のWebhookは飛ばし、1つのWebhookの新規投稿を
+        最大limit件(1メッセージ分)か、書き換え1件を取り出します。
+        
+        Returns:
+            list: Deliveryのリスト(送れるものがなければ空)
+        """
+        now = time.time()
+        with self.transaction() as db:
+            # 送信中のまま止まったプロセスの行は、古すぎなければ送信待ちに戻す
+            expired = self._expire(db, now)
+            if expired:
+                metrics.increment('deliveries_total', expired, result='expired')
+            self._reclaim(db, now)
+            
+            row = db.execute(
+                "SELECT webhook_url FROM deliveries "
+                "WHERE status = 'pending' AND available_at <= ? AND webhook_url NOT IN "
+                "(SELECT webhook_url FROM deliveries WHERE status = 'sending') "
+                "ORDER BY created_at, rowid LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return []
+            
+            rows = db.execute(
+                "SELECT rowid, key, webhook_url, message_id, body, length, location_keys FROM deliveries "
+                "WHERE status = 'pending' AND available_at <= ? AND webhook_url = ? "
+                "ORDER BY created_at, rowid LIMIT ?",
+                (now, row[0], limit)
+            ).fetchall()
+            
+            # 書き換えは1件ずつ、新規投稿は書き換えが出てくるまでをまとめて送る
+            if rows[0][3] is not None:
+                rows = rows[:1]
+            else:
+                count = 0
+                while count < len(rows) and rows[count][3] is None:
+                    count += 1
+                rows = rows[:count]
+            
+            db.executemany(
+                "UPDATE deliveries SET status = 'sending', attempts = attempts + 1, lease_until = ?, owner = ? "
+                "WHERE rowid = ?",
+                [(now + self.lease, self.owner, r[0]) for r in rows]
+            )
+        
+        return [
+            Delivery(rowid, key, webhook_url, message_id, body, length, json.loads(location_keys))
+            for rowid, key, webhook_url, message_id, body, length, location_keys in rows
+        ]
+    
+    def complete(self, deliveries, result_id):
+        """
+        送信できた行を「送信済み」にする
+        """
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                "UPDATE deliveries SET status = 'sent', result_id = ?, updated_at = ? WHERE rowid = ?",
+                [(result_id, now, delivery.rowid) for delivery in deliveries]
+            )
+    
+    def release(self, deliveries, delay=None):
+        """
+        送れなかった行を戻す(delay秒後に送り直す。Noneなら次の実行まで送らない)
+        
+        このプロセスの送信中ではなくなった行(期限切れにした行など)はそのままにします。
+        """
+        now = time.time()
+        with self.transaction() as db:
+            if delay is None:
+                db.executemany(
+                    "UPDATE deliveries SET status = 'deferred', owner = NULL, updated_at = ? "
+                    "WHERE rowid = ? AND status = 'sending' AND owner = ?",
+                    [(now, delivery.rowid, self.owner) for delivery in deliveries]
+                )
+            else:
+                db.executemany(
+                    "UPDATE deliveries SET status = 'pending', owner = NULL, available_at = ?, updated_at = ? "
+                    "WHERE rowid = ? AND status = 'sending' AND owner = ?",
+                    [(now + delay, now, delivery.rowid, self.owner) for delivery in deliveries]
+                )
+    
+    def outstanding(self):
+        """
+        送信待ちと、このプロセスが送信中の件数
+        
+        (ほかのプロセスが送信中の行はそのプロセスに任せ、終わるのを待たない)
+        """
+        return self.connect().execute(
+            "SELECT COUNT(*) FROM deliveries WHERE status = 'pending' OR (status = 'sending' AND owner = ?)",
+            (self.owner,)
+        ).fetchone()[0]
+    
+    def results(self, keys):
+        """
+        キーごとの送信結果を返す
+        
+        Returns:
+            dict: {キー: (状態, Webhook URL, 書き換えたメッセージID, 送信したメッセージID, 地点のキーのリスト)}
+        """
+        db = self.connect()
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[i:i + QUERY_CHUNK]
+            for key, status, webhook_url, message_id, result_id, location_keys in db.execute(
+                "SELECT key, status, webhook_url, message_id, result_id, location_keys FROM deliveries "
+                f"WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ):
+                found[key] = (status, webhook_url, message_id, result_id, json.loads(location_keys))
+        return found
+    
+    def drain(self, dispatcher, consumers=None, retries=None):
+        """
+        キューの送信待ちがなくなるまで、consumers個の送信係で並列に送る
+        
+        違うWebhook宛ては別々の送信係が同時に送り、同じWebhook宛ては
+        1つの送信係が順番に送ります(レート制限と投稿の順番を守るため)。
+        
+        Args:
+            dispatcher: 実際に送信するDiscordDispatcher
+            consumers: 送信係(スレッド)の数(省略時はconfig.DELIVERY_CONSUMERS)
+            retries: この実行の中で送り直す回数(省略時はconfig.DELIVERY_RETRIES)
+        """
+        consumers = max(1, config.DELIVERY_CONSUMERS if consumers is None else consumers)
+        retries = config.DELIVERY_RETRIES if retries is None else retries
+        
+        self.prepare()
+        
+        failures = {}
+        lock = threading.Lock()
+        
+        def consume():
+            while True:
+                deliveries = self.claim()
+                if not deliveries:
+                    if not self.outstanding():
+                        return
+                    # 他の送信係の送信中か、送り直しの待ち時間中
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                
+                for group, result_id in self._send(dispatcher, deliveries):
+                    if result_id is not None:
+                        self.complete(group, result_id)
+                        metrics.increment('deliveries_total', len(group), result='sent')
+                        continue
+                    
+                    with lock:
+                        attempt = failures[group[0].key] = failures.get(group[0].key, 0) + 1
+                    if attempt <= retries:
+                        self.release(group, fetch_policy.backoff_delay(attempt - 1))
+                        metrics.increment('deliveries_total', len(group), result='retry')
+                    else:
+                        self.release(group)
+                        metrics.increment('deliveries_total', len(group), result='deferred')
+                        print(f"⚠️  {len(group)}件を送れなかったため、次の実行で送り直します")
+        
+        threads = [threading.Thread(target=consume, daemon=True) for _ in range(consumers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # 解説:
+        # 送信係はclaim()で取り出した行だけを送るので、同じ行を2つの送信係が送ることはありません
+        # 送る直前にリースを延ばし、動いているプロセスの行は取り上げないので、
+        # レート制限で長く待っても、ほかの送信係が同じ行を送り直すことはありません
+        # 送信中にプロセスが止まった行は送信待ちに戻ります
+        # 1メッセージ送るごとに「送信済み」にするので、送り直しになるのはWebhookごとに
+        # 止まった瞬間に送っていた(届いたか分からない)1メッセージだけです
+    
+    def _send(self, dispatcher, deliveries):
+        """
+        取り出した行を1メッセージずつ送る(送るたびに結果を返すジェネレーター)
+        
+        Yields:
+            tuple: (行のリスト, 送信したメッセージのID(失敗ならNone))
+        """
+        first = deliveries[0]
+        
+        if first.message_id is not None:
+            with metrics.timer('post'):
+                ok = dispatcher.send(first.webhook_url, first.body, message_id=first.message_id,
+                                     before_attempt=lambda: self.renew(deliveries))
+            yield deliveries, first.message_id if ok else None
+            return
+        
+        start = 0
+        embeds = [embed_template.RenderedEmbed(delivery.body, delivery.length) for delivery in deliveries]
+        for group in discord_dispatcher.group_embeds(embeds):
+            # まだ送っていない行(このメッセージ以降)のリースを延ばしながら送る
+            remaining = deliveries[start:]
+            group_deliveries = remaining[:len(group)]
+            start += len(group)
+            with metrics.timer('post'):
+                message = dispatcher.send(first.webhook_url, {"embeds": group}, wait=True,
+                                          before_attempt=lambda: self.renew(remaining))
+            if not message:
+                yield group_deliveries, None
+                continue
+            message_id = message.get('id') if isinstance(message, dict) else None
+            # IDが返らなかった場合も送信済みとして扱う(空文字で記録する)
+            yield group_deliveries, message_id or ''
+
+
+class QueuedDispatcher:
+    """
+    DiscordDispatcherと同じ使い方(add / add_edit / flush)で、
+    送信をいったんキューに保存してから送るラッパー
+    
+    新規投稿の冪等キーは「Webhook・実行の識別名(既定は日付)・地点」なので、
+    同じ日に実行し直しても、送信済みの地点は送り直しません。
+    """
+    
+    def __init__(self, queue, dispatcher, run_id):
+        """
+        Args:
+            queue: DeliveryQueue
+            dispatcher: 実際に送信するDiscordDispatcher
+            run_id: 実行の識別名(例: '2024-06-01'、常駐モードでは投稿時刻も含む)
+        """
+        self.queue = queue
+        self.dispatcher = dispatcher
+        self.run_id = run_id
+        self.entries = []
+    
+    def add(self, webhook_url, embed_data, key=None):
+        webhook = post_history.webhook_key(webhook_url)
+        for embed in embed_data['embeds']:
+            if isinstance(embed, embed_template.RenderedEmbed):
+                body, length = embed.data, embed.length
+            else:
+                body, length = embed_template.dumps(embed), discord_dispatcher.embed_length(embed)
+            
+            # 地点のキーがなければ、内容そのものを冪等キーにする
+            name = key if key is not None else hashlib.sha1(body).hexdigest()
+            self.entries.append((f"post:{webhook}:{self.run_id}:{name}", webhook_url, None, body, length,
+                                 [key] if key is not None else []))
+    
+    def add_edit(self, webhook_url, message_id, embed_data, keys=None):
+        body = embed_template.encode_message(embed_data)
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        webhook = post_history.webhook_key(webhook_url)
+        self.entries.append((f"edit:{webhook}:{message_id}:{digest}", webhook_url, message_id, body,
+                             len(embed_data['embeds']), list(keys or [])))
+    
+    def flush(self):
+        """
+        追加した送信をキューに保存してから、キュー全体を送る
+        
+        Returns:
+            dict: Webhook URLごとの、送信・書き換えできたメッセージ(SentMessage)のリスト
+                  (前回の実行で送信済みだったものも含む)
+        """
+        entries, self.entries = self.entries, []
+        
+        added = self.queue.enqueue(entries)
+        if added < len(entries):
+            print(f"📮 送信済み・送信待ちの{len(entries) - added}件はキューに追加しませんでした")
+        
+        self.queue.drain(self.dispatcher)
+        
+        # 送信済みになった行を、メッセージごとにまとめて返す
+        results = self.queue.results(entry[0] for entry in entries)
+        messages = {}
+        for key, webhook_url, message_id, _, _, _ in entries:
+            status, _, _, result_id, location_keys = results.get(key, (None,) * 5)
+            if status != 'sent':
+                continue
+            # IDが返らなかったメッセージは、1件ずつ別のメッセージとして数える
+            group = (webhook_url, result_id or key)
+            message = messages.get(group)
+            if message is None:
+                message = messages[group] = discord_dispatcher.SentMessage(
+                    result_id or None, [], 0, edited=message_id is not None
+                )
+            message.keys.extend(location_keys)
+            message.embeds += len(location_keys) or 1
+        
+        sent = {}
+        for (webhook_url, _), message in messages.items():
+            sent.setdefault(webhook_url, []).append(message)
+        return sent
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """
+    config.DELIVERY_QUEUE_FILEのキューを返す(プロセス全体で共有する)
+    """
+    global _queue
+    
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = DeliveryQueue(config.DELIVERY_QUEUE_FILE)
+    
+    return _queue
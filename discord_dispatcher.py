@@ -0,0 +1,323 @@
+import threading
+import time
+import config
+import embed_template
+import http_client
+import metrics
+
+
+# Discordの制限: 1メッセージあたりのEmbed数と、Embedの合計文字数
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+def embed_text(embed):
+    """
+    Discordが文字数を数える部分(タイトル・説明・フィールド・フッター)をつなげた文字列
+    """
+    parts = [embed.get('title', ''), embed.get('description', '')]
+    for field in embed.get('fields', []):
+        parts.append(field.get('name', ''))
+        parts.append(field.get('value', ''))
+    parts.append(embed.get('footer', {}).get('text', ''))
+    return ''.join(parts)
+
+
+def embed_length(embed):
+    """
+    Discordが数えるEmbedの文字数(タイトル・説明・フィールド・フッター)を返す
+    """
+    if isinstance(embed, embed_template.RenderedEmbed):
+        return embed.length
+    return len(embed_text(embed))
+
+
+def group_embeds(embeds):
+    """
+    Embedを「1メッセージ10個まで・合計6000文字まで」のグループに分ける
+    
+    Args:
+        embeds: Embedのリスト
+        
+    Returns:
+        list: Embedのリストのリスト(1要素が1メッセージ分)
+    """
+    groups = []
+    current = []
+    current_chars = 0
+    
+    for embed in embeds:
+        chars = embed_length(embed)
+        if current and (len(current) >= MAX_EMBEDS_PER_MESSAGE
+                        or current_chars + chars > MAX_EMBED_CHARS_PER_MESSAGE):
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(embed)
+        current_chars += chars
+    
+    if current:
+        groups.append(current)
+    
+    return groups
+
+
+class SentMessage:
+    """
+    送信(または書き換え)できたメッセージ1件の情報
+    """
+    __slots__ = ('message_id', 'keys', 'embeds', 'edited')
+    
+    def __init__(self, message_id, keys, embeds, edited=False):
+        self.message_id = message_id
+        self.keys = keys
+        self.embeds = embeds
+        self.edited = edited
+
+
+class RateLimitBucket:
+    """
+    Webhook1つ分のレート制限の状態(レスポンスヘッダーから更新する)
+    """
+    __slots__ = ('remaining', 'reset_at')
+    
+    def __init__(self):
+        self.remaining = None
+        self.reset_at = 0.0
+    
+    def wait(self):
+        """
+        残り回数が0なら、リセットされるまで待つ
+        """
+        if self.remaining is not None and self.remaining <= 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.remaining = None
+    
+    def update(self, headers):
+        """
+        X-RateLimit-Remaining / X-RateLimit-Reset-Afterヘッダーを反映する
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+
+class DiscordDispatcher:
+    """
+    Webhookごとにレート制限を守りながらEmbedをまとめて送る
+    
+    - 同じWebhook宛てのEmbedは最大10個ずつ1回のリクエストにまとめる
+    - レスポンスのX-RateLimit-*ヘッダーから残り回数を覚えておき、
+      0になったらリセットまで待ってから送る(429を出さない)
+    - それでも429が返ったらretry_afterだけ待って送り直す
+    - 違うWebhook宛ては並列に送る
+    - add_edit()を使うと、送信済みのメッセージをPATCHで書き換える
+    """
+    
+    def __init__(self, session=None, max_workers=None, max_retries=None):
+        self.session = session or http_client.get_session()
+        self.max_workers = max_workers or config.MAX_WORKERS
+        self.max_retries = config.DISCORD_MAX_RETRIES if max_retries is None else max_retries
+        self.buckets = {}
+        self.pending = {}
+        self.edits = {}
+        self.global_reset_at = 0.0
+        self.lock = threading.Lock()
+    
+    def _bucket(self, webhook_url):
+        with self.lock:
+            bucket = self.buckets.get(webhook_url)
+            if bucket is None:
+                bucket = self.buckets[webhook_url] = RateLimitBucket()
+            return bucket
+    
+    def add(self, webhook_url, embed_data, key=None):
+        """
+        送信待ちにEmbedメッセージを追加する(flush()でまとめて送る)
+        
+        Args:
+            webhook_url: 送信先のWebhook URL
+            embed_data: {"embeds": [...]}形式のメッセージ
+            key: Embedの識別名(flush()の結果で、どのメッセージに入ったかを返す)
+        """
+        with self.lock:
+            items = self.pending.setdefault(webhook_url, [])
+            items.extend((key, embed) for embed in embed_data['embeds'])
+    
+    def add_edit(self, webhook_url, message_id, embed_data, keys=None):
+        """
+        送信済みメッセージの書き換えを送信待ちに追加する(flush()でまとめて送る)
+        
+        Args:
+            webhook_url: 送信先のWebhook URL
+            message_id: 書き換えるメッセージのID
+            embed_data: {"embeds": [...]}形式の新しい内容
+            keys: メッセージに入っているEmbedの識別名のリスト
+        """
+        with self.lock:
+            self.edits.setdefault(webhook_url, []).append((message_id, embed_data, keys or []))
+    
+    def flush(self):
+        """
+        送信待ちのEmbedと書き換えをすべて送る
+        
+        Returns:
+            dict: Webhook URLごとの、送信・書き換えできたメッセージ(SentMessage)のリスト
+        """
+        with self.lock:
+            pending, edits = self.pending, self.edits
+            self.pending, self.edits = {}, {}
+        
+        webhook_urls = list(pending.keys() | edits.keys())
+        if not webhook_urls:
+            return {}
+        
+        from concurrent.futures import ThreadPoolExecutor
+        
+        workers = max(1, min(self.max_workers, len(webhook_urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda url: self._send_all(url, pending.get(url, []), edits.get(url, [])),
+                webhook_urls
+            )
+            return dict(zip(webhook_urls, results))
+    
+    def _send_all(self, webhook_url, items, edits):
+        sent = []
+        
+        for message_id, embed_data, keys in edits:
+            with metrics.timer('post'):
+                if self.send(webhook_url, embed_data, message_id=message_id):
+                    sent.append(SentMessage(message_id, keys, len(embed_data['embeds']), edited=True))
+        
+        start = 0
+        for group in group_embeds([embed for _, embed in items]):
+            keys = [key for key, _ in items[start:start + len(group)]]
+            start += len(group)
+            with metrics.timer('post'):
+                message = self.send(webhook_url, {"embeds": group}, wait=True)
+            if message:
+                message_id = message.get('id') if isinstance(message, dict) else None
+                sent.append(SentMessage(message_id, keys, len(group)))
+        
+        return sent
+    
+    def send(self, webhook_url, embed_data, message_id=None, wait=False, before_attempt=None):
+        """
+        メッセージを1件送る(レート制限を守り、429なら待って送り直す)
+        
+        Args:
+            webhook_url: 送信先のWebhook URL
+            embed_data: Discordに送るメッセージ(EmbedはdictでもRenderedEmbedでもよい。
+                        変換済みの本文(bytes)ならそのまま送る)
+            message_id: 指定すると新しく送らず、そのメッセージを書き換える(PATCH)
+            wait: Trueなら送信したメッセージの内容(IDなど)を返してもらう
+            before_attempt: 送る直前(再送のたび)に呼ぶ関数。Falseを返したら送らずにやめる
+                            (送信キューがリースを延ばすのに使う)
+            
+        Returns:
+            送信成功時はTrue(wait=Trueならメッセージの辞書)、失敗時False
+        """
+        bucket = self._bucket(webhook_url)
+        body = embed_data if isinstance(embed_data, bytes) else embed_template.encode_message(embed_data)
+        
+        if message_id is not None:
+            method, url, params = 'PATCH', f"{webhook_url.rstrip('/')}/messages/{message_id}", None
+        else:
+            method, url, params = 'POST', webhook_url, {'wait': 'true'} if wait else None
+        
+        for _ in range(self.max_retries + 1):
+            # 全体(グローバル)のレート制限中なら待つ
+            delay = self.global_reset_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            bucket.wait()
+            
+            if before_attempt is not None and not before_attempt():
+                print("⚠️  送信中の扱いではなくなったため、送信を取りやめました")
+                return False
+            
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    data=body,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=http_client.get_timeout()
+                )
+            except http_client.RequestException as e:
+                metrics.increment('discord_errors_total')
+                print(f"❌ Discordへの送信に失敗しました: {e}")
+                return False
+            metrics.observe('upstream_latency_seconds', time.perf_counter() - start, upstream='discord')
+            
+            bucket.update(response.headers)
+            
+            if response.status_code != 429:
+                try:
+                    response.raise_for_status()
+                except http_client.RequestException as e:
+                    metrics.increment('discord_errors_total')
+                    print(f"❌ Discordへの送信に失敗しました: {e}")
+                    return False
+                if wait and response.content:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        pass
+                return True
+            
+            metrics.increment('discord_rate_limited_total')
+            retry_after, is_global = self._retry_after(response)
+            print(f"⏳ レート制限のため{retry_after:.2f}秒待って再送します")
+            if is_global:
+                self.global_reset_at = time.monotonic() + retry_after
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = time.monotonic() + retry_after
+        
+        print("❌ Discordへの送信に失敗しました: レート制限の再試行回数を超えました")
+        return False
+    
+    @staticmethod
+    def _retry_after(response):
+        """
+        429レスポンスから(待つ秒数, グローバル制限かどうか)を取り出す
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        
+        retry_after = body.get('retry_after')
+        if retry_after is None:
+            retry_after = response.headers.get('Retry-After', 1)
+        
+        is_global = body.get('global') or response.headers.get('X-RateLimit-Global') == 'true'
+        return float(retry_after), bool(is_global)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """
+    プロセス全体で共有するディスパッチャーを返す
+    """
+    global _dispatcher
+    
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = DiscordDispatcher()
+    
+    return _dispatcher
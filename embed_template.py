@@ -0,0 +1,300 @@
+import json
+import threading
+from json.encoder import encode_basestring
+import config
+import metrics
+
+
+_orjson = None
+_orjson_loaded = False
+
+
+def get_orjson():
+    """
+    orjsonが入っていれば返す(なければNone)
+    """
+    global _orjson, _orjson_loaded
+    
+    if not _orjson_loaded:
+        # 起動を遅くしないように、初めてJSONにするときに読み込む
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+        _orjson, _orjson_loaded = orjson, True
+    
+    return _orjson
+    
+    # 解説:
+    # orjsonが入っていれば速いJSONエンコーダーを使い、なければ標準のjsonを使います
+    # (pip install orjson で速くなりますが、なくても動きます)
+
+
+def dumps(obj):
+    """
+    JSONのバイト列に変換する(orjsonがあれば使う)
+    
+    Args:
+        obj: 変換する値
+        
+    Returns:
+        bytes: UTF-8のJSON(空白なし)
+    """
+    orjson = get_orjson()
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# テンプレートの中で、地点ごとに値を埋める場所の目印(@@名前@@)
+PLACEHOLDER_PATTERN = r'@@(\w+)@@'
+
+# DailySummaryのうち、Embedに埋める項目
+SUMMARY_FIELDS = (
+    'date', 'temp_min', 'temp_max', 'morning_temp', 'noon_temp', 'night_temp',
+    'weather_description', 'weather_icon', 'pop'
+)
+
+
+class RenderedEmbed:
+    """
+    JSONに変換済みのEmbed1個分(dataはそのまま送信本文に入れられる)
+    """
+    __slots__ = ('data', 'length')
+    
+    def __init__(self, data, length):
+        self.data = data
+        self.length = length
+
+
+class _Placeholders:
+    """
+    テンプレートを作るときにDailySummaryの代わりに渡す(値の代わりに目印を返す)
+    """
+    
+    def __init__(self, weather_main):
+        self.weather_main = weather_main
+        for name in SUMMARY_FIELDS:
+            setattr(self, name, f"@@{name}@@")
+
+
+def _text(value):
+    return value if isinstance(value, str) else str(value)
+
+
+def _escape(value):
+    # 数値はJSONの文字列の中でエスケープが要らない
+    if isinstance(value, str):
+        return encode_basestring(value)[1:-1]
+    return str(value)
+
+
+class EmbedTemplate:
+    """
+    Embedの決まった部分を前もってJSONにしたもの
+    
+    項目名・構造・色・絵文字は作成時に1回だけJSONにし、
+    描画時は残りの値(気温・地点名など)だけをエスケープして埋めます。
+    """
+    
+    def __init__(self, literals, names, counted_names, static_length):
+        """
+        Args:
+            literals: 固定部分のJSON文字列のリスト(値の数+1個)
+            names: 値を埋める場所の名前のリスト(literalsの間に入る)
+            counted_names: Discordが文字数を数える部分に入る値の名前
+            static_length: Discordが数える文字数のうち、固定部分の長さ
+        """
+        self.literals = literals
+        self.names = names
+        self.counted_names = counted_names
+        self.static_length = static_length
+        
+        # 描画用: 固定部分を「%s」でつないだ書式と、(値の名前, 文字数に数えるか)の並び
+        self.format = '%s'.join(literal.replace('%', '%%') for literal in literals)
+        remaining = list(counted_names)
+        self.slots = []
+        for name in names:
+            counted = name in remaining
+            if counted:
+                remaining.remove(name)
+            self.slots.append((name, counted))
+    
+    @classmethod
+    def compile(cls, build, weather_main):
+        """
+        Embedを作る関数から、天気(weather_main)ごとのテンプレートを作る
+        
+        Args:
+            build: bot.create_embed_message(Embedの形はこの関数の結果に合わせる)
+            weather_main: 天気の種類(Clear, Rainなど)
+            
+        Returns:
+            EmbedTemplate: 作成したテンプレート
+        """
+        embed = build(
+            _Placeholders(weather_main),
+            '@@clothing@@',
+            '@@items@@',
+            '@@location_name@@',
+            updated='@@updated@@'
+        )['embeds'][0]
+        
+        import re
+        placeholder = re.compile(PLACEHOLDER_PATTERN)
+        
+        # 「固定の文字列, 値の名前, 固定の文字列, 値の名前, ...」に分ける
+        parts = placeholder.split(dumps(embed).decode('utf-8'))
+        
+        # Discordが数える文字数のうち、固定の部分(目印を除いた長さ)
+        import discord_dispatcher
+        counted = discord_dispatcher.embed_text(embed)
+        
+        return cls(
+            parts[0::2],
+            parts[1::2],
+            placeholder.findall(counted),
+            len(placeholder.sub('', counted))
+        )
+    
+    def bind(self, values):
+        """
+        一部の値だけを先に埋めたテンプレートを作る
+        
+        Args:
+            values: {値の名前: 値}(埋めない値は含めない)
+            
+        Returns:
+            EmbedTemplate: 残りの値だけを埋めればよいテンプレート
+        """
+        literals = [self.literals[0]]
+        names = []
+        for index, name in enumerate(self.names, 1):
+            if name in values:
+                literals[-1] += _escape(values[name]) + self.literals[index]
+            else:
+                names.append(name)
+                literals.append(self.literals[index])
+        
+        counted_names = [name for name in self.counted_names if name not in values]
+        static_length = self.static_length + sum(
+            len(_text(values[name])) for name in self.counted_names if name in values
+        )
+        return EmbedTemplate(literals, names, counted_names, static_length)
+        
+        # 解説:
+        # 例: 同じセルの地点は地点名以外が同じなので、気温などを1回だけ埋めておけば、
+        # 地点ごとには地点名を埋めるだけで済みます
+    
+    def render(self, values):
+        """
+        値を埋めてEmbedのJSONを作る
+        
+        Args:
+            values: {値の名前: 値}(残っている値すべて)
+            
+        Returns:
+            RenderedEmbed: JSONのバイト列とDiscordが数える文字数
+        """
+        escaped = []
+        length = self.static_length
+        for name, counted in self.slots:
+            value = values[name]
+            if isinstance(value, str):
+                escaped.append(encode_basestring(value)[1:-1])
+            else:
+                # 数値はJSONの文字列の中でエスケープが要らない
+                value = str(value)
+                escaped.append(value)
+            if counted:
+                length += len(value)
+        
+        return RenderedEmbed((self.format % tuple(escaped)).encode('utf-8'), length)
+        
+        # 解説:
+        # encode_basestring()は文字列をJSONの文字列("...")にする標準ライブラリの関数です
+        # 前後の"を外して、固定部分の間に埋め込みます
+
+
+class TemplateCache:
+    """
+    天気ごとのEmbedTemplateを、初めて使うときに作って使い回す
+    """
+    
+    def __init__(self, build):
+        self.build = build
+        self.templates = {}
+        self.lock = threading.Lock()
+    
+    def get(self, weather_main):
+        template = self.templates.get(weather_main)
+        if template is None:
+            with self.lock:
+                template = self.templates.get(weather_main)
+                if template is None:
+                    template = EmbedTemplate.compile(self.build, weather_main)
+                    self.templates[weather_main] = template
+        return template
+    
+    def bind(self, weather_info, clothing, items, updated=''):
+        """
+        地点名以外の値を埋めたテンプレートを作る(同じ予報の地点で使い回す)
+        
+        Args:
+            weather_info: 天気情報(DailySummary)
+            clothing: 服装の推奨
+            items: 持ち物の推奨
+            updated: フッターに表示する更新時刻の文字列
+            
+        Returns:
+            EmbedTemplate: render({'location_name': 地点名})でEmbedを作れるテンプレート
+        """
+        values = {name: getattr(weather_info, name) for name in SUMMARY_FIELDS}
+        values['clothing'] = clothing
+        values['items'] = items
+        values['updated'] = updated
+        return self.get(weather_info.weather_main).bind(values)
+    
+    @metrics.timed('embed')
+    def render(self, weather_info, clothing, items, location_name=None, updated=''):
+        """
+        create_embed_message()と同じEmbedを、テンプレートからJSONで作る
+        
+        Args:
+            weather_info: 天気情報(DailySummary)
+            clothing: 服装の推奨
+            items: 持ち物の推奨
+            location_name: 地点名(省略時はconfig.LOCATION_NAME)
+            updated: フッターに表示する更新時刻の文字列
+            
+        Returns:
+            RenderedEmbed: JSONに変換済みのEmbed
+        """
+        values = {name: getattr(weather_info, name) for name in SUMMARY_FIELDS}
+        values['clothing'] = clothing
+        values['items'] = items
+        values['location_name'] = location_name or config.LOCATION_NAME
+        values['updated'] = updated
+        return self.get(weather_info.weather_main).render(values)
+
+
+def encode_message(message):
+    """
+    Webhookに送るメッセージをJSONのバイト列にする
+    
+    embedsにRenderedEmbedが入っていれば、変換済みのJSONをそのままつなぎます。
+    
+    Args:
+        message: {"embeds": [...]}形式のメッセージ(dictとRenderedEmbedが混ざってもよい)
+        
+    Returns:
+        bytes: 送信する本文
+    """
+    embeds = message.get('embeds', [])
+    if not any(isinstance(embed, RenderedEmbed) for embed in embeds):
+        return dumps(message)
+    
+    rest = {key: value for key, value in message.items() if key != 'embeds'}
+    head = dumps(rest)[:-1] + (b',' if rest else b'')
+    parts = [embed.data if isinstance(embed, RenderedEmbed) else dumps(embed) for embed in embeds]
+    return head + b'"embeds":[' + b','.join(parts) + b']}'
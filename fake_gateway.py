@@ -0,0 +1,77 @@
+import asyncio
+import itertools
+import time
+import gateway
+
+
+class FakeGateway:
+    """
+    Discordのゲートウェイの代わりに、/weatherコマンドのインタラクションを
+    WeatherServiceへ直接届ける(本物のDiscordなしで試すため・ベンチマーク用)
+    
+    インタラクションと応答は、Discordが送ってくる・受け取るJSONと同じ形の辞書です。
+    """
+    
+    def __init__(self, service):
+        """
+        Args:
+            service: gateway.WeatherService
+        """
+        self.service = service
+        self.ids = itertools.count(1)
+        # (地名, 応答, 応答までの秒数)のリスト
+        self.responses = []
+    
+    def interaction(self, city, user_id=0):
+        """
+        /weather cityのインタラクション(Discordと同じ形の辞書)を作る
+        """
+        interaction_id = str(next(self.ids))
+        return {
+            'id': interaction_id,
+            'application_id': '0',
+            'type': gateway.APPLICATION_COMMAND,
+            'token': f"fake-token-{interaction_id}",
+            'version': 1,
+            'user': {'id': str(user_id), 'username': f"user{user_id}"},
+            'data': {
+                'id': '0',
+                'name': gateway.WEATHER_COMMAND['name'],
+                'type': 1,
+                'options': [{'name': 'city', 'type': 3, 'value': city}],
+            },
+        }
+    
+    async def send(self, city, user_id=0):
+        """
+        インタラクションを1件届けて、応答と応答までの秒数を返す
+        """
+        start = time.perf_counter()
+        response = await self.service.handle_interaction(self.interaction(city, user_id))
+        elapsed = time.perf_counter() - start
+        self.responses.append((city, response, elapsed))
+        return response, elapsed
+    
+    async def run(self, cities, users, requests_per_user):
+        """
+        users人が同時に、それぞれrequests_per_user回ずつ/weatherを使う
+        
+        Args:
+            cities: ユーザーごとに、問い合わせる地名を返す関数 (ユーザー番号, 回数) → 地名
+            users: 同時に使うユーザーの数
+            requests_per_user: 1人あたりの問い合わせ回数
+        
+        Returns:
+            list: 応答までの秒数のリスト
+        """
+        async def user(user_id):
+            latencies = []
+            for i in range(requests_per_user):
+                _, elapsed = await self.send(cities(user_id, i), user_id)
+                latencies.append(elapsed)
+                # 他のユーザーの問い合わせにも順番を回す
+                await asyncio.sleep(0)
+            return latencies
+        
+        results = await asyncio.gather(*(user(user_id) for user_id in range(users)))
+        return [latency for latencies in results for latency in latencies]
@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+from collections import deque
+import config
+import http_client
+import metrics
+
+
+class CircuitOpenError(Exception):
+    """
+    サーキットブレーカーが開いていて、リクエストを送らなかったときの例外
+    """
+
+
+class CircuitBreaker:
+    """
+    失敗が続いたら、しばらくリクエストを止めるサーキットブレーカー
+    
+    - closed: 通常どおりリクエストを送る
+    - open: failure_threshold回続けて失敗したら、reset_timeout秒間は送らない
+    - half-open: reset_timeout秒たったら1回だけ試し、成功すればclosedに戻る
+    """
+    
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.BREAKER_RESET_TIMEOUT
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+    
+    def allow(self):
+        """
+        今リクエストを送ってよいか
+        
+        Returns:
+            tuple: (送ってよいか, 半開状態の試しの1回として通したか)
+        """
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True, False
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True, True
+            return False, False
+    
+    def end_trial(self):
+        """
+        半開状態の試しの1回が終わったことにする(allow()が試しとして通した呼び出しだけが呼ぶ)
+        """
+        with self.lock:
+            self.trial_running = False
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"🔌 失敗が{self.failures}回続いたため、{self.reset_timeout}秒間APIへのリクエストを止めます")
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    最近の応答時間を覚えておき、パーセンタイルを計算する(ヘッジの待ち時間に使う)
+    """
+    
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+    
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+    
+    def percentile(self, percent):
+        """
+        応答時間のパーセンタイル(秒)。サンプルが足りなければNone
+        """
+        with self.lock:
+            if len(self.samples) < config.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+
+def is_retryable(error):
+    """
+    送り直せば成功する見込みのあるエラーかどうか
+    
+    接続エラー・タイムアウト・5xx・429・途中で切れたレスポンスは再試行し、
+    APIキーの誤りなどの4xxは再試行しない
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code >= 500 or response.status_code == 429
+    return True
+
+
+def backoff_delay(attempt):
+    """
+    attempt回目の再試行までの待ち時間(ジッター付きの指数バックオフ)
+    """
+    delay = min(config.FETCH_BACKOFF_MAX, config.FETCH_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+    
+    # 解説:
+    # 1回目0.5秒、2回目1秒、3回目2秒…と倍々に増やし、
+    # 待ち時間をランダムにずらして、たくさんの呼び出しが同時に再試行しないようにします
+
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _executor():
+    global _hedge_executor
+    
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _hedge_executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS * 2)
+    
+    return _hedge_executor
+
+
+def _hedged(request, tracker):
+    """
+    request()を実行し、遅ければ(応答時間のHEDGE_PERCENTILEを超えたら)
+    同じリクエストをもう1つ送り、先に成功した方の結果を使う
+    """
+    delay = tracker.percentile(config.HEDGE_PERCENTILE) if config.HEDGE_ENABLED else None
+    if delay is None:
+        return request()
+    
+    from concurrent.futures import FIRST_COMPLETED, wait
+    
+    executor = _executor()
+    futures = {executor.submit(request)}
+    done, _ = wait(futures, timeout=delay)
+    
+    if not done:
+        metrics.increment('hedged_requests_total')
+        futures.add(executor.submit(request))
+    
+    # 先に成功した方を返す(両方失敗したら最後のエラーを出す)
+    error = None
+    pending = futures
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call(request, breaker, tracker, label='request'):
+    """
+    タイムアウト・再試行・ヘッジ・サーキットブレーカーを適用してrequest()を実行する
+    
+    Args:
+        request: 引数なしで呼ぶ関数(失敗時は例外を出す)
+        breaker: CircuitBreaker
+        tracker: LatencyTracker
+        label: ログ用の名前
+    
+    Returns:
+        request()の戻り値
+    
+    Raises:
+        CircuitOpenError: ブレーカーが開いていて送らなかったとき
+        request()が最後に出した例外
+    """
+    allowed, trial = breaker.allow()
+    if not allowed:
+        metrics.increment('circuit_open_total')
+        raise CircuitOpenError(f"{label}: サーキットブレーカーが開いています")
+    
+    try:
+        for attempt in range(config.FETCH_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                result = _hedged(request, tracker)
+            except (http_client.RequestException, ValueError) as e:
+                # APIキーの誤りや404など、送り直しても変わらないエラーはブレーカーの失敗に数えない
+                # (1つの地点の設定ミスで、全地点の取得を止めないため)
+                if not is_retryable(e):
+                    raise
+                if attempt >= config.FETCH_RETRIES:
+                    breaker.record_failure()
+                    raise
+                
+                delay = backoff_delay(attempt)
+                metrics.increment('fetch_retries_total')
+                print(f"🔁 {label}: 失敗したため{delay:.1f}秒後に再試行します ({e})")
+                time.sleep(delay)
+                continue
+            except Exception:
+                # デコード中のKeyError・TypeErrorなど、想定外の例外も失敗として数える
+                breaker.record_failure()
+                raise
+            
+            tracker.record(time.perf_counter() - start)
+            breaker.record_success()
+            return result
+    finally:
+        # 試しの1回として通った呼び出しは、どんな終わり方をしても(KeyboardInterruptなども)
+        # 試しが終わったことにする(ほかの呼び出しが試し中の印を消さないように、試しのときだけ)
+        if trial:
+            breaker.end_trial()
@@ -0,0 +1,179 @@
+import math
+import time
+
+
+# 気候ごとの予報パターン
+# (基準気温, 1日の気温差, 降水確率の並び, 天気の並び(id, main, 説明, アイコン))
+CLIMATES = {
+    'tokyo_summer': (29.0, 7.0, (0.0, 0.1, 0.2, 0.4), (
+        (800, 'Clear', '晴天', '01d'),
+        (802, 'Clouds', '雲', '03d'),
+        (500, 'Rain', '小雨', '10d'),
+    )),
+    'tokyo_winter': (7.0, 8.0, (0.0, 0.0, 0.0, 0.1), (
+        (800, 'Clear', '晴天', '01d'),
+        (801, 'Clouds', '薄い雲', '02d'),
+    )),
+    'sapporo_snow': (-3.0, 5.0, (0.6, 0.8, 0.9, 0.7), (
+        (600, 'Snow', '小雪', '13d'),
+        (601, 'Snow', '雪', '13d'),
+        (602, 'Snow', '大雪', '13d'),
+    )),
+    'naha_rainy_season': (26.0, 4.0, (0.7, 0.9, 1.0, 0.8), (
+        (501, 'Rain', '適度な雨', '10d'),
+        (502, 'Rain', '強い雨', '10d'),
+        (211, 'Thunderstorm', '雷雨', '11d'),
+    )),
+    'osaka_autumn': (19.0, 9.0, (0.0, 0.1, 0.3, 0.5), (
+        (803, 'Clouds', '曇りがち', '04d'),
+        (804, 'Clouds', '厚い雲', '04d'),
+        (300, 'Drizzle', '霧雨', '09d'),
+    )),
+    'kushiro_fog': (14.0, 3.0, (0.2, 0.2, 0.3, 0.2), (
+        (741, 'Fog', '霧', '50d'),
+        (701, 'Mist', 'もや', '50d'),
+        (804, 'Clouds', '厚い雲', '04d'),
+    )),
+}
+
+# 特殊なケース
+EDGE_CASES = ('missing_pop', 'short_list', 'rollover_21h')
+
+
+def _entry(dt, temp, pop, condition):
+    condition_id, main, description, icon = condition
+    entry = {
+        'dt': dt,
+        'main': {'temp': round(temp, 2), 'feels_like': round(temp - 1.5, 2), 'humidity': 70},
+        'weather': [{'id': condition_id, 'main': main, 'description': description, 'icon': icon}],
+        'clouds': {'all': 40},
+        'wind': {'speed': 3.4, 'deg': 180, 'gust': 5.1},
+        'visibility': 10000,
+        'sys': {'pod': 'd'},
+        'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(dt)),
+    }
+    if pop is not None:
+        entry['pop'] = pop
+    return entry
+
+
+def true_temp(name, dt):
+    """
+    気候パターンの、ある時刻の気温(予報データを作るもとの値)
+    
+    Args:
+        name: CLIMATESのキー
+        dt: 時刻(UNIX時間)
+        
+    Returns:
+        float: 気温
+    """
+    base, amplitude, _, _ = CLIMATES[name]
+    # 日本時間の15時ごろに最高気温になる波
+    local_hour = (dt / 3600 + 9) % 24
+    return base + amplitude / 2 * math.cos((local_hour - 15) / 24 * 2 * math.pi)
+
+
+def climate_payload(name, start=None, count=40):
+    """
+    気候パターンから5日間/3時間予報のデータを作る
+    
+    Args:
+        name: CLIMATESのキー
+        start: 最初の予報時刻(UNIX時間、省略時は現在の3時間区切り)
+        count: 予報の件数
+        
+    Returns:
+        dict: OpenWeatherMapと同じ形の予報データ
+    """
+    if start is None:
+        start = int(time.time()) // 10800 * 10800
+    
+    _, _, pops, conditions = CLIMATES[name]
+    forecast_list = []
+    
+    for i in range(count):
+        dt = start + i * 10800
+        forecast_list.append(_entry(dt, true_temp(name, dt), pops[i % len(pops)], conditions[(i // 3) % len(conditions)]))
+    
+    return {
+        'cod': '200',
+        'message': 0,
+        'cnt': count,
+        'list': forecast_list,
+        'city': {'id': 0, 'name': name, 'country': 'JP', 'timezone': 32400},
+    }
+
+
+def hourly_payload(name, start=None, count=48):
+    """
+    気候パターンからOne Call API(1時間ごとの予報)と同じ形のデータを作る
+    
+    気温はclimate_payload()と同じ波なので、3時間予報と並べて比べられます。
+    
+    Args:
+        name: CLIMATESのキー
+        start: 最初の予報時刻(UNIX時間、省略時は現在の1時間区切り)
+        count: 予報の件数
+        
+    Returns:
+        dict: One Call APIと同じ形の予報データ
+    """
+    if start is None:
+        start = int(time.time()) // 3600 * 3600
+    
+    _, _, pops, conditions = CLIMATES[name]
+    hourly = []
+    
+    for i in range(count):
+        dt = start + i * 3600
+        temp = true_temp(name, dt)
+        condition_id, main, description, icon = conditions[(i // 9) % len(conditions)]
+        hourly.append({
+            'dt': dt,
+            'temp': round(temp, 2),
+            'feels_like': round(temp - 1.5, 2),
+            'humidity': 70,
+            'weather': [{'id': condition_id, 'main': main, 'description': description, 'icon': icon}],
+            'pop': pops[(i // 3) % len(pops)],
+        })
+    
+    return {'lat': 35.0, 'lon': 139.0, 'timezone': 'Asia/Tokyo', 'timezone_offset': 32400, 'hourly': hourly}
+
+
+def edge_case_payload(name, start=None):
+    """
+    特殊なケースの予報データを作る
+    
+    - missing_pop: 降水確率(pop)がない予報が混ざる
+    - short_list: 予報が3件しかない
+    - rollover_21h: 日本時間21時始まり(日付をまたぐ)
+    """
+    if start is None:
+        start = int(time.time()) // 10800 * 10800
+    
+    if name == 'missing_pop':
+        payload = climate_payload('osaka_autumn', start)
+        for entry in payload['list'][::2]:
+            entry.pop('pop', None)
+        return payload
+    
+    if name == 'short_list':
+        return climate_payload('tokyo_winter', start, count=3)
+    
+    if name == 'rollover_21h':
+        # 日本時間の21時(UTC 12時)にそろえる
+        day_start = start // 86400 * 86400
+        return climate_payload('tokyo_summer', day_start + 12 * 3600)
+    
+    raise KeyError(name)
+
+
+def all_payloads(start=None):
+    """
+    すべての気候パターンと特殊ケースを{名前: データ}で返す
+    """
+    payloads = {name: climate_payload(name, start) for name in CLIMATES}
+    for name in EDGE_CASES:
+        payloads[name] = edge_case_payload(name, start)
+    return payloads
@@ -0,0 +1,436 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+import config
+import timezones
+
+
+# 列ごとのファイル名と型(array/memoryviewの型コード)
+COLUMNS = (
+    ('dt', 'I'),         # 予報時刻(UNIX時間)
+    ('temp', 'h'),       # 気温(0.01℃単位)
+    ('pop', 'B'),        # 降水確率(0.01単位)
+    ('condition', 'H'),  # 天気ID(OpenWeatherMapのweather[0].id)
+)
+
+# 値がないときの印
+MISSING_TEMP = -32768
+MISSING_POP = 255
+MISSING_CONDITION = 0
+
+# 取得1回分の記録: 取得時刻, 緯度・経度(100万分の1度), 先頭の行, 行数
+SEGMENT = struct.Struct('<IiiIH2x')
+
+# 解説:
+# 予報1件を「行」として、項目ごとに別のファイル(列)に固定長で追記します
+# 例: 40件の予報 → dt.colに40×4バイト、temp.colに40×2バイト…
+# 固定長なので、N行目の位置は計算だけで分かり、mmapでそのまま読めます
+
+
+class Segment:
+    """
+    取得1回分の予報が、列ファイルのどの行にあるか
+    """
+    __slots__ = ('fetched_at', 'latitude', 'longitude', 'start', 'count')
+    
+    def __init__(self, fetched_at, latitude, longitude, start, count):
+        self.fetched_at = fetched_at
+        self.latitude = latitude
+        self.longitude = longitude
+        self.start = start
+        self.count = count
+    
+    @property
+    def location(self):
+        return (self.latitude, self.longitude)
+    
+    def date(self, tz=None):
+        """
+        取得した日(config.TIMEZONEの日付、YYYY-MM-DD)
+        """
+        tz = tz or timezones.get_zone()
+        return datetime.fromtimestamp(self.fetched_at, tz=tz).strftime('%Y-%m-%d')
+
+
+def _micro_degrees(value):
+    return int(round(value * 1000000))
+
+
+class _FileLock:
+    """
+    複数プロセスから同時に追記しないためのロック(batch.pyの子プロセス対策)
+    """
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def __enter__(self):
+        self.file = open(self.path, 'a+b')
+        if os.name == 'nt':
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+    
+    def __exit__(self, *exc):
+        if os.name == 'nt':
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+
+class ForecastArchive:
+    """
+    取得した予報を列ごとのファイルに追記して残すアーカイブ
+    
+    - 書き込みは追記だけ。最後に取得1回分の記録(segments.bin)を書くので、
+      途中で止まっても記録のない行は次の追記で上書きされる
+    - 読み込みはmmapで行い、地点・日付ごとの範囲をコピーせずに取り出せる
+    - 天気の種類・説明・アイコンは、天気IDごとにconditions.jsonに1回だけ保存する
+    """
+    
+    def __init__(self, directory=None):
+        self.directory = directory or config.ARCHIVE_DIR
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def _column_path(self, name):
+        return self._path(f"{name}.col")
+    
+    def load_conditions(self):
+        """
+        天気IDごとの(種類, 説明, アイコン)を読み込む
+        """
+        try:
+            with open(self._path('conditions.json'), encoding='utf-8') as f:
+                return {int(key): value for key, value in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+    
+    def _committed_rows(self):
+        """
+        segments.binに記録済みの行数(最後の取得の終わりの行)
+        """
+        try:
+            with open(self._path('segments.bin'), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell() - f.tell() % SEGMENT.size
+                if not size:
+                    return 0
+                f.seek(size - SEGMENT.size)
+                _, _, _, start, count = SEGMENT.unpack(f.read(SEGMENT.size))
+                return start + count
+        except OSError:
+            return 0
+    
+    def append(self, latitude, longitude, data, fetched_at=None):
+        """
+        取得した予報を追記する
+        
+        Args:
+            latitude: 緯度
+            longitude: 経度
+            data: get_weather_data()の戻り値
+            fetched_at: 取得時刻(UNIX時間、省略時は現在時刻)
+        
+        Returns:
+            int: 追記した行数
+        """
+        items = data.get('list', [])
+        if not items:
+            return 0
+        
+        fetched_at = int(time.time() if fetched_at is None else fetched_at)
+        values = {name: array(code) for name, code in COLUMNS}
+        new_conditions = {}
+        
+        for item in items:
+            temp = item.get('main', {}).get('temp')
+            pop = item.get('pop')
+            weather = (item.get('weather') or [{}])[0]
+            condition = weather.get('id', MISSING_CONDITION)
+            
+            values['dt'].append(item['dt'])
+            values['temp'].append(MISSING_TEMP if temp is None else int(round(temp * 100)))
+            values['pop'].append(MISSING_POP if pop is None else int(round(pop * 100)))
+            values['condition'].append(condition)
+            
+            if condition != MISSING_CONDITION:
+                new_conditions[condition] = [
+                    weather.get('main'), weather.get('description'), weather.get('icon')
+                ]
+        
+        with self.lock, _FileLock(self._path('lock')):
+            start = self._committed_rows()
+            
+            # 記録のない行(途中で止まった書き込み)を切り捨ててから追記する
+            for name, code in COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    f.truncate(start * values[name].itemsize)
+                    f.write(values[name].tobytes())
+            
+            conditions = self.load_conditions()
+            if any(conditions.get(key) != value for key, value in new_conditions.items()):
+                conditions.update(new_conditions)
+                tmp_path = self._path('conditions.json.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(conditions, f, ensure_ascii=False)
+                os.replace(tmp_path, self._path('conditions.json'))
+            
+            with open(self._path('segments.bin'), 'ab') as f:
+                f.write(SEGMENT.pack(
+                    fetched_at, _micro_degrees(latitude), _micro_degrees(longitude), start, len(items)
+                ))
+        
+        return len(items)
+    
+    def segments(self):
+        """
+        記録済みの取得をすべて返す
+        
+        Returns:
+            list: Segmentのリスト(古い順)
+        """
+        try:
+            with open(self._path('segments.bin'), 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return []
+        
+        raw = raw[:len(raw) - len(raw) % SEGMENT.size]
+        return [
+            Segment(fetched_at, lat / 1000000, lon / 1000000, start, count)
+            for fetched_at, lat, lon, start, count in SEGMENT.iter_unpack(raw)
+        ]
+    
+    def index(self):
+        """
+        地点・日付ごとの索引を作る
+        
+        Returns:
+            dict: {(緯度, 経度): {日付: [Segment, ...]}}
+        """
+        tz = timezones.get_zone()
+        index = {}
+        for segment in self.segments():
+            dates = index.setdefault(segment.location, {})
+            dates.setdefault(segment.date(tz), []).append(segment)
+        return index
+    
+    def find(self, latitude, longitude, date=None, index=None):
+        """
+        地点(と日付)の取得を探す
+        
+        Args:
+            latitude: 緯度
+            longitude: 経度
+            date: 日付(YYYY-MM-DD、省略時はすべての日)
+            index: index()の結果(何度も探すときに渡すと作り直さない)
+            
+        Returns:
+            list: Segmentのリスト(古い順)
+        """
+        index = self.index() if index is None else index
+        key = (_micro_degrees(latitude) / 1000000, _micro_degrees(longitude) / 1000000)
+        dates = index.get(key, {})
+        if date is not None:
+            return list(dates.get(date, []))
+        return [segment for day in sorted(dates) for segment in dates[day]]
+    
+    def reader(self):
+        """
+        列ファイルをmmapで開く(with文で使う)
+        """
+        return ArchiveReader(self)
+
+
+class ArchiveReader:
+    """
+    mmapした列ファイルから、取得1回分の予報をコピーせずに取り出す
+    
+    例:
+        with archive.reader() as reader:
+            for segment in archive.index()[(35.68, 139.65)]['2024-06-01']:
+                temps = reader.column(segment, 'temp')  # memoryview
+    """
+    
+    def __init__(self, archive):
+        self.archive = archive
+        self.maps = {}
+        self.views = {}
+        self.conditions = archive.load_conditions()
+        
+        for name, code in COLUMNS:
+            path = archive._column_path(name)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                self.views[name] = memoryview(array(code))
+                continue
+            with open(path, 'rb') as f:
+                self.maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.views[name] = memoryview(self.maps[name]).cast(code)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+        return False
+    
+    def close(self):
+        for view in self.views.values():
+            view.release()
+        for mapped in self.maps.values():
+            mapped.close()
+        self.views = {}
+        self.maps = {}
+    
+    def column(self, segment, name):
+        """
+        取得1回分の1列を返す(mmapの一部をそのまま参照するmemoryview)
+        """
+        return self.views[name][segment.start:segment.start + segment.count]
+    
+    def forecast(self, segment):
+        """
+        取得1回分を、get_weather_data()と同じ形の辞書に戻す
+        
+        Returns:
+            dict: parse_weather_data()に渡せる予報データ
+        """
+        columns = [self.column(segment, name) for name, _ in COLUMNS]
+        forecast_list = []
+        
+        for dt, temp, pop, condition in zip(*columns):
+            item = {'dt': dt}
+            if temp != MISSING_TEMP:
+                item['main'] = {'temp': temp / 100}
+            if pop != MISSING_POP:
+                item['pop'] = pop / 100
+            if condition != MISSING_CONDITION:
+                main, description, icon = self.conditions.get(condition, (None, None, None))
+                item['weather'] = [{'id': condition, 'main': main, 'description': description, 'icon': icon}]
+            forecast_list.append(item)
+        
+        for column in columns:
+            column.release()
+        
+        return {'cod': '200', 'cnt': len(forecast_list), 'list': forecast_list}
+        
+        # 解説:
+        # 気温・降水確率は0.01単位の整数で保存しているので、100で割ると
+        # APIの値(小数2桁まで)と同じ値に戻ります
+        # アイコンは天気IDごとに最後に保存したものです(昼/夜の違いは残りませんが、
+        # parse_weather_data()は昼のアイコンにそろえるので結果は同じです)
+
+
+_archive = None
+
+
+def get_archive():
+    """
+    共有のアーカイブを返す。config.ARCHIVE_DIRが空なら無効(None)
+    """
+    global _archive
+    
+    if not config.ARCHIVE_DIR:
+        return None
+    
+    if _archive is None:
+        _archive = ForecastArchive()
+    
+    return _archive
+
+
+def replay(archive, segment):
+    """
+    保存した予報を、取得した時刻の実行として解析し、Embedを作る(通信しない)
+    
+    Returns:
+        tuple: (DailySummary, Embed形式のメッセージ)、解析できなければ(None, None)
+    """
+    import contextlib
+    import io
+    import bot
+    import recommend
+    import weather
+    
+    with archive.reader() as reader:
+        data = reader.forecast(segment)
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = weather.parse_weather_data(data, now=segment.fetched_at)
+    if not summary:
+        return None, None
+    
+    clothing, items = recommend.recommend_for_summary(summary)
+    updated = datetime.fromtimestamp(segment.fetched_at, tz=timezones.get_zone()).strftime('%Y-%m-%d %H:%M')
+    location_name = f"{segment.latitude}, {segment.longitude}"
+    return summary, bot.create_embed_message(summary, clothing, items, location_name, updated=updated)
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='予報アーカイブの一覧表示と再生')
+    parser.add_argument('--dir', default=None, help='アーカイブのディレクトリ(省略時はARCHIVE_DIR)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    subparsers.add_parser('list', help='保存されている地点と日付を表示する')
+    
+    replay_parser = subparsers.add_parser('replay', help='保存した日の予報を解析してEmbedを表示する')
+    replay_parser.add_argument('--lat', type=float, required=True)
+    replay_parser.add_argument('--lon', type=float, required=True)
+    replay_parser.add_argument('--date', required=True, help='YYYY-MM-DD (TIMEZONEの日付)')
+    replay_parser.add_argument('--all', action='store_true', help='その日の取得をすべて再生する(省略時は最初の1回)')
+    
+    args = parser.parse_args()
+    directory = args.dir or config.ARCHIVE_DIR
+    if not directory or not os.path.isdir(directory):
+        print("❌ アーカイブがありません(ARCHIVE_DIRを設定して実行すると保存されます)")
+        sys.exit(1)
+    
+    archive = ForecastArchive(directory)
+    index = archive.index()
+    
+    if args.command == 'list':
+        for (latitude, longitude), dates in sorted(index.items()):
+            print(f"📍 {latitude}, {longitude}")
+            for date, segments in sorted(dates.items()):
+                rows = sum(segment.count for segment in segments)
+                print(f"   {date}: {len(segments)}回取得 ({rows}件)")
+        return
+    
+    segments = archive.find(args.lat, args.lon, args.date, index=index)
+    if not segments:
+        print(f"❌ {args.lat}, {args.lon} の {args.date} の予報は保存されていません")
+        sys.exit(1)
+    
+    for segment in segments if args.all else segments[:1]:
+        fetched = datetime.fromtimestamp(segment.fetched_at, tz=timezones.get_zone())
+        print(f"🕒 取得時刻: {fetched.strftime('%Y-%m-%d %H:%M:%S')} ({segment.count}件)")
+        summary, message = replay(archive, segment)
+        if not summary:
+            print("❌ 解析できませんでした")
+            continue
+        print(json.dumps(message, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
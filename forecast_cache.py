@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import config
+
+
+def cache_key(latitude, longitude, units, lang, source='forecast'):
+    """
+    キャッシュのキー(ファイル名)を作る
+    
+    Args:
+        latitude: 緯度
+        longitude: 経度
+        units: 単位系(metricなど)
+        lang: 言語(jaなど)
+        source: 予報の取得元(config.FORECAST_SOURCE)
+        
+    Returns:
+        str: キャッシュファイル名
+    """
+    raw = f"{latitude:.4f},{longitude:.4f},{units},{lang}"
+    
+    # 3時間予報のキーは今までと同じにして、保存済みのキャッシュをそのまま使う
+    if source != 'forecast':
+        raw += f",{source}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest() + '.json'
+
+
+def next_expiry(now=None, ttl=None):
+    """
+    有効期限を予報の更新間隔(3時間)の区切りに合わせて計算する
+    
+    Args:
+        now: 基準時刻(UNIX時間、省略時は現在時刻)
+        ttl: 更新間隔(秒、省略時はconfig.CACHE_TTL)
+        
+    Returns:
+        float: 有効期限(UNIX時間)
+    """
+    now = time.time() if now is None else now
+    ttl = ttl or config.CACHE_TTL
+    return (now // ttl + 1) * ttl
+    
+    # 解説:
+    # 例: ttl=3時間で1:30に取得 → 3:00まで有効
+    # 予報は3時間ごとに更新されるので、区切りまでは同じ内容です
+
+
+class ForecastCache:
+    """
+    予報データをディスクに保存するキャッシュ
+    
+    - 有効期限内ならAPIを呼ばずに保存済みのデータを返す
+    - ETag/Last-Modifiedを保存して条件付きリクエストに使う
+    - 件数がmax_entriesを超えたら、最後に使った時刻が古いものから消す
+    - 書き込みは一時ファイル→os.replace()で行うので、同時実行でも壊れない
+    """
+    
+    def __init__(self, directory=None, max_entries=None):
+        self.directory = directory or config.CACHE_DIR
+        self.max_entries = max_entries or config.CACHE_MAX_ENTRIES
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+    
+    def load(self, key):
+        """
+        キャッシュを読み込む(期限切れでも返す。判定は呼び出し側で行う)
+        
+        Returns:
+            dict: キャッシュエントリ、なければNone
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        # 最後に使った時刻を更新(LRU用)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        
+        return entry
+    
+    def store(self, key, data, etag=None, last_modified=None, expires_at=None):
+        """
+        キャッシュを書き込む
+        
+        Args:
+            key: cache_key()で作ったキー
+            data: 予報データ
+            etag: レスポンスのETagヘッダー
+            last_modified: レスポンスのLast-Modifiedヘッダー
+            expires_at: 有効期限(省略時はnext_expiry())
+        """
+        entry = {
+            'fetched_at': time.time(),
+            'expires_at': expires_at or next_expiry(),
+            'etag': etag,
+            'last_modified': last_modified,
+            'data': data,
+        }
+        
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        self.evict()
+    
+    def touch(self, key, expires_at=None):
+        """
+        304 Not Modifiedのとき、保存済みデータの有効期限だけ延ばす
+        """
+        entry = self.load(key)
+        if entry:
+            self.store(key, entry['data'], entry.get('etag'), entry.get('last_modified'), expires_at)
+    
+    def evict(self):
+        """
+        max_entriesを超えた分を、最後に使った時刻が古い順に削除する
+        """
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith('.json')]
+        except OSError:
+            return
+        
+        if len(names) <= self.max_entries:
+            return
+        
+        entries = []
+        for name in names:
+            path = self._path(name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def is_fresh(entry, now=None):
+    """
+    キャッシュエントリが有効期限内かどうか
+    """
+    now = time.time() if now is None else now
+    return entry is not None and now < entry['expires_at']
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    共有のキャッシュを返す。config.CACHE_DIRが空なら無効(None)
+    """
+    global _cache
+    
+    if not config.CACHE_DIR:
+        return None
+    
+    if _cache is None:
+        _cache = ForecastCache()
+    
+    return _cache
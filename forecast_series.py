@@ -0,0 +1,134 @@
+from bisect import bisect_left
+
+
+# 前後の予報の間隔が「予報の間隔」の何倍までなら補間してよいか
+MAX_GAP_STEPS = 2
+
+
+class ForecastSeries:
+    """
+    予報の時刻・気温・降水確率を、項目ごとのリストで持つ時系列
+    
+    3時間ごとの予報でも1時間ごとの予報でも同じように扱い、
+    任意の時刻の気温(前後の予報から線形補間)や、
+    任意の時間帯の最低・最高気温と降水確率の最大値を求めます。
+    """
+    __slots__ = ('dts', 'temps', 'pops', 'step')
+    
+    def __init__(self, dts, temps, pops):
+        """
+        Args:
+            dts: 予報の時刻(UNIX時間)のリスト(昇順)
+            temps: 気温のリスト
+            pops: 降水確率(0〜1)のリスト
+        """
+        self.dts = dts
+        self.temps = temps
+        self.pops = pops
+        
+        # 解説:
+        # 値はAPIから受け取った型(intやfloat)のまま持ちます
+        # (array('d')にするとintの気温が20.0のように表示が変わってしまう)
+        
+        # 予報の間隔(秒)。予報が1件以下なら0
+        count = len(self.dts)
+        self.step = (self.dts[-1] - self.dts[0]) // (count - 1) if count > 1 else 0
+    
+    @classmethod
+    def from_items(cls, items, start, end):
+        """
+        APIの予報のリストから、start以上end未満の予報で時系列を作る
+        
+        Args:
+            items: 予報1件分の辞書のリスト(時刻順)
+            start: 開始時刻(UNIX時間)
+            end: 終了時刻(UNIX時間、この時刻は含まない)
+        
+        Returns:
+            tuple: (ForecastSeries, 使った予報のリスト)
+        """
+        all_dts = [item['dt'] for item in items]
+        lo = bisect_left(all_dts, start)
+        hi = bisect_left(all_dts, end, lo)
+        selected = items[lo:hi]
+        
+        series = cls(
+            all_dts[lo:hi],
+            [item['main']['temp'] for item in selected],
+            [item.get('pop', 0) for item in selected],
+        )
+        return series, selected
+    
+    def __len__(self):
+        return len(self.dts)
+    
+    def span(self, start, end):
+        """
+        start以上end未満の予報の位置(配列の添字の範囲)を返す
+        
+        Returns:
+            tuple: (開始位置, 終了位置)
+        """
+        lo = bisect_left(self.dts, start)
+        return lo, bisect_left(self.dts, end, lo)
+    
+    def window(self, start, end):
+        """
+        start以上end未満の時間帯の気温と降水確率をまとめる
+        
+        Args:
+            start: 時間帯の開始(UNIX時間)
+            end: 時間帯の終了(UNIX時間、この時刻は含まない)
+        
+        Returns:
+            tuple: (最低気温, 最高気温, 降水確率の最大値)、予報がなければNone
+        """
+        lo, hi = self.span(start, end)
+        if lo == hi:
+            return None
+        
+        temps = self.temps[lo:hi]
+        return min(temps), max(temps), max(self.pops[lo:hi])
+        
+        # 解説:
+        # リストの切り出しとmin()/max()はC言語側で処理されるので、
+        # 1時間ごとの予報(24件)でも3時間ごと(8件)とほとんど時間が変わりません
+    
+    def at(self, times):
+        """
+        複数の時刻の気温をまとめて求める
+        
+        ちょうどその時刻の予報があればその値を、なければ前後の予報から線形補間します。
+        前後の予報がMAX_GAP_STEPS回分より離れている時刻や、予報の範囲外の時刻はNoneになります。
+        
+        Args:
+            times: 時刻(UNIX時間)のリスト
+        
+        Returns:
+            list: 各時刻の気温(求められなければNone)
+        """
+        dts = self.dts
+        temps = self.temps
+        count = len(dts)
+        max_gap = self.step * MAX_GAP_STEPS
+        values = []
+        
+        for t in times:
+            index = bisect_left(dts, t)
+            if index < count and dts[index] == t:
+                values.append(temps[index])
+            elif 0 < index < count and dts[index] - dts[index - 1] <= max_gap:
+                t0 = dts[index - 1]
+                v0 = temps[index - 1]
+                values.append(v0 + (temps[index] - v0) * (t - t0) / (dts[index] - t0))
+            else:
+                values.append(None)
+        
+        return values
+    
+    def first(self, start, end):
+        """
+        start以上end未満で最初の予報の気温を返す(なければNone)
+        """
+        lo, hi = self.span(start, end)
+        return self.temps[lo] if lo < hi else None
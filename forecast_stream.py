@@ -0,0 +1,272 @@
+import codecs
+import json
+import re
+from json.decoder import scanstring
+
+
+# parse_weather_data()が使う項目だけを残す
+WEATHER_FIELDS = ('id', 'main', 'description', 'icon')
+CITY_FIELDS = ('name', 'timezone')
+TOP_LEVEL_FIELDS = ('cod', 'cnt', 'message', 'timezone', 'timezone_offset')
+
+# 予報のリストが入っている項目(5日間/3時間予報は'list'、One Call APIは'hourly')
+LIST_FIELDS = ('list', 'hourly')
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+# 数値の続きになりうる文字('1.'のあとに'5'が来るなど)
+_NUMBER_CHARS = '0123456789.eE+-'
+
+# 予報1件の先頭の"dt"と、次の予報の始まり(APIの予報は、どれもdtが最初の項目)
+# 文字列の中の"は必ず\"になるので、'}, {"dt":'が文字列の中に現れることはありません
+_LEADING_DT = re.compile(r'\{\s*"dt"\s*:\s*(-?\d+)\s*[,}]')
+_NEXT_ITEM = re.compile(r'\}\s*,\s*\{\s*"dt"\s*:\s*(-?\d+)\s*[,}]')
+
+# 予報1件を読み飛ばすときに、先読みしてよい長さ(文字数)
+SKIP_LOOKAHEAD = 65536
+
+
+def project_item(item):
+    """
+    予報1件から必要な項目(dt, main.temp, pop, weather[0])だけを取り出す
+    
+    One Call APIの予報(気温がtemp)も、5日間/3時間予報と同じ形(main.temp)にそろえます
+    
+    Args:
+        item: APIの予報1件分の辞書
+        
+    Returns:
+        dict: 同じ形で項目を絞った辞書
+    """
+    record = {}
+    
+    if 'dt' in item:
+        record['dt'] = item['dt']
+    
+    main = item.get('main')
+    if isinstance(main, dict) and 'temp' in main:
+        record['main'] = {'temp': main['temp']}
+    elif isinstance(item.get('temp'), (int, float)):
+        # One Call APIの1時間ごとの予報は、気温がmainの外にある
+        record['main'] = {'temp': item['temp']}
+    
+    if 'pop' in item:
+        record['pop'] = item['pop']
+    
+    weather_list = item.get('weather')
+    if weather_list:
+        weather = weather_list[0]
+        record['weather'] = [{key: weather[key] for key in WEATHER_FIELDS if key in weather}]
+    
+    # 解説:
+    # 欠けている項目はそのまま欠けたままにします
+    # (parse_weather_data()側で今まで通りエラーとして扱われる)
+    
+    return record
+
+
+class _ChunkReader:
+    """
+    バイト列のチャンクを少しずつ文字列にしながら読むための小さなバッファ
+    """
+    
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+    
+    def fill(self):
+        """
+        次のチャンクを読み足す。もう無ければFalse
+        """
+        if self.eof:
+            return False
+        
+        # 読み終わった部分は捨ててメモリを節約する
+        if self.pos > 65536:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += self.utf8.decode(chunk)
+                return True
+        
+        self.buffer += self.utf8.decode(b'', final=True)
+        self.eof = True
+        return False
+    
+    def peek(self):
+        """
+        空白を飛ばして次の1文字を返す(読み進めない)
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('予報データが途中で終わっています')
+    
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"予報データの形式が不正です('{char}'がありません)")
+        self.pos += 1
+    
+    def read_value(self):
+        """
+        JSONの値を1つ読む(値が途中で切れていたらチャンクを読み足す)
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            
+            # 数値などはチャンクの境目で切れている可能性があるので、
+            # 後ろに数値の続きではない文字が続いていることを確認する
+            if (end < len(self.buffer) and self.buffer[end] not in _NUMBER_CHARS) or self.eof or not self.fill():
+                self.pos = end
+                return value
+    
+    def leading_dt(self):
+        """
+        次の値が"dt"で始まるオブジェクトなら、読み進めずにdtの値を返す(そうでなければNone)
+        """
+        self.peek()
+        while True:
+            match = _LEADING_DT.match(self.buffer, self.pos)
+            if match is not None:
+                return int(match.group(1))
+            # 数値がチャンクの境目で切れているかもしれないので、少しだけ読み足して確かめる
+            if len(self.buffer) - self.pos >= 64 or not self.fill():
+                return None
+    
+    def skip_items(self, keep):
+        """
+        今の予報と、それに続くkeep(dt)がFalseの予報を、辞書を組み立てずに読み飛ばす
+        
+        Returns:
+            bool: 今の予報を読み飛ばせたらTrue(残すべき予報の手前の','で止まる)。
+                  次の予報が見つからない(最後の1件など)ときは読み進めずにFalse
+        """
+        skipped = False
+        resume = None
+        while True:
+            match = _NEXT_ITEM.search(self.buffer, self.pos)
+            if match is None:
+                # 読み飛ばしている途中の予報の手前(前の予報の'}'の後ろ)に戻ってから読み足す
+                if resume is not None:
+                    self.pos, resume = resume, None
+                if len(self.buffer) - self.pos < SKIP_LOOKAHEAD and self.fill():
+                    continue
+                return skipped
+            
+            # 次の予報の前の','の手前(この予報の'}'の後ろ)まで進める
+            self.pos = match.start() + 1
+            skipped = True
+            if keep(int(match.group(1))):
+                return True
+            
+            # 次の予報も対象期間外なので、その中から続けて探す
+            resume = self.pos
+            self.pos = match.start(1)
+    
+    def read_key(self):
+        self.expect('"')
+        while True:
+            try:
+                key, end = scanstring(self.buffer, self.pos)
+                break
+            except ValueError:
+                if not self.fill():
+                    raise
+        self.pos = end
+        self.expect(':')
+        return key
+
+
+def decode_forecast(chunks, min_dt=None, max_dt=None):
+    """
+    予報APIのレスポンス本文をチャンクごとに読みながら、必要な項目だけを取り出す
+    
+    response.json()のように全体を一度に組み立てず、
+    'list'の要素を1件ずつ読んでproject_item()で絞り込みます。
+    先頭のdtで対象期間外と分かる要素は、辞書を組み立てずに次の要素まで読み飛ばします。
+    One Call APIの'hourly'も同じように読み、'list'として返します。
+    
+    Args:
+        chunks: レスポンス本文のバイト列チャンク(response.iter_content()など)
+        min_dt: この時刻(UNIX時間)より前の予報は捨てる
+        max_dt: この時刻(UNIX時間)以降の予報は捨てる
+        
+    Returns:
+        dict: {'list': [...], 'city': {...}, ...}の形の予報データ
+    """
+    reader = _ChunkReader(chunks)
+    data = {}
+    
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return data
+    
+    while True:
+        key = reader.read_key()
+        
+        if key in LIST_FIELDS:
+            data['list'] = _read_forecast_list(reader, min_dt, max_dt)
+        else:
+            value = reader.read_value()
+            if key == 'city' and isinstance(value, dict):
+                data['city'] = {k: value[k] for k in CITY_FIELDS if k in value}
+            elif key in TOP_LEVEL_FIELDS:
+                data[key] = value
+        
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        break
+    
+    # 残り(末尾の改行など)を読み切って、接続を再利用できるようにする
+    for _ in reader.chunks:
+        pass
+    
+    return data
+
+
+def _read_forecast_list(reader, min_dt, max_dt):
+    forecast_list = []
+    
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return forecast_list
+    
+    def in_window(dt):
+        return (min_dt is None or dt >= min_dt) and (max_dt is None or dt < max_dt)
+    
+    windowed = min_dt is not None or max_dt is not None
+    while True:
+        # 先頭のdtで対象期間外と分かる予報は、辞書を組み立てずに読み飛ばす
+        dt = reader.leading_dt() if windowed else None
+        if dt is None or in_window(dt) or not reader.skip_items(in_window):
+            item = reader.read_value()
+            dt = item.get('dt') if isinstance(item, dict) else None
+            
+            # 対象期間外の予報は残さない
+            if dt is None or in_window(dt):
+                forecast_list.append(project_item(item) if isinstance(item, dict) else item)
+        
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect(']')
+        return forecast_list
@@ -0,0 +1,359 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+import config
+import bot
+import locations
+import metrics
+import weather
+
+
+# /weatherコマンドの定義(Discordに登録する形式)
+WEATHER_COMMAND = {
+    'name': 'weather',
+    'description': '今日の天気予報と服装・持ち物のおすすめを表示します',
+    'options': [
+        {'type': 3, 'name': 'city', 'description': '地名(例: 東京、札幌、London)', 'required': True},
+    ],
+}
+
+# Discordのインタラクションの種類と応答の種類
+APPLICATION_COMMAND = 2
+CHANNEL_MESSAGE_WITH_SOURCE = 4
+EPHEMERAL = 1 << 6
+
+# 先読みで取り直す予報がないか確かめる間隔(秒)
+REFRESH_INTERVAL = 5
+
+# Discordは3秒以内に応答しないとエラーになるので、それまでに予報が揃わなければ「考え中」にする
+DEFER_AFTER = 2.5
+
+
+class LRUCache:
+    """
+    最近使った順に最大capacity件まで持つキャッシュ(asyncioの1スレッドから使う)
+    """
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+    
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+    
+    def items(self):
+        return list(self.entries.items())
+    
+    def __contains__(self, key):
+        return key in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+
+
+class CachedForecast:
+    """
+    メモリキャッシュに入れる1セル分の解析済みの予報
+    """
+    __slots__ = ('result', 'updated', 'refresh_at', 'expires_at', 'embeds')
+    
+    def __init__(self, result, updated, ttl, refresh_ahead):
+        """
+        Args:
+            result: bot.analyze_cell()の結果 (DailySummary, 服装の推奨, 持ち物の推奨)
+            updated: フッターの更新時刻の文字列
+            ttl: 有効期間(秒)
+            refresh_ahead: 有効期間のうち、この割合が過ぎたら裏で取り直す
+        """
+        now = time.time()
+        self.result = result
+        self.updated = updated
+        self.refresh_at = now + ttl * refresh_ahead
+        self.expires_at = now + ttl
+        # 地名 → 作成済みのEmbed
+        self.embeds = {}
+    
+    def embed(self, name):
+        """
+        この予報の地名nameのEmbed(メッセージの"embeds"の1件分)を返す(一度作ったものは使い回す)
+        """
+        embed = self.embeds.get(name)
+        if embed is None:
+            embed = self.embeds[name] = bot.create_embed_message(*self.result, name, self.updated)['embeds'][0]
+        return embed
+
+
+class WeatherService:
+    """
+    /weatherコマンドに、メモリに持っている解析済みの予報で答える
+    
+    - よく使われる地点の予報はLRUキャッシュから返す(通信なし)
+    - キャッシュにない地点は別スレッドで取得・解析し、同じ地点への同時の問い合わせは1回にまとめる
+    - 期限切れが近い予報は、問い合わせを待たせないように裏で取り直す
+    """
+    
+    def __init__(self, location_list=None, capacity=None, ttl=None, refresh_ahead=None):
+        """
+        Args:
+            location_list: 名前で引ける地点のリスト(省略時は地点ファイル/config.pyの地点)
+            capacity: キャッシュする地点(セル)の数(省略時はconfig.GATEWAY_CACHE_SIZE)
+            ttl: 予報の有効期間(秒、省略時はconfig.GATEWAY_CACHE_TTL)
+            refresh_ahead: 裏で取り直し始める割合(省略時はconfig.GATEWAY_REFRESH_AHEAD)
+        """
+        if location_list is None:
+            location_list = locations.load_locations()
+        capacity = capacity or config.GATEWAY_CACHE_SIZE
+        
+        self.ttl = config.GATEWAY_CACHE_TTL if ttl is None else ttl
+        self.refresh_ahead = config.GATEWAY_REFRESH_AHEAD if refresh_ahead is None else refresh_ahead
+        self.forecasts = LRUCache(capacity)
+        # 地名(小文字) → 地点(見つからなかった地名はNone)
+        self.places = LRUCache(capacity)
+        self.known = {
+            location['name'].casefold(): location
+            for location in location_list if not location.get('subscriber')
+        }
+        self.inflight = {}
+        self.executor = None
+        self.refresher = None
+    
+    def _run(self, func, *args):
+        """
+        通信や解析(同期処理)を別スレッドで実行する
+        """
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    def _coalesce(self, key, factory):
+        """
+        同じkeyの処理が実行中ならそのタスクを、なければfactory()を始めたタスクを返す
+        """
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return task
+    
+    async def resolve(self, city):
+        """
+        地名から地点を探す(地点ファイルの名前 → Geocoding APIの順)
+        
+        Returns:
+            dict: 地点情報、見つからなければNone
+        """
+        name = city.strip().casefold()
+        if not name:
+            return None
+        
+        location = self.known.get(name)
+        if location is not None:
+            return location
+        if name in self.places:
+            return self.places.get(name)
+        
+        async def lookup():
+            place = await self._run(weather.geocode, city.strip())
+            if place is None:
+                self.places.put(name, place)
+                return place
+            
+            # タイムゾーンは予報データで分かるので、予報を先に取得してそのままキャッシュに入れる
+            latitude = locations.snap_coordinate(place['latitude'])
+            longitude = locations.snap_coordinate(place['longitude'])
+            data = await self._run(weather.get_weather_data, latitude, longitude)
+            zone = weather.forecast_timezone(data)
+            if zone is None:
+                # 分からなければTIMEZONEで数え、そのことをEmbedに書く(次の問い合わせで調べ直す)
+                place['timezone'] = config.TIMEZONE
+                place['timezone_unknown'] = True
+                return place
+            
+            place['timezone'] = zone
+            key = (latitude, longitude, zone)
+            if key not in self.forecasts:
+                await self._coalesce(key, lambda: self._fetch(key, data))
+            self.places.put(name, place)
+            return place
+        
+        # 待っている側が取り消されても、検索そのものは止めない
+        return await asyncio.shield(self._coalesce(('geocode', name), lookup))
+    
+    async def forecast(self, location):
+        """
+        地点の解析済みの予報を返す(キャッシュになければ取得する)
+        
+        Returns:
+            CachedForecast: 予報、取得できなければNone
+        """
+        key = (
+            locations.snap_coordinate(location['latitude']),
+            locations.snap_coordinate(location['longitude']),
+            location.get('timezone') or config.TIMEZONE,
+        )
+        
+        entry = self.forecasts.get(key)
+        if entry is not None and time.time() < entry.expires_at:
+            metrics.increment('gateway_cache_total', result='hit')
+            if time.time() >= entry.refresh_at:
+                self.refresh(key)
+            return entry
+        
+        metrics.increment('gateway_cache_total', result='miss' if entry is None else 'expired')
+        return await asyncio.shield(self._coalesce(key, lambda: self._fetch(key)))
+    
+    async def _fetch(self, key, raw_data=None):
+        """
+        セル1つ分の予報を別スレッドで取得・解析してキャッシュに入れる(raw_dataがあれば解析だけ)
+        """
+        try:
+            result = await self._run(bot.analyze_cell, *key, raw_data)
+        except Exception as e:
+            print(f"❌ 天気予報の取得・解析に失敗しました: {e}")
+            result = None
+        
+        if not result:
+            # 取得に失敗したら、前の予報があれば(期限切れでも)それで答える
+            return self.forecasts.get(key)
+        
+        entry = CachedForecast(result, bot.updated_text(key[2]), self.ttl, self.refresh_ahead)
+        self.forecasts.put(key, entry)
+        return entry
+    
+    def refresh(self, key):
+        """
+        予報を裏で取り直す(すでに取得中なら何もしない)
+        """
+        if key not in self.inflight:
+            metrics.increment('gateway_refresh_total')
+            self._coalesce(key, lambda: self._fetch(key))
+    
+    async def refresh_loop(self):
+        """
+        期限切れが近い予報を定期的に取り直し続ける
+        """
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            now = time.time()
+            for key, entry in self.forecasts.items():
+                if now >= entry.refresh_at:
+                    self.refresh(key)
+        
+        # 解説:
+        # しばらく問い合わせのない地点も期限切れになる前に取り直すので、
+        # キャッシュに入っている地点はいつでも通信なしで答えられます
+    
+    async def start(self):
+        """
+        地点ファイルの地点を先に読み込み、取り直しのループを始める
+        """
+        await asyncio.gather(*(self.forecast(location) for location in self.known.values()))
+        self.refresher = asyncio.ensure_future(self.refresh_loop())
+    
+    async def respond(self, city):
+        """
+        /weather cityへの返信の内容を作る
+        
+        Returns:
+            dict: Discordのメッセージ({"embeds": [...]}、エラーなら{"content": ..., "flags": EPHEMERAL})
+        """
+        location = await self.resolve(city)
+        if location is None:
+            return {'content': f"「{city}」が見つかりませんでした。", 'flags': EPHEMERAL}
+        
+        entry = await self.forecast(location)
+        if entry is None:
+            return {'content': "天気予報を取得できませんでした。しばらくしてからもう一度お試しください。", 'flags': EPHEMERAL}
+        
+        embed = entry.embed(location['name'])
+        if location.get('timezone_unknown'):
+            embed = dict(embed, footer={'text': f"{embed['footer']['text']} (時刻は{location['timezone']})"})
+        return {'embeds': [embed]}
+    
+    async def handle_interaction(self, interaction):
+        """
+        Discordのインタラクション(JSON)に対する応答(JSON)を返す
+        
+        Args:
+            interaction: Discordから届いたインタラクションの辞書
+        
+        Returns:
+            dict: インタラクションへの応答の辞書
+        """
+        data = interaction.get('data') or {}
+        if interaction.get('type') != APPLICATION_COMMAND or data.get('name') != WEATHER_COMMAND['name']:
+            return {'type': CHANNEL_MESSAGE_WITH_SOURCE, 'data': {'content': "対応していないコマンドです。", 'flags': EPHEMERAL}}
+        
+        options = {option['name']: option.get('value') for option in data.get('options', [])}
+        
+        start = time.perf_counter()
+        message = await self.respond(str(options.get('city') or ''))
+        metrics.observe('gateway_response_seconds', time.perf_counter() - start)
+        
+        return {'type': CHANNEL_MESSAGE_WITH_SOURCE, 'data': message}
+
+
+def run_gateway(service=None):
+    """
+    Discordのゲートウェイにつないで、/weatherコマンドに答え続ける
+    
+    Args:
+        service: WeatherService(省略時は地点ファイル/config.pyの地点で作る)
+    """
+    try:
+        import discord
+        from discord import app_commands
+    except ImportError:
+        print("❌ ゲートウェイモードにはdiscord.pyが必要です (pip install discord.py)")
+        sys.exit(1)
+    
+    if not config.DISCORD_BOT_TOKEN:
+        print("❌ DISCORD_BOT_TOKENを設定してください")
+        sys.exit(1)
+    
+    service = service or WeatherService()
+    client = discord.Client(intents=discord.Intents.none())
+    tree = app_commands.CommandTree(client)
+    
+    @tree.command(name=WEATHER_COMMAND['name'], description=WEATHER_COMMAND['description'])
+    @app_commands.describe(city=WEATHER_COMMAND['options'][0]['description'])
+    async def weather_command(interaction, city: str):
+        reply = asyncio.ensure_future(service.respond(city))
+        try:
+            message = await asyncio.wait_for(asyncio.shield(reply), DEFER_AFTER)
+            send = interaction.response.send_message
+        except asyncio.TimeoutError:
+            # 取得に時間がかかっているので「考え中」を出してから、あとで返信する
+            await interaction.response.defer(thinking=True)
+            message = await reply
+            send = interaction.followup.send
+        
+        kwargs = {'ephemeral': bool(message.get('flags', 0) & EPHEMERAL)}
+        if message.get('content'):
+            kwargs['content'] = message['content']
+        if message.get('embeds'):
+            kwargs['embeds'] = [discord.Embed.from_dict(embed) for embed in message['embeds']]
+        await send(**kwargs)
+    
+    async def setup_hook():
+        await tree.sync()
+        await service.start()
+        print(f"🤖 /{WEATHER_COMMAND['name']} コマンドの受け付けを始めました (地点ファイルの{len(service.known)}地点を読み込み済み)")
+    
+    client.setup_hook = setup_hook
+    client.run(config.DISCORD_BOT_TOKEN)
+    
+    # 解説:
+    # discord.pyは起動を遅くしないように、ゲートウェイモードのときだけ読み込みます
+    # 返信の内容はWeatherServiceが作るので、fake_gateway.pyで本物のDiscordなしに試せます
@@ -0,0 +1,107 @@
+import threading
+import config
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size=None):
+    """
+    接続プール付きのrequests.Sessionを作成する
+    
+    Args:
+        pool_size: ホストごとに保持する接続数(省略時はconfig.HTTP_POOL_SIZE)
+        
+    Returns:
+        requests.Session: 設定済みのセッション
+    """
+    # requestsは読み込みに時間がかかるので、実際に通信するときに読み込む
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    pool_size = pool_size or config.HTTP_POOL_SIZE
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    
+    # 解説:
+    # Sessionを使い回すと、同じホストへのTCP/TLS接続が再利用されます
+    # (毎回ハンドシェイクしなくてよくなる)
+    # pool_maxsizeは同じホストに同時に張れる接続の数です
+    
+    return session
+
+
+def __getattr__(name):
+    """
+    http_client.RequestExceptionを参照したときだけrequestsを読み込む
+    
+    except節の式は例外が起きたときにだけ評価されるので、
+    except http_client.RequestException: と書いても起動は遅くなりません
+    """
+    if name == 'RequestException':
+        import requests
+        return requests.exceptions.RequestException
+    raise AttributeError(f"module 'http_client' has no attribute '{name}'")
+
+
+def get_session():
+    """
+    プロセス全体で共有するセッションを返す(初回呼び出し時に作成)
+    
+    Returns:
+        requests.Session: 共有セッション
+    """
+    global _session
+    
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    
+    return _session
+
+
+def close_session():
+    """
+    共有セッションを閉じる(プールしている接続も切断される)
+    """
+    global _session
+    
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_timeout():
+    """
+    (接続タイムアウト, 読み込みタイムアウト)のタプルを返す
+    
+    Returns:
+        tuple: requestsのtimeout引数にそのまま渡せる値
+    """
+    return (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+
+
+def get(url, **kwargs):
+    """
+    共有セッションでGETリクエストを送る
+    """
+    kwargs.setdefault('timeout', get_timeout())
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """
+    共有セッションでPOSTリクエストを送る
+    """
+    kwargs.setdefault('timeout', get_timeout())
+    return get_session().post(url, **kwargs)
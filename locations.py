@@ -0,0 +1,143 @@
+import json
+import config
+import timezones
+
+
+def default_location():
+    """
+    config.pyの設定から単一地点の情報を作る
+
+    Returns:
+        dict: 地点情報(name, latitude, longitude, webhook_url, timezone)
+    """
+    return {
+        'name': config.LOCATION_NAME,
+        'latitude': config.LATITUDE,
+        'longitude': config.LONGITUDE,
+        'webhook_url': config.DISCORD_WEBHOOK_URL,
+        'timezone': config.TIMEZONE,
+    }
+
+
+def snap_coordinate(value, grid=None):
+    """
+    緯度・経度をグリッドの格子点にそろえる
+    
+    Args:
+        value: 緯度または経度
+        grid: グリッドの間隔(度、省略時はconfig.GRID_SIZE。0ならそのまま)
+        
+    Returns:
+        float: そろえた値
+    """
+    grid = config.GRID_SIZE if grid is None else grid
+    if not grid:
+        return value
+    return round(round(value / grid) * grid, 6)
+    
+    # 解説:
+    # 例: grid=0.1 → 35.6762は35.7、35.6499は35.6になります
+    # 天気予報の解像度は粗いので、近くの地点は同じ予報を使い回せます
+
+
+def group_by_cell(location_list, grid=None):
+    """
+    地点をグリッドのセルごとにまとめる
+    
+    「今日」や朝・昼・夜の時刻はタイムゾーンで変わるので、
+    同じ格子点でもタイムゾーンが違う地点は別のセルにします(予報の取得は共有されます)。
+    
+    Args:
+        location_list: 地点情報の辞書のリスト
+        grid: グリッドの間隔(度、省略時はconfig.GRID_SIZE)
+        
+    Returns:
+        dict: {(緯度, 経度, タイムゾーン名): [地点, ...]} 同じセルの地点は1回の取得で済む
+    """
+    cells = {}
+    for location in location_list:
+        cell = (
+            snap_coordinate(location['latitude'], grid),
+            snap_coordinate(location['longitude'], grid),
+            location.get('timezone') or config.TIMEZONE,
+        )
+        cells.setdefault(cell, []).append(location)
+    return cells
+
+
+def location_key(location):
+    """
+    地点を見分けるための文字列(名前と緯度経度。購読者なら先頭に購読者のID)
+    """
+    key = f"{location['name']}@{location['latitude']},{location['longitude']}"
+    if location.get('subscriber'):
+        return f"{location['subscriber']}:{key}"
+    return key
+
+
+def load_locations(path=None):
+    """
+    地点ファイル(JSON)を読み込んで地点情報のリストを返す
+
+    ファイルの形式:
+        [
+            {"name": "東京", "latitude": 35.6762, "longitude": 139.6503,
+             "webhook_url": "https://discord.com/api/webhooks/..."},
+            {"name": "London", "latitude": 51.5072, "longitude": -0.1276,
+             "timezone": "Europe/London"},
+            ...
+        ]
+
+    Args:
+        path: 地点ファイルのパス(省略時はconfig.LOCATIONS_FILE)
+
+    Returns:
+        list: 地点情報の辞書のリスト。ファイル未指定時は単一地点のみ
+              (config.SUBSCRIBERS_FILEがあれば購読者ごとの投稿先も含む)
+    """
+    path = path or config.LOCATIONS_FILE
+
+    if not path:
+        return with_subscribers([default_location()])
+
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+
+    locations = []
+    for entry in entries:
+        location = {
+            'name': entry['name'],
+            'latitude': float(entry['latitude']),
+            'longitude': float(entry['longitude']),
+            # webhook_urlがなければ既定のWebhookに送る
+            'webhook_url': entry.get('webhook_url') or config.DISCORD_WEBHOOK_URL,
+            # 日付・時間帯・投稿時刻のタイムゾーン(なければconfig.TIMEZONE)
+            'timezone': entry.get('timezone') or config.TIMEZONE,
+        }
+
+        # タイムゾーン名の間違いは読み込み時に知らせる
+        timezones.get_zone(location['timezone'])
+
+        # 常駐モードでの投稿時刻(例: ["7:00", "18:00"])
+        if entry.get('schedules'):
+            location['schedules'] = list(entry['schedules'])
+        locations.append(location)
+
+    # 解説:
+    # float()で緯度経度を数値にそろえておきます
+    # webhook_urlを省略した地点は.envのWebhookに投稿されます
+    # timezoneには'Europe/London'のようなIANAのタイムゾーン名を書きます
+
+    return with_subscribers(locations)
+
+
+def with_subscribers(location_list):
+    """
+    config.SUBSCRIBERS_FILEが設定されていれば、購読者ごとの投稿先を地点のリストに加える
+    """
+    if not config.SUBSCRIBERS_FILE:
+        return location_list
+
+    import profiles
+
+    return location_list + profiles.load_subscribers(location_list)
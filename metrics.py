@@ -0,0 +1,255 @@
+import functools
+import json
+import sys
+import threading
+import time
+import config
+
+
+# ヒストグラムの区切り(秒)
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def enabled():
+    """
+    計測が有効かどうか(config.METRICS_ENABLED)
+    """
+    return config.METRICS_ENABLED
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def increment(name, value=1, **labels):
+    """
+    カウンターを増やす(キャッシュヒット数、補完が使われた回数など)
+    
+    Args:
+        name: メトリクス名
+        value: 増やす量
+        **labels: ラベル(例: slot='morning')
+    """
+    if not config.METRICS_ENABLED:
+        return
+    
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """
+    ヒストグラムに1件記録する(処理時間、API応答時間など)
+    
+    Args:
+        name: メトリクス名
+        seconds: 記録する値(秒)
+        **labels: ラベル(例: stage='parse')
+    """
+    if not config.METRICS_ENABLED:
+        return
+    
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                'buckets': [0] * len(HISTOGRAM_BUCKETS),
+                'count': 0,
+                'sum': 0.0,
+            }
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+    
+    def __init__(self, stage):
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        observe('stage_duration_seconds', time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage):
+    """
+    with文で囲んだ処理の時間をstage_duration_secondsに記録する
+    
+    例:
+        with metrics.timer('fetch'):
+            ...
+    """
+    if not config.METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(stage)
+
+
+def timed(stage):
+    """
+    関数の実行時間をstage_duration_secondsに記録するデコレーター
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.METRICS_ENABLED:
+                return func(*args, **kwargs)
+            with _Timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    """
+    記録した値をすべて消す
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def drain():
+    """
+    記録した値を取り出して消す(別プロセスから親プロセスに渡す用)
+    
+    Returns:
+        tuple: (カウンター, ヒストグラム)の辞書
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = dict(_histograms)
+        _counters.clear()
+        _histograms.clear()
+    return counters, histograms
+
+
+def merge(data):
+    """
+    drain()で取り出した値を足し合わせる
+    
+    Args:
+        data: drain()の戻り値
+    """
+    counters, histograms = data
+    with _lock:
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, other in histograms.items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = {
+                    'buckets': [0] * len(HISTOGRAM_BUCKETS),
+                    'count': 0,
+                    'sum': 0.0,
+                }
+            histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+            histogram['count'] += other['count']
+            histogram['sum'] += other['sum']
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def render_prometheus():
+    """
+    Prometheusのテキスト形式で出力する
+    
+    Returns:
+        str: Prometheusのテキスト形式
+    """
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"weather_bot_{name}{_format_labels(labels)} {value}")
+        
+        for (name, labels), histogram in sorted(_histograms.items()):
+            for bound, count in zip(HISTOGRAM_BUCKETS, histogram['buckets']):
+                lines.append(f"weather_bot_{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"weather_bot_{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"weather_bot_{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"weather_bot_{name}_count{_format_labels(labels)} {histogram['count']}")
+    
+    return '\n'.join(lines) + '\n'
+
+
+def render_json_lines():
+    """
+    1メトリクス1行のJSON形式で出力する
+    
+    Returns:
+        str: JSON Lines形式
+    """
+    timestamp = time.time()
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(json.dumps({
+                'time': timestamp, 'type': 'counter', 'name': name,
+                'labels': dict(labels), 'value': value,
+            }, ensure_ascii=False))
+        
+        for (name, labels), histogram in sorted(_histograms.items()):
+            lines.append(json.dumps({
+                'time': timestamp, 'type': 'histogram', 'name': name,
+                'labels': dict(labels), 'count': histogram['count'], 'sum': histogram['sum'],
+                'buckets': dict(zip(map(str, HISTOGRAM_BUCKETS), histogram['buckets'])),
+            }, ensure_ascii=False))
+    
+    return '\n'.join(lines) + '\n'
+
+
+def export():
+    """
+    記録した値をconfig.METRICS_FORMATの形式でconfig.METRICS_FILEに書き出す
+    (METRICS_FILEが空なら標準出力)
+    """
+    if not config.METRICS_ENABLED:
+        return
+    
+    if config.METRICS_FORMAT == 'json':
+        text = render_json_lines()
+        mode = 'a'
+    else:
+        text = render_prometheus()
+        mode = 'w'
+    
+    # 解説:
+    # JSON Linesは実行ごとに追記、Prometheus形式は最新の値で上書きします
+    # (node_exporterのtextfile collectorなどで読み込めます)
+    
+    if config.METRICS_FILE:
+        with open(config.METRICS_FILE, mode, encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
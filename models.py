@@ -0,0 +1,87 @@
+class ForecastPoint:
+    """
+    3時間ごとの予報1件分
+    
+    APIの入れ子の辞書(item['main']['temp']など)を解析時に1回だけ読み、
+    必要な値だけを__slots__付きの属性として持ちます。
+    """
+    __slots__ = ('dt', 'hour', 'temp', 'pop', 'weather_main', 'description', 'icon')
+    
+    def __init__(self, dt, hour, temp, pop, weather_main, description, icon):
+        self.dt = dt
+        self.hour = hour
+        self.temp = temp
+        self.pop = pop
+        self.weather_main = weather_main
+        self.description = description
+        self.icon = icon
+    
+    @classmethod
+    def from_item(cls, item, hour):
+        """
+        APIの予報1件分の辞書から作る
+        
+        Args:
+            item: APIの予報1件分の辞書
+            hour: 現地時刻の「時」
+            
+        Returns:
+            ForecastPoint: 予報1件分
+        """
+        weather = item['weather'][0]
+        return cls(
+            item['dt'],
+            hour,
+            item['main']['temp'],
+            item.get('pop', 0),
+            weather['main'],
+            weather['description'],
+            weather['icon'],
+        )
+    
+    def __repr__(self):
+        return f"ForecastPoint(dt={self.dt}, temp={self.temp}, pop={self.pop}, description={self.description!r})"
+
+
+class DailySummary:
+    """
+    parse_weather_data()の結果(1日分の天気のまとめ)
+    """
+    __slots__ = (
+        'temp_min', 'temp_max', 'morning_temp', 'noon_temp', 'night_temp',
+        'weather_main', 'weather_description', 'weather_icon', 'pop', 'date',
+    )
+    
+    def __init__(self, temp_min, temp_max, morning_temp, noon_temp, night_temp,
+                 weather_main, weather_description, weather_icon, pop, date):
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.morning_temp = morning_temp
+        self.noon_temp = noon_temp
+        self.night_temp = night_temp
+        self.weather_main = weather_main
+        self.weather_description = weather_description
+        self.weather_icon = weather_icon
+        self.pop = pop
+        self.date = date
+    
+    def to_dict(self):
+        """
+        辞書に変換する(保存やJSON出力用)
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @classmethod
+    def from_dict(cls, values):
+        """
+        to_dict()で作った辞書から元に戻す
+        """
+        return cls(**{name: values[name] for name in cls.__slots__})
+    
+    def __eq__(self, other):
+        if not isinstance(other, DailySummary):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+    
+    def __repr__(self):
+        return f"DailySummary({self.to_dict()!r})"
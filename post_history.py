@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import config
+
+
+# 比べる気温の項目
+TEMP_FIELDS = ('temp_min', 'temp_max', 'morning_temp', 'noon_temp', 'night_temp')
+
+
+def webhook_key(webhook_url):
+    """
+    Webhook URLを保存用のキーにする(URLに含まれるトークンをファイルに残さない)
+    """
+    return hashlib.sha1(webhook_url.encode('utf-8')).hexdigest()[:16]
+
+
+def load_history(path=None):
+    """
+    前回までの投稿履歴(メッセージIDと投稿した予報)を読み込む
+    
+    Returns:
+        dict: {Webhookのキー: {"messages": [...], "summaries": {...}}}
+    """
+    path = path or config.POST_HISTORY_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_history(history, path=None):
+    """
+    投稿履歴を保存する(一時ファイルに書いてから置き換える)
+    """
+    path = path or config.POST_HISTORY_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def summary_changed(old, new):
+    """
+    投稿済みの予報から、投稿し直すほど変わったかどうか
+    
+    Args:
+        old: 前回投稿した予報(DailySummary.to_dict()の辞書)
+        new: 新しい予報(DailySummary.to_dict()の辞書)
+        
+    Returns:
+        bool: 気温・降水確率が閾値以上変わったか、天気の説明が変わったらTrue
+    """
+    for field in TEMP_FIELDS:
+        if abs(new[field] - old[field]) >= config.UPDATE_TEMP_THRESHOLD:
+            return True
+    
+    if abs(new['pop'] - old['pop']) >= config.UPDATE_POP_THRESHOLD:
+        return True
+    
+    if config.UPDATE_ON_DESCRIPTION and new['weather_description'] != old['weather_description']:
+        return True
+    
+    return False
+    
+    # 解説:
+    # 例: 閾値2℃なら、最高気温が18.4℃→19.9℃の変化では投稿し直さず、
+    # 18.4℃→20.5℃になったらメッセージを書き換えます
+
+
+def plan_updates(previous, summaries):
+    """
+    1つのWebhookについて、メッセージごとに「書き換え・そのまま・新規投稿」を決める
+    
+    前回のメッセージに入っていた地点がすべて今回もあり、日付も同じなら、
+    どれかの地点が大きく変わったときだけ書き換え、変わっていなければ何も送りません。
+    日付が変わった・地点が増減したなどで使えないメッセージの地点は新しく投稿します。
+    
+    Args:
+        previous: このWebhookの前回の履歴(load_history()の値の1要素、なければ空の辞書)
+        summaries: {地点のキー: 新しい予報の辞書}
+        
+    Returns:
+        tuple: (書き換えるメッセージ[(メッセージID, 地点のキーのリスト)],
+                そのままのメッセージ[履歴の要素], 新規投稿する地点のキーのリスト)
+    """
+    old_summaries = previous.get('summaries', {})
+    edits = []
+    unchanged = []
+    handled = set()
+    
+    for message in previous.get('messages', []):
+        keys = message['locations']
+        reusable = all(
+            key in summaries and key not in handled and key in old_summaries
+            and old_summaries[key]['date'] == summaries[key]['date']
+            for key in keys
+        )
+        if not reusable:
+            continue
+        
+        if any(summary_changed(old_summaries[key], summaries[key]) for key in keys):
+            edits.append((message['id'], keys))
+        else:
+            unchanged.append(message)
+        handled.update(keys)
+    
+    new_keys = [key for key in summaries if key not in handled]
+    return edits, unchanged, new_keys
+
+
+def record_updates(previous, summaries, unchanged, sent):
+    """
+    今回の投稿結果から、このWebhookの新しい履歴を作る
+    
+    Args:
+        previous: このWebhookの前回の履歴
+        summaries: {地点のキー: 新しい予報の辞書}
+        unchanged: plan_updates()で「そのまま」になったメッセージ
+        sent: 送信・書き換えできたメッセージ(discord_dispatcher.SentMessage)のリスト
+        
+    Returns:
+        dict: 新しい履歴
+    """
+    old_summaries = previous.get('summaries', {})
+    messages = list(unchanged)
+    posted = {}
+    
+    # 書き換えなかったメッセージは、前回投稿した内容と比べ続ける
+    for message in unchanged:
+        for key in message['locations']:
+            posted[key] = old_summaries[key]
+    
+    for message in sent:
+        if message.message_id is None:
+            continue
+        messages.append({'id': message.message_id, 'locations': list(message.keys)})
+        for key in message.keys:
+            posted[key] = summaries[key]
+    
+    return {'messages': messages, 'summaries': posted}
@@ -0,0 +1,150 @@
+import json
+import config
+import recommend
+
+
+class Profile:
+    """
+    購読者1人分の好み
+    
+    - sensitivity: 寒がりなら正、暑がりなら負(℃)。+3なら「3℃寒い日」と同じ服装をすすめる
+    - commute: 外にいる時間帯('morning' / 'noon' / 'night')。その時刻の気温で冷え込みを判定する
+    - umbrella: 傘の許容度(ポイント)。+20なら降水確率が20ポイント高くなるまで傘をすすめない
+    """
+    __slots__ = ('sensitivity', 'commute', 'umbrella')
+    
+    def __init__(self, sensitivity=0, commute=(), umbrella=0):
+        self.sensitivity = sensitivity
+        self.commute = tuple(commute)
+        self.umbrella = umbrella
+    
+    @classmethod
+    def from_dict(cls, values):
+        """
+        購読者ファイルの1件分から作る(書かれていない項目は既定値)
+        """
+        commute = values.get('commute') or ()
+        for slot in commute:
+            if slot not in recommend.COMMUTE_SLOTS:
+                raise ValueError(f"commuteには{', '.join(recommend.COMMUTE_SLOTS)}のどれかを書いてください: {slot}")
+        return cls(
+            sensitivity=float(values.get('sensitivity', 0)),
+            commute=commute,
+            umbrella=float(values.get('umbrella', 0)),
+        )
+    
+    def thresholds(self):
+        """
+        好みを反映した、実際に使うしきい値を返す
+        
+        Returns:
+            recommend.Thresholds: しきい値一式
+        """
+        offset = self.sensitivity
+        return recommend.Thresholds(
+            clothing=[threshold + offset for threshold in recommend.CLOTHING_THRESHOLDS],
+            cold=recommend.COLD_THRESHOLD + offset,
+            heat=recommend.HEAT_THRESHOLD + offset,
+            umbrella=[threshold + self.umbrella for threshold in recommend.UMBRELLA_THRESHOLDS],
+            commute=self.commute,
+        )
+        
+        # 解説:
+        # 「寒がりなので3℃寒く感じる」は「しきい値を3℃上げる」のと同じです
+        # 気温の方を人ごとに変えると予報ごと・人ごとに計算が要りますが、
+        # しきい値にしておけば予報を見る前に1回計算するだけで済みます
+
+
+def load_subscribers(location_list, path=None):
+    """
+    購読者ファイル(JSON)を読み込み、購読者ごとの投稿先を地点と同じ形式で返す
+    
+    ファイルの形式:
+        [
+            {"id": "alice", "location": "東京", "webhook_url": "https://discord.com/api/webhooks/...",
+             "sensitivity": 3, "commute": ["morning", "night"], "umbrella": -10},
+            ...
+        ]
+    
+    Args:
+        location_list: 地点情報の辞書のリスト(locationは地点の名前で指定する)
+        path: 購読者ファイルのパス(省略時はconfig.SUBSCRIBERS_FILE)
+    
+    Returns:
+        list: 地点情報の辞書のリスト(subscriberに購読者のID、thresholdsにしきい値が入る)
+    """
+    path = path or config.SUBSCRIBERS_FILE
+    if not path:
+        return []
+    
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    
+    by_name = {location['name']: location for location in location_list}
+    by_profile = {}
+    shared = {}
+    subscribers = []
+    for entry in entries:
+        location = by_name.get(entry['location'])
+        if location is None:
+            raise ValueError(f"購読者{entry['id']}の地点「{entry['location']}」が地点の一覧にありません")
+        
+        # しきい値が同じになる購読者は、同じThresholdsを使い回す
+        profile = Profile.from_dict(entry)
+        profile_key = (profile.sensitivity, profile.commute, profile.umbrella)
+        thresholds = by_profile.get(profile_key)
+        if thresholds is None:
+            thresholds = profile.thresholds()
+            thresholds = by_profile[profile_key] = shared.setdefault(thresholds.key, thresholds)
+        
+        subscriber = dict(location)
+        subscriber['webhook_url'] = entry.get('webhook_url') or location['webhook_url']
+        subscriber['subscriber'] = str(entry['id'])
+        subscriber['thresholds'] = thresholds
+        subscribers.append(subscriber)
+    
+    return subscribers
+    
+    # 解説:
+    # 購読者は「地点の写し + 好み」として扱うので、同じ地点の購読者が何千人いても
+    # 予報の取得と解析は地点(セル)ごとに1回だけです
+
+
+def recommend_cell(result, cell_locations):
+    """
+    セル1つ分の予報に対して、セル内の全地点・全購読者のおすすめをまとめて判定する
+    
+    Args:
+        result: analyze_cell()の結果 (DailySummary, 服装の推奨, 持ち物の推奨)
+        cell_locations: セルの地点(購読者)のリスト
+    
+    Returns:
+        list: cell_locationsと同じ順の(服装メッセージ, 持ち物メッセージ)のリスト
+              (同じ文章になる地点には同じタプルを返す)
+    """
+    weather_info, clothing, items = result
+    default = (clothing, items)
+    by_outcome = {recommend.DEFAULT_THRESHOLDS.outcome(weather_info): default}
+    by_key = {}
+    texts = []
+    
+    for location in cell_locations:
+        thresholds = location.get('thresholds')
+        if thresholds is None:
+            texts.append(default)
+            continue
+        
+        text = by_key.get(thresholds.key)
+        if text is None:
+            outcome = thresholds.outcome(weather_info)
+            text = by_outcome.get(outcome)
+            if text is None:
+                text = by_outcome[outcome] = recommend.render_outcome(outcome)
+            by_key[thresholds.key] = text
+        texts.append(text)
+    
+    return texts
+    
+    # 解説:
+    # 判定はしきい値の組み合わせごとに1回、文章づくりは結果の組み合わせごとに1回です
+    # 購読者が増えても、好みの種類が増えなければ処理はほとんど増えません
@@ -1,3 +1,73 @@
+from bisect import bisect_right
+import metrics
+
+
+# 服装のしきい値(最高気温)と、それぞれの範囲のメッセージ
+# CLOTHING_MESSAGES[i]は「最高気温以下のしきい値がi個」のときのメッセージ
+CLOTHING_THRESHOLDS = (5, 10, 15, 20, 25, 28)
+CLOTHING_MESSAGES = (
+    "冬服＋ダウン・厚手コートで大丈夫です。",  # 5℃未満
+    "長袖＋厚手のコート／ダウンジャケットで大丈夫です。",  # 5℃以上
+    "長袖シャツ＋薄手のカーディガン／Tシャツ＋スウェット／トレンチコートで大丈夫です。",  # 10℃以上
+    "長袖シャツ＋薄手のカーディガン／ナイロンパーカーで大丈夫です。",  # 15℃以上
+    "半袖＋長袖シャツで大丈夫です。昼間は半袖で過ごせます。",  # 20℃以上
+    "半袖／薄手の長袖で大丈夫です。",  # 25℃以上
+    "半袖で大丈夫です。暑がりの人は1日半袖で過ごせます。",  # 28℃以上
+)
+
+# 傘のしきい値(降水確率)と、それぞれの範囲のメッセージ
+UMBRELLA_THRESHOLDS = (30, 50)
+UMBRELLA_MESSAGES = (
+    "傘は不要です。",  # 30%未満
+    "折りたたみ傘があると安心です。",  # 30%以上
+    "傘必須です。",  # 50%以上
+)
+
+# 追加のアドバイスのしきい値
+COLD_THRESHOLD = 10       # 最低気温がこれ未満なら「朝晩は冷えます」
+TEMP_DIFF_THRESHOLD = 10  # 気温差がこれ以上なら「脱ぎ着しやすい服を」
+HEAT_THRESHOLD = 30       # 最高気温がこれ以上なら「帽子・飲み物も」
+
+# 購読者ごとの「寒さを気にする時間帯」と、DailySummaryの気温の項目
+COMMUTE_SLOTS = {
+    'morning': 'morning_temp',
+    'noon': 'noon_temp',
+    'night': 'night_temp',
+}
+
+# 解説:
+# 表はモジュールを読み込んだときに1回だけ作られます
+# 関数を呼ぶたびに作り直さないので速くなります
+
+# 天気と絵文字の対応表(辞書)
+WEATHER_EMOJI_MAP = {
+    'Clear': '☀️',      # 晴れ
+    'Clouds': '☁️',     # 曇り
+    'Rain': '🌧️',      # 雨
+    'Drizzle': '🌦️',   # 小雨
+    'Thunderstorm': '⛈️',  # 雷雨
+    'Snow': '⛄',       # 雪
+    'Mist': '🌫️',      # 霧
+    'Fog': '🌫️',       # 霧
+}
+
+# 解説:
+# 辞書(dictionary)は{キー: 値}の形式
+# 天気の名前(キー)から絵文字(値)を取得できる
+
+# 天気とEmbedの色の対応表
+EMBED_COLOR_MAP = {
+    'Clear': 0xFFD700,      # ゴールド(晴れ)
+    'Clouds': 0x808080,     # グレー(曇り)
+    'Rain': 0x4682B4,       # スティールブルー(雨)
+    'Drizzle': 0x87CEEB,    # スカイブルー(小雨)
+    'Thunderstorm': 0x483D8B,  # ダークスレートブルー(雷雨)
+    'Snow': 0xFFFFFF,       # ホワイト(雪)
+    'Mist': 0xD3D3D3,       # ライトグレー(霧)
+    'Fog': 0xD3D3D3,        # ライトグレー(霧)
+}
+
+
 def recommend_clothing(temp_max, temp_min):
     """
     気温から服装をおすすめする関数
@@ -20,29 +90,13 @@ def recommend_clothing(temp_max, temp_min):
     # 例: 最高20℃、最低10℃ → 差は10℃
     
     # 基本の服装を決める(最高気温ベース)
-    if temp_max >= 28:
-        clothing = "半袖で大丈夫です。暑がりの人は1日半袖で過ごせます。"
-    elif temp_max >= 25:
-        clothing = "半袖／薄手の長袖で大丈夫です。"
-    elif temp_max >= 20:
-        clothing = "半袖＋長袖シャツで大丈夫です。昼間は半袖で過ごせます。"
-    elif temp_max >= 15:
-        clothing = "長袖シャツ＋薄手のカーディガン／ナイロンパーカーで大丈夫です。"
-    elif temp_max >= 10:
-        clothing = "長袖シャツ＋薄手のカーディガン／Tシャツ＋スウェット／トレンチコートで大丈夫です。"
-    elif temp_max >= 5:
-        clothing = "長袖＋厚手のコート／ダウンジャケットで大丈夫です。"
-    else:
-        clothing = "冬服＋ダウン・厚手コートで大丈夫です。"
+    clothing = CLOTHING_MESSAGES[bisect_right(CLOTHING_THRESHOLDS, temp_max)]
     
     # 解説:
-    # if-elif-else構文で条件分岐
-    # 上から順に条件をチェックして、最初に当てはまったものを実行
-    # 
+    # bisect_right()は「temp_max以下のしきい値がいくつあるか」を返します
     # 例: temp_max = 22℃の場合
-    # - 28以上? → No
-    # - 25以上? → No
-    # - 20以上? → Yes! → "半袖＋長袖シャツ..."を選択
+    # - しきい値 [5, 10, 15, 20, 25, 28] のうち22以下は 5, 10, 15, 20 の4つ
+    # - CLOTHING_MESSAGES[4] → "半袖＋長袖シャツ..."を選択
     
     # 追加のアドバイス
     additional_advice = []
@@ -52,7 +106,7 @@ def recommend_clothing(temp_max, temp_min):
     # 後で追加アドバイスを入れていきます
     
     # 最低気温が低い場合
-    if temp_min < 10:
+    if temp_min < COLD_THRESHOLD:
         additional_advice.append("朝晩は冷えます。")
     
     # 解説:
@@ -60,7 +114,7 @@ def recommend_clothing(temp_max, temp_min):
     # 例: [] → ["朝晩は冷えます。"]
     
     # 気温差が大きい場合
-    if temp_diff >= 10:
+    if temp_diff >= TEMP_DIFF_THRESHOLD:
         additional_advice.append("脱ぎ着しやすい服を。")
     
     # 解説:
@@ -99,12 +153,7 @@ def recommend_items(pop, temp_max):
     # 持ち物を入れていきます
     
     # 降水確率で傘の判定
-    if pop >= 50:
-        items.append("傘必須です。")
-    elif pop >= 30:
-        items.append("折りたたみ傘があると安心です。")
-    else:
-        items.append("傘は不要です。")
+    items.append(UMBRELLA_MESSAGES[bisect_right(UMBRELLA_THRESHOLDS, pop)])
     
     # 解説:
     # 降水確率が50%以上なら傘必須
@@ -112,7 +161,7 @@ def recommend_items(pop, temp_max):
     # 30%未満なら不要
     
     # 最高気温が高い場合
-    if temp_max >= 30:
+    if temp_max >= HEAT_THRESHOLD:
         items.append("帽子・飲み物も忘れずに。")
     
     # 解説:
@@ -127,6 +176,100 @@ def recommend_items(pop, temp_max):
     #   → "傘必須です。\n帽子・飲み物も忘れずに。"
 
 
+@metrics.timed('recommend')
+def recommend_for_summary(weather_info):
+    """
+    1日分の天気のまとめ(DailySummary)から服装と持ち物をまとめて判定する
+    
+    Args:
+        weather_info: parse_weather_data()の結果
+        
+    Returns:
+        tuple: (服装メッセージ, 持ち物メッセージ)
+    """
+    clothing = recommend_clothing(weather_info.temp_max, weather_info.temp_min)
+    items = recommend_items(weather_info.pop, weather_info.temp_max)
+    return clothing, items
+
+
+class Thresholds:
+    """
+    おすすめを決めるしきい値一式(購読者の好みを反映した「実際に使うしきい値」)
+    
+    好みの書き方が違っても、しきい値が同じになる購読者のおすすめは同じなので、
+    keyが同じThresholdsは1つにまとめて1回だけ判定します。
+    """
+    __slots__ = ('clothing', 'cold', 'heat', 'umbrella', 'commute', 'key')
+    
+    def __init__(self, clothing=CLOTHING_THRESHOLDS, cold=COLD_THRESHOLD, heat=HEAT_THRESHOLD,
+                 umbrella=UMBRELLA_THRESHOLDS, commute=()):
+        """
+        Args:
+            clothing: 服装のしきい値(最高気温、CLOTHING_THRESHOLDSと同じ並び)
+            cold: 「朝晩は冷えます」の気温
+            heat: 「帽子・飲み物も」の最高気温
+            umbrella: 傘のしきい値(降水確率、UMBRELLA_THRESHOLDSと同じ並び)
+            commute: 寒さを気にする時間帯(COMMUTE_SLOTSのキー)。空なら1日の最低気温で判定する
+        """
+        self.clothing = tuple(clothing)
+        self.cold = cold
+        self.heat = heat
+        self.umbrella = tuple(umbrella)
+        self.commute = tuple(sorted(set(commute)))
+        self.key = (self.clothing, self.cold, self.heat, self.umbrella, self.commute)
+    
+    def outcome(self, weather_info):
+        """
+        どのメッセージを選ぶかだけを判定する(文字列はまだ作らない)
+        
+        Returns:
+            tuple: (服装の番号, 冷えるか, 気温差が大きいか, 傘の番号, 暑いか)
+        """
+        temp_max = weather_info.temp_max
+        temp_min = weather_info.temp_min
+        
+        if self.commute:
+            temps = [getattr(weather_info, COMMUTE_SLOTS[slot]) for slot in self.commute]
+            temps = [temp for temp in temps if temp is not None]
+            coldest = min(temps) if temps else temp_min
+        else:
+            coldest = temp_min
+        
+        return (
+            bisect_right(self.clothing, temp_max),
+            coldest < self.cold,
+            temp_max - temp_min >= TEMP_DIFF_THRESHOLD,
+            bisect_right(self.umbrella, weather_info.pop),
+            temp_max >= self.heat,
+        )
+
+
+DEFAULT_THRESHOLDS = Thresholds()
+
+
+def render_outcome(outcome):
+    """
+    Thresholds.outcome()の判定結果から、服装と持ち物のメッセージを作る
+    
+    しきい値が既定のままなら、recommend_clothing()・recommend_items()と同じ文章になります。
+    
+    Returns:
+        tuple: (服装メッセージ, 持ち物メッセージ)
+    """
+    clothing_index, cold, wide, umbrella_index, hot = outcome
+    
+    clothing = CLOTHING_MESSAGES[clothing_index]
+    advice = ("朝晩は冷えます。" if cold else "") + ("脱ぎ着しやすい服を。" if wide else "")
+    if advice:
+        clothing += "\n" + advice
+    
+    items = UMBRELLA_MESSAGES[umbrella_index]
+    if hot:
+        items += "\n帽子・飲み物も忘れずに。"
+    
+    return clothing, items
+
+
 def get_weather_emoji(weather_main):
     """
     天気の種類から絵文字を返す関数
@@ -140,31 +283,15 @@ def get_weather_emoji(weather_main):
     # 解説:
     # weather_mainはAPIから返される天気の大分類
     
-    # 天気と絵文字の対応表(辞書)
-    emoji_map = {
-        'Clear': '☀️',      # 晴れ
-        'Clouds': '☁️',     # 曇り
-        'Rain': '🌧️',      # 雨
-        'Drizzle': '🌦️',   # 小雨
-        'Thunderstorm': '⛈️',  # 雷雨
-        'Snow': '⛄',       # 雪
-        'Mist': '🌫️',      # 霧
-        'Fog': '🌫️',       # 霧
-    }
-    
-    # 解説:
-    # 辞書(dictionary)は{キー: 値}の形式
-    # 天気の名前(キー)から絵文字(値)を取得できる
-    
     # 対応する絵文字を返す(なければデフォルト🌤️)
-    return emoji_map.get(weather_main, '🌤️')
+    return WEATHER_EMOJI_MAP.get(weather_main, '🌤️')
     
     # 解説:
     # .get(キー, デフォルト値)
     # - キーが辞書にあれば、その値を返す
     # - キーがなければ、デフォルト値を返す
-    # 例: emoji_map.get('Clear', '🌤️') → '☀️'
-    # 例: emoji_map.get('Unknown', '🌤️') → '🌤️'
+    # 例: WEATHER_EMOJI_MAP.get('Clear', '🌤️') → '☀️'
+    # 例: WEATHER_EMOJI_MAP.get('Unknown', '🌤️') → '🌤️'
 
 
 def get_embed_color(weather_main):
@@ -181,18 +308,7 @@ def get_embed_color(weather_main):
     # Discord Embedは色を16進数で指定します
     # 0xFFD700 のような形式
     
-    color_map = {
-        'Clear': 0xFFD700,      # ゴールド(晴れ)
-        'Clouds': 0x808080,     # グレー(曇り)
-        'Rain': 0x4682B4,       # スティールブルー(雨)
-        'Drizzle': 0x87CEEB,    # スカイブルー(小雨)
-        'Thunderstorm': 0x483D8B,  # ダークスレートブルー(雷雨)
-        'Snow': 0xFFFFFF,       # ホワイト(雪)
-        'Mist': 0xD3D3D3,       # ライトグレー(霧)
-        'Fog': 0xD3D3D3,        # ライトグレー(霧)
-    }
-    
-    return color_map.get(weather_main, 0x3498db)
+    return EMBED_COLOR_MAP.get(weather_main, 0x3498db)
     
     # 解説:
     # デフォルトは0x3498db(青色)
@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+import config
+import locations
+import timezones
+
+
+def parse_schedule_times(text):
+    """
+    "7:00,18:30"のような文字列を[(7, 0), (18, 30)]に変換する
+    
+    Args:
+        text: カンマ区切りの「時:分」
+        
+    Returns:
+        list: (時, 分)のタプルのリスト(重複なし・時刻順)
+    """
+    times = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        hour, _, minute = part.partition(':')
+        times.add((int(hour), int(minute or 0)))
+    return sorted(times)
+
+
+def default_schedule_times():
+    """
+    config.pyの設定から既定の投稿時刻を返す
+    
+    SCHEDULE_TIMESがあればそれを、なければSCHEDULE_HOUR/SCHEDULE_MINUTEを使う
+    """
+    if config.SCHEDULE_TIMES:
+        return parse_schedule_times(config.SCHEDULE_TIMES)
+    return [(config.SCHEDULE_HOUR, config.SCHEDULE_MINUTE)]
+
+
+def group_by_schedule(location_list):
+    """
+    地点を投稿時刻ごとにまとめる
+    
+    地点ファイルで"schedules": ["7:00", "18:00"]のように指定した地点はその時刻に、
+    指定がない地点は既定の時刻に投稿します。
+    時刻は地点のタイムゾーン(timezone、なければconfig.TIMEZONE)で数えます。
+    
+    Args:
+        location_list: 地点情報の辞書のリスト
+        
+    Returns:
+        dict: {(時, 分, タイムゾーン名): [地点, ...]}
+    """
+    default_times = default_schedule_times()
+    slots = {}
+    
+    for location in location_list:
+        schedules = location.get('schedules')
+        times = parse_schedule_times(','.join(schedules)) if schedules else default_times
+        timezone = location.get('timezone') or config.TIMEZONE
+        for hour, minute in times:
+            slots.setdefault((hour, minute, timezone), []).append(location)
+    
+    return slots
+
+
+def slot_key(slot):
+    hour, minute, timezone = slot
+    key = f"{hour:02d}:{minute:02d}"
+    
+    # config.TIMEZONEの投稿時刻は、今までと同じキーで最終実行時刻を覚える
+    if timezone != config.TIMEZONE:
+        key += f" {timezone}"
+    return key
+
+
+def latest_occurrence(slot, now):
+    """
+    nowより前で一番新しい、その投稿時刻の日時を返す(投稿時刻のタイムゾーン)
+    """
+    hour, minute, timezone = slot
+    tz = timezones.get_zone(timezone)
+    now = now.astimezone(tz)
+    occurrence = datetime(now.year, now.month, now.day, hour, minute, tzinfo=tz)
+    if occurrence > now:
+        previous_day = now.date() - timedelta(days=1)
+        occurrence = datetime(previous_day.year, previous_day.month, previous_day.day, hour, minute, tzinfo=tz)
+    return occurrence
+
+
+def next_occurrence(slot, now):
+    """
+    nowより後で一番早い、その投稿時刻の日時を返す(投稿時刻のタイムゾーン)
+    """
+    hour, minute, timezone = slot
+    tz = timezones.get_zone(timezone)
+    now = now.astimezone(tz)
+    occurrence = datetime(now.year, now.month, now.day, hour, minute, tzinfo=tz)
+    if occurrence <= now:
+        next_day = now.date() + timedelta(days=1)
+        occurrence = datetime(next_day.year, next_day.month, next_day.day, hour, minute, tzinfo=tz)
+    return occurrence
+
+
+def load_state(path=None):
+    """
+    各投稿時刻の最終実行時刻(UNIX時間)を読み込む
+    """
+    path = path or config.SCHEDULE_STATE_FILE
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=None):
+    """
+    最終実行時刻を保存する(一時ファイルに書いてから置き換える)
+    """
+    path = path or config.SCHEDULE_STATE_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def due_slots(slots, state, now):
+    """
+    今実行すべき投稿時刻を返す
+    
+    直近の投稿時刻をまだ実行しておらず、その時刻からの経過が
+    SCHEDULE_CATCHUP_MINUTES以内なら実行対象です(停止中に逃した分の取り戻し)。
+    
+    Returns:
+        list: (投稿時刻, 予定日時)のタプルのリスト
+    """
+    catchup = timedelta(minutes=config.SCHEDULE_CATCHUP_MINUTES)
+    due = []
+    
+    for slot in slots:
+        occurrence = latest_occurrence(slot, now)
+        last_run = state.get(slot_key(slot), 0)
+        if last_run < occurrence.timestamp() and now - occurrence <= catchup:
+            due.append((slot, occurrence))
+    
+    return due
+
+
+def run_daemon(post_function):
+    """
+    常駐して、設定された時刻ごとに天気予報を投稿し続ける
+    
+    プロセスが起動したままなので、HTTP接続やキャッシュが温まった状態で
+    1日に何回でも投稿できます。
+    
+    Args:
+        post_function: 地点リストとrun_keyを受け取って投稿する関数(bot.post_weather_forecast)
+    """
+    tz = timezones.get_zone()
+    state = load_state()
+    
+    slots = group_by_schedule(locations.load_locations())
+    times = ', '.join(slot_key(slot) for slot in sorted(slots))
+    print(f"🕒 常駐モードで起動しました (投稿時刻: {times} {config.TIMEZONE})")
+    
+    while True:
+        now = datetime.now(tz)
+        
+        for slot, occurrence in due_slots(slots, state, now):
+            if now - occurrence > timedelta(minutes=1):
+                print(f"⏪ {occurrence.strftime('%m/%d %H:%M')}の投稿を取り戻します")
+            
+            # 同じ投稿時刻の送信は、取り戻しや再起動でもう一度実行しても二重に送らない
+            try:
+                post_function(slots[slot], run_key=f"{occurrence.strftime('%Y-%m-%d')} {slot_key(slot)}")
+            except Exception as e:
+                print(f"❌ {slot_key(slot)}の投稿中にエラーが発生しました: {e}")
+            # 失敗しても実行済みにする(途中まで送った投稿を何度も送り直さないため)
+            state[slot_key(slot)] = occurrence.timestamp()
+            save_state(state)
+        
+        # 地点ファイルの変更も次の投稿から反映する(読み込めなければ今までの設定のまま)
+        try:
+            slots = group_by_schedule(locations.load_locations())
+        except Exception as e:
+            print(f"❌ 地点ファイルを読み込めませんでした(今までの地点で続けます): {e}")
+        
+        # 時計のずれに備えて、最長でも1分ごとに起きて確認する
+        wait = 60
+        if slots:
+            now = datetime.now(tz)
+            next_run = min(next_occurrence(slot, now) for slot in slots)
+            wait = min((next_run - now).total_seconds(), wait)
+        time.sleep(max(wait, 1))
+    
+    # 解説:
+    # 1回の投稿や地点ファイルの読み込みで予期しないエラーが起きても、
+    # 常駐プロセスは止めずに、次の投稿時刻から続けます
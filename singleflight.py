@@ -0,0 +1,72 @@
+import threading
+
+
+class _Call:
+    """
+    実行中の呼び出し1件分(結果を待っている呼び出し元で共有する)
+    """
+    __slots__ = ('event', 'result', 'error', 'waiters')
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    同じキーの処理を同時に呼ばれたら、1回だけ実行して結果を全員で共有する
+    
+    例: 10スレッドが同じ地点の天気予報を同時に取りに来ても、
+        APIへのリクエストは1回だけになります
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+    
+    def do(self, key, func, timeout=None):
+        """
+        keyの処理が実行中ならその結果を待ち、なければfunc()を実行する
+        
+        Args:
+            key: 処理を見分けるキー
+            func: 引数なしで呼ぶ関数
+            timeout: 他の呼び出しの結果を待つ最大秒数(Noneなら無制限)
+            
+        Returns:
+            func()の戻り値
+            
+        Raises:
+            func()が出した例外(待っていた呼び出し元すべてに同じ例外が届く)
+            TimeoutError: timeout秒待っても結果が出なかったとき
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.waiters += 1
+        
+        if leader:
+            try:
+                call.result = func()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call.event.set()
+        elif not call.event.wait(timeout):
+            raise TimeoutError(f"{key} の結果を{timeout}秒待ちましたが終わりませんでした")
+        
+        if call.error is not None:
+            raise call.error
+        return call.result
+    
+    # 解説:
+    # 最初に来た呼び出し(leader)だけがfunc()を実行します
+    # 後から来た呼び出しはEventで完了を待ち、同じ結果(または例外)を受け取ります
+    # 完了したらキーを消すので、次の呼び出しは新しく実行されます
@@ -0,0 +1,467 @@
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_forecast_payload(start=None, count=40, temp=15.0):
+    """
+    OpenWeatherMapの5日間/3時間予報と同じ形のダミーデータを作る
+    
+    Args:
+        start: 最初の予報時刻(UNIX時間、省略時は現在時刻)
+        count: 予報の件数
+        temp: 基準の気温
+        
+    Returns:
+        dict: 予報データ
+    """
+    if start is None:
+        start = int(time.time()) // 10800 * 10800
+    
+    forecast_list = []
+    for i in range(count):
+        forecast_list.append({
+            'dt': start + i * 10800,
+            'main': {'temp': temp + (i % 8) - 4, 'humidity': 60},
+            'weather': [{'id': 803, 'main': 'Clouds', 'description': '曇りがち', 'icon': '04d'}],
+            'clouds': {'all': 75},
+            'wind': {'speed': 3.1, 'deg': 200},
+            'visibility': 10000,
+            'pop': (i % 5) * 0.1,
+            'sys': {'pod': 'd'},
+        })
+    
+    return {
+        'cod': '200',
+        'cnt': count,
+        'list': forecast_list,
+        'city': {'name': 'Stub', 'timezone': 32400},
+    }
+
+
+def make_onecall_payload(start=None, count=48, temp=15.0):
+    """
+    One Call API 3.0(1時間ごとの予報)と同じ形のダミーデータを作る
+    
+    Args:
+        start: 最初の予報時刻(UNIX時間、省略時は現在の1時間区切り)
+        count: 予報の件数
+        temp: 基準の気温
+        
+    Returns:
+        dict: 予報データ
+    """
+    if start is None:
+        start = int(time.time()) // 3600 * 3600
+    
+    hourly = []
+    for i in range(count):
+        hourly.append({
+            'dt': start + i * 3600,
+            'temp': temp + (i % 24) / 3 - 4,
+            'feels_like': temp + (i % 24) / 3 - 5,
+            'humidity': 60,
+            'clouds': 75,
+            'wind_speed': 3.1,
+            'wind_deg': 200,
+            'weather': [{'id': 803, 'main': 'Clouds', 'description': '曇りがち', 'icon': '04d'}],
+            'pop': (i % 5) * 0.1,
+        })
+    
+    return {
+        'lat': 35.6762,
+        'lon': 139.6503,
+        'timezone': 'Asia/Tokyo',
+        'timezone_offset': 32400,
+        'hourly': hourly,
+    }
+
+
+def geocode_places(query):
+    """
+    Geocoding APIの応答(地名ごとに決まった架空の緯度経度、'?'で始まる地名は見つからない)
+    """
+    if not query or query.startswith('?'):
+        return []
+    digest = sum(ord(char) * (i + 1) for i, char in enumerate(query))
+    return [{
+        'name': query,
+        'local_names': {'ja': query},
+        'lat': round(20 + digest % 2500 / 100, 4),
+        'lon': round(120 + digest // 2500 % 2500 / 100, 4),
+        'country': 'JP',
+    }]
+
+
+class StubState:
+    """
+    スタブサーバーの設定と、受けたリクエストの記録
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delay = 0.0
+        self.payload = make_forecast_payload()
+        self.onecall_payload = make_onecall_payload()
+        self.fixture_bodies = []
+        self.onecall_fixture_bodies = []
+        self.connections = 0
+        self.forecast_requests = 0
+        self.geocode_requests = 0
+        self.webhook_requests = []
+        self.webhook_edits = []
+        self.messages = {}
+        
+        # 障害の再現(予報APIのみ)
+        # fail_next: 次の何回かを fail_status で失敗させる / drop_next: 次の何回かを途中で切る
+        # fail_rate: その割合で失敗させる / slow_rate: その割合で slow_delay 秒遅らせる
+        # drop_rate: その割合で本文の途中で接続を切る
+        self.fail_next = 0
+        self.drop_next = 0
+        self.fail_rate = 0.0
+        self.fail_status = 503
+        self.slow_rate = 0.0
+        self.slow_delay = 1.0
+        self.drop_rate = 0.0
+        
+        # Discordのレート制限(Webhookごとに window 秒あたり limit 回)
+        self.webhook_limit = 5
+        self.webhook_window = 2.0
+        self.webhook_buckets = {}
+        self.rate_limited = 0
+    
+    def use_fixtures(self, payloads, onecall_payloads=()):
+        """
+        地点(緯度経度)ごとに、複数の予報データを順番に割り当てて返すようにする
+        
+        Args:
+            payloads: 予報データのリスト(fixtures.all_payloads()の値など)
+            onecall_payloads: One Call APIとして返す予報データのリスト(fixtures.hourly_payload()など)
+        """
+        self.fixture_bodies = [
+            json.dumps(payload, ensure_ascii=False).encode('utf-8') for payload in payloads
+        ]
+        self.onecall_fixture_bodies = [
+            json.dumps(payload, ensure_ascii=False).encode('utf-8') for payload in onecall_payloads
+        ]
+    
+    def forecast_body(self, query):
+        return self._pick_body(query, self.fixture_bodies, self.payload)
+    
+    def onecall_body(self, query):
+        return self._pick_body(query, self.onecall_fixture_bodies, self.onecall_payload)
+    
+    @staticmethod
+    def _pick_body(query, bodies, payload):
+        if not bodies:
+            return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        
+        lat = float(query.get('lat', ['0'])[0])
+        lon = float(query.get('lon', ['0'])[0])
+        index = int(round(lat * 10000) + round(lon * 10000)) % len(bodies)
+        return bodies[index]
+    
+    def count_connection(self):
+        with self.lock:
+            self.connections += 1
+    
+    def count_forecast(self):
+        with self.lock:
+            self.forecast_requests += 1
+    
+    def count_geocode(self):
+        with self.lock:
+            self.geocode_requests += 1
+    
+    def next_fault(self):
+        """
+        この予報リクエストに起こす障害を決める
+        
+        Returns:
+            str: 'fail'・'drop'・'slow'のどれか、障害なしならNone
+        """
+        with self.lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 'fail'
+            if self.drop_next > 0:
+                self.drop_next -= 1
+                return 'drop'
+        
+        roll = random.random()
+        if roll < self.fail_rate:
+            return 'fail'
+        if roll < self.fail_rate + self.drop_rate:
+            return 'drop'
+        if random.random() < self.slow_rate:
+            return 'slow'
+        return None
+    
+    def record_webhook(self, path, body):
+        """
+        投稿を記録し、メッセージIDを返す
+        """
+        with self.lock:
+            self.webhook_requests.append((path, body))
+            message_id = str(len(self.messages) + 1)
+            self.messages[message_id] = body
+            return message_id
+    
+    def edit_message(self, path, message_id, body):
+        """
+        メッセージの書き換えを記録する。存在しないIDならFalse
+        """
+        with self.lock:
+            if message_id not in self.messages:
+                return False
+            self.webhook_edits.append((path, body))
+            self.messages[message_id] = body
+            return True
+    
+    def take_webhook_token(self, path):
+        """
+        Webhookのバケットから1回分を使う
+        
+        Returns:
+            tuple: (許可されたか, 残り回数, リセットまでの秒数)
+        """
+        with self.lock:
+            now = time.monotonic()
+            reset_at, used = self.webhook_buckets.get(path, (0.0, 0))
+            
+            if now >= reset_at:
+                reset_at, used = now + self.webhook_window, 0
+            
+            if used >= self.webhook_limit:
+                self.rate_limited += 1
+                return False, 0, reset_at - now
+            
+            used += 1
+            self.webhook_buckets[path] = (reset_at, used)
+            return True, self.webhook_limit - used, reset_at - now
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    OpenWeatherMapとDiscord Webhookの代わりに応答するハンドラ
+    
+    GET  /data/2.5/forecast     → 予報データ(JSON)
+    GET  /data/3.0/onecall      → 1時間ごとの予報データ(JSON)
+    POST /api/webhooks/...      → 204 No Content(?wait=trueなら作成したメッセージ)
+    PATCH /api/webhooks/.../messages/{id} → 書き換えたメッセージ
+    
+    Webhookは本物のDiscordと同じように、X-RateLimit-*ヘッダーを返し、
+    バケットを使い切ると429とretry_afterを返します。
+    """
+    protocol_version = 'HTTP/1.1'
+    
+    # ヘッダーと本文を1回で送る(keep-alive時の遅延ACK待ちを避ける)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        super().setup()
+        self.server.state.count_connection()
+    
+    def log_message(self, format, *args):
+        # テスト中にログが大量に出ないようにする
+        pass
+    
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            encoding = 'gzip'
+        else:
+            encoding = None
+        
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_truncated(self, body):
+        """
+        Content-Lengthどおりに送らず、本文の途中で接続を切る
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:len(body) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+    
+    def send_rate_limited(self, remaining, reset_after):
+        self.send_body(429, json.dumps({
+            'message': 'You are being rate limited.',
+            'retry_after': round(reset_after, 3),
+            'global': False,
+        }).encode('utf-8'), headers=self.rate_limit_headers(remaining, reset_after))
+    
+    @staticmethod
+    def message_body(message_id, body):
+        message = json.loads(body or b'{}')
+        message['id'] = message_id
+        return json.dumps(message, ensure_ascii=False).encode('utf-8')
+    
+    def rate_limit_headers(self, remaining, reset_after):
+        """
+        Discordと同じ形のレート制限ヘッダー
+        """
+        return {
+            'X-RateLimit-Limit': str(self.server.state.webhook_limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+            'X-RateLimit-Bucket': 'stub',
+        }
+    
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        
+        if state.delay:
+            time.sleep(state.delay)
+        
+        if url.path.endswith('/forecast') or url.path.endswith('/onecall'):
+            state.count_forecast()
+            fault = state.next_fault()
+            
+            query = parse_qs(url.query)
+            if url.path.endswith('/onecall'):
+                body = state.onecall_body(query)
+            else:
+                body = state.forecast_body(query)
+            
+            if fault == 'fail':
+                self.send_body(state.fail_status, b'{"cod": 503, "message": "stub failure"}')
+            elif fault == 'drop':
+                self.send_truncated(body)
+            else:
+                if fault == 'slow':
+                    time.sleep(state.slow_delay)
+                self.send_body(200, body)
+        elif url.path.endswith('/geo/1.0/direct'):
+            state.count_geocode()
+            query = parse_qs(url.query).get('q', [''])[0]
+            self.send_body(200, json.dumps(geocode_places(query), ensure_ascii=False).encode('utf-8'))
+        else:
+            self.send_body(404, b'{"message": "not found"}')
+    
+    def do_POST(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        path = url.path
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if len(body) < length:
+            # 送信の途中で切断された(本文が途中までしか届いていない)リクエストは受け付けない
+            return
+        
+        if state.delay:
+            time.sleep(state.delay)
+        
+        if path.startswith('/api/webhooks/'):
+            allowed, remaining, reset_after = state.take_webhook_token(path)
+            
+            if not allowed:
+                self.send_rate_limited(remaining, reset_after)
+                return
+            
+            embeds = json.loads(body or b'{}').get('embeds', [])
+            if len(embeds) > 10:
+                self.send_body(400, b'{"message": "Invalid Form Body", "code": 50035}')
+                return
+            
+            message_id = state.record_webhook(path, body)
+            headers = self.rate_limit_headers(remaining, reset_after)
+            
+            # ?wait=true なら作成したメッセージを返す(本物のDiscordと同じ)
+            if parse_qs(url.query).get('wait') == ['true']:
+                self.send_body(200, self.message_body(message_id, body), headers=headers)
+                return
+            
+            self.send_response(204)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_body(404, b'{"message": "not found"}')
+    
+    def do_PATCH(self):
+        state = self.server.state
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        
+        if state.delay:
+            time.sleep(state.delay)
+        
+        webhook_path, _, message_id = path.partition('/messages/')
+        if not webhook_path.startswith('/api/webhooks/') or not message_id:
+            self.send_body(404, b'{"message": "not found"}')
+            return
+        
+        allowed, remaining, reset_after = state.take_webhook_token(webhook_path)
+        if not allowed:
+            self.send_rate_limited(remaining, reset_after)
+            return
+        
+        headers = self.rate_limit_headers(remaining, reset_after)
+        if not state.edit_message(webhook_path, message_id, body):
+            self.send_body(404, b'{"message": "Unknown Message", "code": 10008}', headers=headers)
+            return
+        
+        self.send_body(200, self.message_body(message_id, body), headers=headers)
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """
+    同時接続が多くても接続待ちがあふれないようにしたサーバー
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_stub_server(handler_class=StubHandler, state=None, port=0):
+    """
+    スタブサーバーを別スレッドで起動する
+    
+    Args:
+        handler_class: リクエストハンドラのクラス
+        state: StubStateのインスタンス(省略時は新規作成)
+        port: 待ち受けるポート(0なら空いているポートを自動で使う)
+        
+    Returns:
+        tuple: (サーバー, ベースURL)
+    """
+    server = StubHTTPServer(('127.0.0.1', port), handler_class)
+    server.state = state or StubState()
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == '__main__':
+    server, base_url = start_stub_server(port=8000)
+    print(f"🧪 スタブサーバー起動: {base_url}")
+    print(f"   WEATHER_API_URL={base_url}/data/2.5/forecast")
+    print(f"   ONECALL_API_URL={base_url}/data/3.0/onecall")
+    print(f"   DISCORD_WEBHOOK_URL={base_url}/api/webhooks/0/stub")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
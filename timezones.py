@@ -0,0 +1,153 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone as fixed_offset
+import config
+
+
+# 時差の変わり目(夏時間の開始・終了)を探すときの間隔(秒)
+PROBE_STEP = 6 * 3600
+
+# 時差表を作り直すとき、前後に余分に含めておく期間(秒)
+TABLE_MARGIN = 86400
+TABLE_SPAN = 8 * 86400
+
+# タイムゾーン名 → ZoneInfo / OffsetTable
+_zones = {}
+_tables = {}
+
+
+def get_zone(name=None):
+    """
+    タイムゾーンを返す(一度作ったものは使い回す)
+    
+    Args:
+        name: タイムゾーン名(例: 'Asia/Tokyo'、'UTC+09:00'のような時差、省略時はconfig.TIMEZONE)
+    
+    Returns:
+        tzinfo: タイムゾーン(時差で指定したときは、その時差で固定)
+    """
+    name = name or config.TIMEZONE
+    zone = _zones.get(name)
+    if zone is None:
+        if name.startswith(('UTC+', 'UTC-')):
+            sign = -1 if name[3] == '-' else 1
+            hours, _, minutes = name[4:].partition(':')
+            zone = fixed_offset(sign * timedelta(hours=int(hours), minutes=int(minutes or 0)), name)
+        else:
+            # zoneinfoは読み込みに時間がかかるので、初めて使うときに読み込む
+            from zoneinfo import ZoneInfo
+            zone = ZoneInfo(name)
+        _zones[name] = zone
+    return zone
+
+
+def offset_name(seconds):
+    """
+    UTCからの時差(秒)を、get_zone()に渡せる名前('UTC+09:00'など)にする
+    """
+    sign = '-' if seconds < 0 else '+'
+    seconds = abs(int(seconds))
+    return f"UTC{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+    
+    # 解説:
+    # 5日間予報のAPIはタイムゾーン名ではなく、その地点の時差(秒)しか返しません
+    # 地名検索で見つけた地点は、この時差で「今日」や朝・昼・夜の時刻を数えます(夏時間の切り替えは反映されません)
+
+
+def utc_offset(zone, timestamp):
+    """
+    ある時刻(UNIX時間)でのUTCからの時差(秒)
+    """
+    return int(datetime.fromtimestamp(timestamp, tz=zone).utcoffset().total_seconds())
+
+
+class OffsetTable:
+    """
+    ある期間のUTCからの時差の変わり目を前もって調べておいた表
+    
+    予報1件ごとにdatetime.fromtimestamp(dt, tz)を呼ぶ代わりに、
+    「時刻 + 時差」の整数の計算だけで現地時刻の「時」を求めます。
+    """
+    __slots__ = ('name', 'start', 'end', 'transitions', 'offsets')
+    
+    def __init__(self, name, start, end):
+        """
+        Args:
+            name: タイムゾーン名
+            start: 表の開始時刻(UNIX時間)
+            end: 表の終了時刻(UNIX時間)
+        """
+        zone = get_zone(name)
+        self.name = name
+        self.start = start
+        self.end = end
+        self.transitions = [start]
+        self.offsets = [utc_offset(zone, start)]
+        
+        # PROBE_STEPごとに時差を調べ、変わっていたらその間を二分探索して変わり目を求める
+        t = start
+        while t < end:
+            probe = min(t + PROBE_STEP, end)
+            offset = utc_offset(zone, probe)
+            if offset != self.offsets[-1]:
+                lo, hi = t, probe
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if utc_offset(zone, mid) == self.offsets[-1]:
+                        lo = mid
+                    else:
+                        hi = mid
+                self.transitions.append(hi)
+                self.offsets.append(offset)
+            t = probe
+        
+        # 解説:
+        # 夏時間の切り替えは数か月に1回なので、6時間おきに調べれば見落としません
+        # 夏時間のない地域(日本など)は、表の中身が時差1つだけになります
+    
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+    
+    def offset(self, timestamp):
+        """
+        ある時刻(UNIX時間)でのUTCからの時差(秒)
+        """
+        return self.offsets[max(bisect_right(self.transitions, timestamp) - 1, 0)]
+    
+    def local_hours(self, timestamps):
+        """
+        複数の時刻(UNIX時間)の、現地時刻の「時」をまとめて求める
+        
+        Args:
+            timestamps: 時刻(UNIX時間)のリスト
+        
+        Returns:
+            list: 現地時刻の「時」(0〜23)のリスト
+        """
+        if len(self.offsets) == 1:
+            offset = self.offsets[0]
+            return [(timestamp + offset) // 3600 % 24 for timestamp in timestamps]
+        return [(timestamp + self.offset(timestamp)) // 3600 % 24 for timestamp in timestamps]
+
+
+def offset_table(name, start, end):
+    """
+    start〜endの時刻を変換できる時差表を返す(タイムゾーンごとに使い回す)
+    
+    Args:
+        name: タイムゾーン名(省略時はconfig.TIMEZONE)
+        start: 変換する最初の時刻(UNIX時間)
+        end: 変換する最後の時刻(UNIX時間)
+    
+    Returns:
+        OffsetTable: 時差表
+    """
+    name = name or config.TIMEZONE
+    table = _tables.get(name)
+    if table is None or not table.covers(start, end):
+        table_start = int(start) // 86400 * 86400 - TABLE_MARGIN
+        table = _tables[name] = OffsetTable(name, table_start, max(int(end) + 1, table_start + TABLE_SPAN))
+    return table
+    
+    # 解説:
+    # 表は数日分をまとめて作るので、同じタイムゾーンの地点が何百あっても
+    # 時差を調べるのは最初の1回だけです
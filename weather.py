@@ -1,42 +1,267 @@
-import requests
+import time
 from datetime import datetime, timedelta
-import pytz  # 🆕 追加
 import config
+import http_client
+import forecast_cache
+import forecast_stream
+import fetch_policy
+import metrics
+import singleflight
+import timezones
+from models import ForecastPoint, DailySummary
+from forecast_series import ForecastSeries
 
 
-def get_weather_data():
-    # (変更なし)
+# APIに渡す単位系と言語
+UNITS = 'metric'
+LANG = 'ja'
+
+# One Call APIで受け取らない項目(1時間ごとの予報だけを使う)
+ONECALL_EXCLUDE = 'current,minutely,daily,alerts'
+
+# 同じ地点への同時リクエストを1回にまとめる
+_inflight = singleflight.SingleFlight()
+
+# OpenWeatherMapへの再試行・ヘッジ・サーキットブレーカーの状態
+_breaker = fetch_policy.CircuitBreaker()
+_latency = fetch_policy.LatencyTracker()
+
+
+@metrics.timed('fetch')
+def get_weather_data(latitude=None, longitude=None):
     """
     OpenWeatherMap APIから天気データを取得する関数
     
+    同じ地点を同時に取得しようとした場合は、1回だけAPIを呼んで結果を共有します。
+    
+    Args:
+        latitude: 緯度(省略時はconfig.LATITUDE)
+        longitude: 経度(省略時はconfig.LONGITUDE)
+        
     Returns:
         dict: 天気データの辞書、エラー時はNone
     """
+    if latitude is None:
+        latitude = config.LATITUDE
+    if longitude is None:
+        longitude = config.LONGITUDE
+    
+    key = forecast_cache.cache_key(latitude, longitude, UNITS, LANG, config.FORECAST_SOURCE)
+    
+    try:
+        return _inflight.do(
+            key,
+            lambda: _load_weather_data(latitude, longitude, key),
+            timeout=config.SINGLEFLIGHT_TIMEOUT
+        )
+    except TimeoutError as e:
+        print(f"❌ 天気データの取得に失敗しました: {e}")
+        return None
+
+
+def _load_weather_data(latitude, longitude, key):
+    """
+    キャッシュまたはAPIから天気データを読み込む(get_weather_data()の本体)
+    """
+    # キャッシュが有効期限内ならAPIを呼ばない
+    cache = forecast_cache.get_cache()
+    entry = cache.load(key) if cache else None
+    
+    if forecast_cache.is_fresh(entry):
+        metrics.increment('forecast_cache_total', result='hit')
+        print("📦 キャッシュの天気データを使用します")
+        return entry['data']
+    
+    metrics.increment('forecast_cache_total', result='miss' if entry is None else 'stale')
+    
+    params = {
+        'lat': latitude,
+        'lon': longitude,
+        'appid': config.OPENWEATHER_API_KEY,
+        'units': UNITS,
+        'lang': LANG
+    }
+    url = config.WEATHER_API_URL
+    
+    # One Call APIは1時間ごとの予報(hourly)だけを受け取る
+    if config.FORECAST_SOURCE == 'onecall':
+        url = config.ONECALL_API_URL
+        params['exclude'] = ONECALL_EXCLUDE
+    
+    # 保存済みデータがあれば条件付きリクエストにする
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    
+    def request():
+        start = time.perf_counter()
+        response = http_client.get(url, params=params, headers=headers, stream=True)
+        metrics.observe('upstream_latency_seconds', time.perf_counter() - start, upstream='openweathermap')
+        
+        # 最後にresponseを閉じて接続をプールに戻す
+        with response:
+            if response.status_code == 304 and entry:
+                return None, None
+            
+            response.raise_for_status()
+            
+            # 本文を少しずつ読みながら、必要な項目・期間だけを取り出す
+            min_dt, max_dt = forecast_window()
+            with metrics.timer('decode'):
+                data = forecast_stream.decode_forecast(
+                    response.iter_content(chunk_size=16384),
+                    min_dt=min_dt,
+                    max_dt=max_dt
+                )
+            return data, response.headers
+    
     try:
-        params = {
-            'lat': config.LATITUDE,
-            'lon': config.LONGITUDE,
-            'appid': config.OPENWEATHER_API_KEY,
-            'units': 'metric',
-            'lang': 'ja'
-        }
-        
         print("🌐 天気データを取得中...")
-        response = requests.get(config.WEATHER_API_URL, params=params)
-        response.raise_for_status()
+        data, response_headers = fetch_policy.call(request, _breaker, _latency, label='OpenWeatherMap')
         
-        data = response.json()
-        print("✅ 天気データの取得に成功しました")
+    except (fetch_policy.CircuitOpenError, http_client.RequestException, ValueError) as e:
+        metrics.increment('fetch_errors_total')
+        print(f"❌ 天気データの取得に失敗しました: {e}")
         
-        return data
+        # APIが不調なあいだは、期限切れでも前回の予報を使う
+        if entry:
+            metrics.increment('forecast_cache_total', result='fallback')
+            print("📦 前回取得した天気データを代わりに使用します")
+            return entry['data']
+        return None
+    
+    if data is None:
+        metrics.increment('forecast_cache_total', result='revalidated')
+        cache.touch(key)
+        print("✅ 天気データに変更はありません(キャッシュを使用)")
+        return entry['data']
+    
+    print("✅ 天気データの取得に成功しました")
+    
+    # 取得した予報をアーカイブに残す(精度の検証や過去の日の再生用)
+    if config.ARCHIVE_DIR:
+        import forecast_archive
+        try:
+            forecast_archive.get_archive().append(latitude, longitude, data)
+        except OSError as e:
+            print(f"⚠️  予報のアーカイブに失敗しました: {e}")
+    
+    if cache:
+        cache.store(
+            key,
+            data,
+            etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified')
+        )
+    
+    return data
+
+
+def geocode(query):
+    """
+    地名から緯度・経度を調べる(OpenWeatherMapのGeocoding API)
+    
+    Args:
+        query: 地名(例: '札幌'、'London,GB')
         
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 天気データの取得に失敗しました: {e}")
+    Returns:
+        dict: {'name', 'latitude', 'longitude'}、見つからなければNone
+    """
+    params = {'q': query, 'limit': 1, 'appid': config.OPENWEATHER_API_KEY}
+    
+    try:
+        start = time.perf_counter()
+        response = http_client.get(config.GEOCODING_API_URL, params=params)
+        metrics.observe('upstream_latency_seconds', time.perf_counter() - start, upstream='geocoding')
+        response.raise_for_status()
+        places = response.json()
+    except (http_client.RequestException, ValueError) as e:
+        metrics.increment('fetch_errors_total')
+        print(f"❌ 地名の検索に失敗しました: {e}")
+        return None
+    
+    if not places:
         return None
+    
+    place = places[0]
+    return {
+        'name': place.get('local_names', {}).get(LANG) or place['name'],
+        'latitude': float(place['lat']),
+        'longitude': float(place['lon']),
+    }
+
+
+def forecast_timezone(data):
+    """
+    予報データから地点のタイムゾーンを調べる
+    
+    Args:
+        data: get_weather_data()の天気データ
+        
+    Returns:
+        str: タイムゾーン名(One Call APIは'Europe/London'など、5日間予報は'UTC+01:00'のような時差)、
+             分からなければNone
+    """
+    if not data:
+        return None
+    if isinstance(data.get('timezone'), str):
+        return data['timezone']
+    # One Call APIはtimezone_offset、5日間予報はcity.timezoneに時差(秒)が入っている
+    offset = data.get('timezone_offset')
+    if offset is None:
+        offset = (data.get('city') or {}).get('timezone')
+    if offset is None:
+        return None
+    return timezones.offset_name(offset)
+
+
+def forecast_window(now=None):
+    """
+    取得した予報のうち、残しておく期間を返す
+    
+    parse_weather_data()は「次の3時間区切りから24時間」を使うので、
+    キャッシュの有効期限いっぱいまで使い回しても足りる範囲を残します。
+    
+    Args:
+        now: 基準時刻(UNIX時間、省略時は現在時刻)
+        
+    Returns:
+        tuple: (開始時刻, 終了時刻) のUNIX時間
+    """
+    now = time.time() if now is None else now
+    return now - 3 * 3600, forecast_cache.next_expiry(now) + 27 * 3600
+
+
+# 天気説明の変換表(上から順に、説明に含まれているかを調べる)
+WEATHER_SIMPLIFY_RULES = (
+    ('快晴', '晴れ'),
+    ('晴天', '晴れ'),
+    ('晴', '晴れ'),
+    ('薄い雲', '晴れ'),
+    ('曇りがち', '曇り'),
+    ('厚い雲', '曇り'),
+    ('雲', '曇り'),
+    ('小雨', '小雨'),
+    ('適度な雨', '雨'),
+    ('強い雨', '雨'),
+    ('大雨', '大雨'),
+    ('霧雨', '小雨'),
+    ('弱い雨', '小雨'),
+    ('小雪', '雪'),
+    ('雪', '雪'),
+    ('大雪', '大雪'),
+    ('霧', '霧'),
+    ('もや', '霧'),
+    ('雷雨', '雷雨'),
+)
+
+# 一度変換した説明の結果を覚えておく表
+_simplified_descriptions = {}
 
 
 def simplify_weather_description(description):
-    # (変更なし)
     """
     APIの詳細な天気説明をシンプルな表現に変換する
     
@@ -46,50 +271,37 @@ def simplify_weather_description(description):
     Returns:
         str: シンプルな天気表現
     """
-    weather_map = {
-        '快晴': '晴れ',
-        '晴天': '晴れ',
-        '晴': '晴れ',
-        '薄い雲': '晴れ',
-        '曇りがち': '曇り',
-        '厚い雲': '曇り',
-        '雲': '曇り',
-        '小雨': '小雨',
-        '適度な雨': '雨',
-        '強い雨': '雨',
-        '大雨': '大雨',
-        '霧雨': '小雨',
-        '弱い雨': '小雨',
-        '小雪': '雪',
-        '雪': '雪',
-        '大雪': '大雪',
-        '霧': '霧',
-        'もや': '霧',
-        '雷雨': '雷雨',
-    }
+    simple = _simplified_descriptions.get(description)
+    if simple is not None:
+        return simple
     
-    for key, simple in weather_map.items():
+    simple = description
+    for key, value in WEATHER_SIMPLIFY_RULES:
         if key in description:
-            return simple
+            simple = value
+            break
+    
+    _simplified_descriptions[description] = simple
+    return simple
     
-    return description
+    # 解説:
+    # APIの天気説明の種類は数十通りしかないので、
+    # 2回目からは辞書を1回引くだけで結果が返ります
 
 
 def analyze_weather_changes(forecasts):
-    # (変更なし)
     """
     1日の天気変化を分析して「雨のち晴れ」のような文字列を作る
     
     Args:
-        forecasts: 予報データのリスト
+        forecasts: ForecastPointのリスト
         
     Returns:
         str: 天気の変化を表す文字列
     """
     weather_list = []
-    for item in forecasts:
-        weather = item['weather'][0]['description']
-        simple_weather = simplify_weather_description(weather)
+    for point in forecasts:
+        simple_weather = simplify_weather_description(point.description)
         weather_list.append(simple_weather)
     
     unique_weathers = []
@@ -110,157 +322,213 @@ def analyze_weather_changes(forecasts):
         return f"{unique_weathers[0]}のち{unique_weathers[1]}"
 
 
-def parse_weather_data(data):
+# 時間帯別の気温を求める時刻 (名前, 表示名, 現地時刻の「時」)
+TIME_SLOTS = (
+    ('morning', '朝', 6),
+    ('noon', '昼', 12),
+    ('evening', '夕方', 15),
+    ('night', '夜', 18),
+)
+
+# 補間できないときに、時間帯の最初の予報を探す範囲(秒)
+SLOT_SECONDS = 3 * 3600
+
+# 対象期間の前後で、補間のために残しておく予報の範囲(秒)
+SERIES_MARGIN = 3 * 3600
+
+# 天気の変化を見る間隔(秒)
+DESCRIPTION_STEP = 3 * 3600
+
+
+def forecast_items(data):
+    """
+    予報データから予報のリストを取り出す
+    
+    5日間/3時間予報は'list'に、One Call APIは'hourly'に予報が入っています
+    (decode_forecast()を通したデータは、どちらも'list'にそろえてある)
+    
+    Args:
+        data: 予報データ
+    
+    Returns:
+        list: 予報1件分の辞書のリスト
+    """
+    if 'list' in data:
+        return data['list']
+    return [forecast_stream.project_item(item) for item in data['hourly']]
+
+
+def slot_times(target_start):
+    """
+    対象期間の中で、TIME_SLOTSの各時刻が最初に来る時刻を求める
+    
+    Args:
+        target_start: 対象期間の開始時刻(タイムゾーン付きのdatetime)
+    
+    Returns:
+        list: TIME_SLOTSと同じ順の時刻(UNIX時間)
+    """
+    times = []
+    for name, label, hour in TIME_SLOTS:
+        slot = target_start.replace(hour=hour)
+        if slot < target_start:
+            slot += timedelta(days=1)
+        times.append(slot.timestamp())
+    return times
+
+
+@metrics.timed('parse')
+def parse_weather_data(data, now=None, timezone=None):
     """
     APIから取得した生データを、使いやすい形に整形する
-    🆕 日本時間(JST)で実行時刻から24時間分のデータを取得
+    🆕 地点のタイムゾーン(既定は日本時間)で実行時刻から24時間分のデータを取得
     
     Args:
         data: get_weather_data()で取得したデータ
+        now: 実行時刻(UNIX時間、省略時は現在時刻。過去の予報を再現するときに使う)
+        timezone: 地点のタイムゾーン名(省略時はconfig.TIMEZONE)
         
     Returns:
-        dict: 整形された天気情報
+        DailySummary: 整形された天気情報
     """
     if not data:
         return None
     
     try:
-        # 🆕 日本時間(JST)を取得
-        jst = pytz.timezone('Asia/Tokyo')
-        now = datetime.now(jst)
+        # 🆕 地点のタイムゾーンの現在時刻を取得
+        tz = timezones.get_zone(timezone)
+        now = datetime.now(tz) if now is None else datetime.fromtimestamp(now, tz=tz)
+        tz_label = now.tzname()
         
         # 解説:
         # datetime.now() → UTC時刻を返す(GitHub Actionsの場合)
-        # datetime.now(jst) → 日本時間(JST)を返す
+        # datetime.now(tz) → 地点の現地時刻(Asia/Tokyoなら日本時間(JST))を返す
         
-        print(f"\n⏰ 実行時刻(JST): {now.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"\n⏰ 実行時刻({tz_label}): {now.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # 次の3時間区切りの時刻を計算
         next_3hour = ((now.hour // 3) + 1) * 3
         
         if next_3hour >= 24:
-            target_start = datetime(now.year, now.month, now.day, 0, 0, 0, tzinfo=jst) + timedelta(days=1)
+            target_start = datetime(now.year, now.month, now.day, 0, 0, 0, tzinfo=tz) + timedelta(days=1)
         else:
-            target_start = datetime(now.year, now.month, now.day, next_3hour, 0, 0, tzinfo=jst)
+            target_start = datetime(now.year, now.month, now.day, next_3hour, 0, 0, tzinfo=tz)
         
         target_end = target_start + timedelta(hours=24)
         
-        print(f"📅 対象期間: {target_start.strftime('%Y年%m月%d日 %H時')} 〜 {target_end.strftime('%Y年%m月%d日 %H時')} (JST)")
+        print(f"📅 対象期間: {target_start.strftime('%Y年%m月%d日 %H時')} 〜 {target_end.strftime('%Y年%m月%d日 %H時')} ({tz_label})")
         print(f"🔍 24時間分のデータを取得します")
         
-        # 24時間分のデータを抽出
-        target_forecasts = []
+        # 🆕 対象期間の予報を時系列(時刻・気温・降水確率のリスト)にまとめる
+        target_start_ts = target_start.timestamp()
+        target_end_ts = target_end.timestamp()
+        # 補間に使うので、対象期間の前後SERIES_MARGIN秒の予報も時系列に入れる
+        series_start = target_start_ts - SERIES_MARGIN
+        series_end = target_end_ts + SERIES_MARGIN
         
-        for item in data['list']:
-            # 🆕 APIの時刻もJSTに変換
-            forecast_time = datetime.fromtimestamp(item['dt'], tz=jst)
-            
-            if target_start <= forecast_time < target_end:
-                target_forecasts.append(item)
+        series, series_items = ForecastSeries.from_items(forecast_items(data), series_start, series_end)
+        lo, hi = series.span(target_start_ts, target_end_ts)
+        items = series_items[lo:hi]
+        stats = series.window(target_start_ts, target_end_ts)
         
-        print(f"📊 取得データ: {len(target_forecasts)}件")
+        # 現地時刻の「時」は、時差表を使って整数の計算で求める(夏時間の切り替えにも対応)
+        table = timezones.offset_table(timezone, series_start, series_end)
         
-        if target_forecasts:
-            times = [datetime.fromtimestamp(item['dt'], tz=jst).strftime('%m/%d %H時') for item in target_forecasts]
-            print(f"   時刻: {', '.join(times)}")
-        else:
+        # 解説:
+        # 以前は1件ずつループして時刻変換や時間帯の判定をしていました
+        # 今は項目ごとにリストへまとめて取り出し、最低・最高気温や時間帯ごとの気温は
+        # ForecastSeriesでまとめて求めるので、1時間ごとの予報でも解析時間がほとんど増えません
+        
+        print(f"📊 取得データ: {len(items)}件")
+        
+        if stats is None:
             print("❌ データが取得できませんでした")
             return None
         
-        forecasts = target_forecasts
+        first_time = datetime.fromtimestamp(items[0]['dt'], tz=tz).strftime('%m/%d %H時')
+        last_time = datetime.fromtimestamp(items[-1]['dt'], tz=tz).strftime('%m/%d %H時')
+        print(f"   時刻: {first_time} 〜 {last_time} ({round(series.step / 3600, 1):g}時間ごと)")
         
-        # 気温データを集める
-        temps = [item['main']['temp'] for item in forecasts]
-        temp_min = min(temps)
-        temp_max = max(temps)
+        # 気温データ
+        temp_min, temp_max, pop_max = stats
         
         print(f"🌡️  気温範囲: {round(temp_min, 1)}℃ 〜 {round(temp_max, 1)}℃")
         
-        # 時間帯別の気温を取得
-        morning_temp = None
-        noon_temp = None
-        evening_temp = None
-        night_temp = None
-        
-        for item in forecasts:
-            forecast_time = datetime.fromtimestamp(item['dt'], tz=jst)
-            hour = forecast_time.hour
-            temp = item['main']['temp']
-            
-            if 6 <= hour <= 8 and morning_temp is None:
-                morning_temp = temp
-                print(f"   朝の気温: {round(temp, 1)}℃ ({hour}時)")
-            
-            if 12 <= hour <= 14 and noon_temp is None:
-                noon_temp = temp
-                print(f"   昼の気温: {round(temp, 1)}℃ ({hour}時)")
-            
-            if 15 <= hour <= 17 and evening_temp is None:
-                evening_temp = temp
-                print(f"   夕方の気温: {round(temp, 1)}℃ ({hour}時)")
-            
-            if 18 <= hour <= 20 and night_temp is None:
-                night_temp = temp
-                print(f"   夜の気温: {round(temp, 1)}℃ ({hour}時)")
+        # 時間帯別の気温(その時刻の予報、なければ前後の予報から補間した値)
+        times = slot_times(target_start)
+        
+        slot_temps = {}
+        for (name, label, hour), slot_ts, temp in zip(TIME_SLOTS, times, series.at(times)):
+            # 予報の範囲の端で補間できないときは、その時間帯で最初の予報を使う
+            if temp is None:
+                temp = series.first(slot_ts, slot_ts + SLOT_SECONDS)
+            if temp is not None:
+                print(f"   {label}の気温: {round(temp, 1)}℃ ({hour}時)")
+            slot_temps[name] = temp
+        
+        morning_temp = slot_temps['morning']
+        noon_temp = slot_temps['noon']
+        night_temp = slot_temps['night']
+        
+        # データがない時間帯の補完用の値(必要なときだけ集める)
+        morning_min = None
+        noon_max = None
+        night_temps = []
+        
+        if morning_temp is None or noon_temp is None or night_temp is None:
+            hour_temps = list(zip(table.local_hours(series.dts[lo:hi]), series.temps[lo:hi]))
+            morning_min = min((temp for hour, temp in hour_temps if 0 <= hour < 12), default=None)
+            noon_max = max((temp for hour, temp in hour_temps if 11 <= hour < 16), default=None)
+            night_temps = [temp for hour, temp in hour_temps if 17 <= hour <= 23]
         
         # データがない時間帯の補完
         if morning_temp is None:
-            morning_candidates = []
-            for item in forecasts:
-                forecast_time = datetime.fromtimestamp(item['dt'], tz=jst)
-                hour = forecast_time.hour
-                if 0 <= hour < 12:
-                    morning_candidates.append(item['main']['temp'])
-            
-            if morning_candidates:
-                morning_temp = min(morning_candidates)
+            if morning_min is not None:
+                morning_temp = morning_min
+                metrics.increment('fallback_total', slot='morning', source='window')
                 print(f"⚠️  朝のデータがないため午前中の最低気温を使用: {round(morning_temp, 1)}℃")
             else:
                 morning_temp = temp_min
+                metrics.increment('fallback_total', slot='morning', source='estimate')
                 print(f"⚠️  朝のデータがないため1日の最低気温を使用: {round(morning_temp, 1)}℃")
         
         if noon_temp is None:
-            noon_candidates = []
-            for item in forecasts:
-                forecast_time = datetime.fromtimestamp(item['dt'], tz=jst)
-                hour = forecast_time.hour
-                if 11 <= hour < 16:
-                    noon_candidates.append(item['main']['temp'])
-            
-            if noon_candidates:
-                noon_temp = max(noon_candidates)
+            if noon_max is not None:
+                noon_temp = noon_max
+                metrics.increment('fallback_total', slot='noon', source='window')
                 print(f"⚠️  昼のデータがないため昼間の最高気温を使用: {round(noon_temp, 1)}℃")
             else:
                 noon_temp = temp_max
+                metrics.increment('fallback_total', slot='noon', source='estimate')
                 print(f"⚠️  昼のデータがないため1日の最高気温を使用: {round(noon_temp, 1)}℃")
         
         if night_temp is None:
-            night_candidates = []
-            for item in forecasts:
-                forecast_time = datetime.fromtimestamp(item['dt'], tz=jst)
-                hour = forecast_time.hour
-                if 17 <= hour <= 23:
-                    night_candidates.append(item['main']['temp'])
-            
-            if night_candidates:
-                night_temp = sum(night_candidates) / len(night_candidates)
+            if night_temps:
+                night_temp = sum(night_temps) / len(night_temps)
+                metrics.increment('fallback_total', slot='night', source='window')
                 print(f"⚠️  夜のデータがないため夜間の平均気温を使用: {round(night_temp, 1)}℃")
             else:
                 night_temp = (morning_temp + noon_temp) / 2
+                metrics.increment('fallback_total', slot='night', source='estimate')
                 print(f"⚠️  夜のデータがないため推定値を使用: {round(night_temp, 1)}℃")
         
-        # 天気変化を分析
+        # 天気変化を分析(1時間ごとの予報は3時間ごとに間引いて見る)
+        stride = max(1, round(DESCRIPTION_STEP / series.step)) if series.step else 1
+        sampled = items[::stride]
+        forecasts = [
+            ForecastPoint.from_item(item, hour)
+            for item, hour in zip(sampled, table.local_hours([item['dt'] for item in sampled]))
+        ]
         weather_description = analyze_weather_changes(forecasts)
         print(f"☁️  天気: {weather_description}")
         
         # アイコンと天気情報
-        weather_main = forecasts[0]['weather'][0]['main']
-        weather_icon = forecasts[0]['weather'][0]['icon']
+        weather_main = forecasts[0].weather_main
+        weather_icon = forecasts[0].icon
         weather_icon = weather_icon.replace('n', 'd')
         
         # 降水確率
-        pops = [item.get('pop', 0) for item in forecasts]
-        pop = max(pops) * 100
+        pop = pop_max * 100
         print(f"💧 降水確率: {round(pop, 0)}%")
         
         # 日付表示
@@ -272,18 +540,18 @@ def parse_weather_data(data):
         for eng, jpn in weekday_dict.items():
             date_str = date_str.replace(eng, jpn)
         
-        return {
-            'temp_min': round(temp_min, 1),
-            'temp_max': round(temp_max, 1),
-            'morning_temp': round(morning_temp, 1),
-            'noon_temp': round(noon_temp, 1),
-            'night_temp': round(night_temp, 1),
-            'weather_main': weather_main,
-            'weather_description': weather_description,
-            'weather_icon': weather_icon,
-            'pop': round(pop, 0),
-            'date': date_str
-        }
+        return DailySummary(
+            temp_min=round(temp_min, 1),
+            temp_max=round(temp_max, 1),
+            morning_temp=round(morning_temp, 1),
+            noon_temp=round(noon_temp, 1),
+            night_temp=round(night_temp, 1),
+            weather_main=weather_main,
+            weather_description=weather_description,
+            weather_icon=weather_icon,
+            pop=round(pop, 0),
+            date=date_str
+        )
         
     except (KeyError, IndexError) as e:
         print(f"❌ 天気データの解析に失敗しました: {e}")
@@ -305,14 +573,14 @@ if __name__ == '__main__':
             print("\n" + "=" * 60)
             print("       取得結果")
             print("=" * 60)
-            print(f"📅 日付: {weather_info['date']}")
-            print(f"☁️  天気: {weather_info['weather_description']}")
+            print(f"📅 日付: {weather_info.date}")
+            print(f"☁️  天気: {weather_info.weather_description}")
             print(f"🌡️  気温:")
-            print(f"   最低: {weather_info['temp_min']}℃ / 最高: {weather_info['temp_max']}℃")
-            print(f"   朝: {weather_info['morning_temp']}℃")
-            print(f"   昼: {weather_info['noon_temp']}℃")
-            print(f"   夜: {weather_info['night_temp']}℃")
-            print(f"💧 降水確率: {weather_info['pop']}%")
+            print(f"   最低: {weather_info.temp_min}℃ / 最高: {weather_info.temp_max}℃")
+            print(f"   朝: {weather_info.morning_temp}℃")
+            print(f"   昼: {weather_info.noon_temp}℃")
+            print(f"   夜: {weather_info.night_temp}℃")
+            print(f"💧 降水確率: {weather_info.pop}%")
             print("=" * 60)
             print("\n✅ テスト成功!")
         else: